@@ -0,0 +1,129 @@
+"""
+Проверка пересечения смен бариста на длинной истории броней.
+
+Запуск (из каталога, содержащего пакет src, с настроенным .env / DATABASE_URL на тестовую БД
+и применённой миграцией 0001):
+    python -m src.benchmarks.booking_overlap --history 5000 --repeats 50
+
+Скрипт создаёт бариста с --history бронями (по смене в день в прошлом) и сравнивает:
+  * наивную проверку - загрузку всех броней бариста со слотами и перебор в Python;
+  * book_slot, где пересечение проверяет ограничение ex_booking_barista_shift (GiST-индекс).
+Затем проверяет, что пересекающаяся бронь отклоняется с BookingResult.OVERLAP, и удаляет данные.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete
+
+from src.db.session import AsyncSessionLocal, engine
+from src.models import Booking, BookingStatus, Cafe, Slot, User, UserRole
+from src.services.booking import BookingResult, BookingService
+
+
+async def _seed(history: int) -> tuple[int, int, datetime]:
+    async with AsyncSessionLocal() as session:
+        tag = f"overlap_{int(time.time() * 1000)}"
+        cafe = Cafe(name=tag, address="bench", phone_number="0")
+        barista = User(telegram_id=-(10**12), first_name=tag, role=UserRole.BARISTA)
+        session.add_all([cafe, barista])
+        await session.flush()
+
+        base = datetime.now(timezone.utc).replace(hour=9, minute=0, second=0, microsecond=0)
+        slots = [
+            Slot(cafe_id=cafe.id, start_time=base - timedelta(days=day), end_time=base - timedelta(days=day) + timedelta(hours=6))
+            for day in range(1, history + 1)
+        ]
+        session.add_all(slots)
+        await session.flush()
+        session.add_all([Booking(barista_id=barista.id, slot_id=slot.id, status=BookingStatus.COMPLETED) for slot in slots])
+        await session.commit()
+        return cafe.id, barista.id, base
+
+
+async def _new_slot(cafe_id: int, start: datetime, hours: int = 6) -> int:
+    async with AsyncSessionLocal() as session:
+        slot = Slot(cafe_id=cafe_id, start_time=start, end_time=start + timedelta(hours=hours), required_baristas=1)
+        session.add(slot)
+        await session.commit()
+        return slot.id
+
+
+async def _naive_overlap(barista_id: int, start: datetime, end: datetime) -> bool:
+    async with AsyncSessionLocal() as session:
+        bookings = await BookingService(session).get_barista_bookings(barista_id, profile="listing")
+        return any(
+            b.status in (BookingStatus.BOOKED, BookingStatus.CONFIRMED_WORK)
+            and b.slot.start_time < end and b.slot.end_time > start
+            for b in bookings
+        )
+
+
+async def _cleanup(cafe_id: int, barista_id: int) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Booking).where(Booking.barista_id == barista_id))
+        await session.execute(delete(Slot).where(Slot.cafe_id == cafe_id))
+        await session.execute(delete(Cafe).where(Cafe.id == cafe_id))
+        await session.execute(delete(User).where(User.id == barista_id))
+        await session.commit()
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    print(f"{name}: median {statistics.median(samples) * 1000:.2f} ms, p95 {samples[int(len(samples) * 0.95) - 1] * 1000:.2f} ms")
+
+
+async def run(history: int, repeats: int) -> bool:
+    cafe_id, barista_id, base = await _seed(history)
+    try:
+        # Текущая активная смена бариста и пересекающийся с ней слот
+        active_start = base + timedelta(days=1)
+        active_slot = await _new_slot(cafe_id, active_start)
+        async with AsyncSessionLocal() as session:
+            first, _ = await BookingService(session).book_slot(barista_id, active_slot)
+
+        naive, constrained = [], []
+        for _ in range(repeats):
+            start = active_start + timedelta(hours=3)
+            started = time.perf_counter()
+            await _naive_overlap(barista_id, start, start + timedelta(hours=6))
+            naive.append(time.perf_counter() - started)
+
+            slot_id = await _new_slot(cafe_id, start)
+            async with AsyncSessionLocal() as session:
+                started = time.perf_counter()
+                result, _ = await BookingService(session).book_slot(barista_id, slot_id)
+                constrained.append(time.perf_counter() - started)
+            if result != BookingResult.OVERLAP:
+                print(f"expected OVERLAP, got {result}")
+                return False
+
+        print(f"barista history: {history} bookings, first booking: {first.value}")
+        _report("naive check (load history)", naive)
+        _report("book_slot with exclusion constraint", constrained)
+
+        free_slot = await _new_slot(cafe_id, active_start + timedelta(days=1))
+        async with AsyncSessionLocal() as session:
+            result, _ = await BookingService(session).book_slot(barista_id, free_slot)
+        print(f"non-overlapping booking: {result.value}")
+        return first == BookingResult.CREATED and result == BookingResult.CREATED
+    finally:
+        await _cleanup(cafe_id, barista_id)
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=5000)
+    parser.add_argument("--repeats", type=int, default=50)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.history, args.repeats))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
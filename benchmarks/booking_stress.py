@@ -0,0 +1,91 @@
+"""
+Нагрузочная проверка бронирования: сотни одновременных броней одного слота.
+
+Запуск (из каталога, содержащего пакет src, с настроенным .env / DATABASE_URL на тестовую БД):
+    python -m src.benchmarks.booking_stress --baristas 300 --seats 5
+
+Скрипт создаёт кофейню, слот и бариста, одновременно бронирует слот от имени
+всех бариста (каждый в своей сессии), проверяет, что активных броней ровно
+столько, сколько мест, и удаляет созданные данные.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, select
+
+from src.db.session import AsyncSessionLocal, engine
+from src.models import Booking, Cafe, Slot, User, UserRole
+from src.services.booking import BookingResult, BookingService
+from src.services.slot import ACTIVE_BOOKING_STATUSES
+
+
+async def _seed(baristas: int, seats: int) -> tuple[int, int, list[int]]:
+    async with AsyncSessionLocal() as session:
+        tag = f"stress_{int(time.time() * 1000)}"
+        cafe = Cafe(name=tag, address="stress", phone_number="0")
+        session.add(cafe)
+        await session.flush()
+        start = datetime.utcnow() + timedelta(days=1)
+        slot = Slot(cafe_id=cafe.id, start_time=start, end_time=start + timedelta(hours=8), required_baristas=seats)
+        users = [
+            User(telegram_id=-(10**12) - i, first_name=f"{tag}_{i}", role=UserRole.BARISTA)
+            for i in range(baristas)
+        ]
+        session.add(slot)
+        session.add_all(users)
+        await session.commit()
+        return cafe.id, slot.id, [user.id for user in users]
+
+
+async def _cleanup(cafe_id: int, slot_id: int, user_ids: list[int]) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Booking).where(Booking.slot_id == slot_id))
+        await session.execute(delete(Slot).where(Slot.id == slot_id))
+        await session.execute(delete(User).where(User.id.in_(user_ids)))
+        await session.execute(delete(Cafe).where(Cafe.id == cafe_id))
+        await session.commit()
+
+
+async def _book(barista_id: int, slot_id: int):
+    async with AsyncSessionLocal() as session:
+        result, _ = await BookingService(session).book_slot(barista_id, slot_id)
+        return result
+
+
+async def run(baristas: int, seats: int) -> bool:
+    cafe_id, slot_id, user_ids = await _seed(baristas, seats)
+    try:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(_book(user_id, slot_id) for user_id in user_ids))
+        elapsed = time.perf_counter() - started
+
+        async with AsyncSessionLocal() as session:
+            stmt = select(func.count(Booking.id)).where(
+                Booking.slot_id == slot_id, Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+            )
+            active = (await session.execute(stmt)).scalar_one()
+
+        print(f"{baristas} concurrent bookings for {seats} seats in {elapsed:.2f}s")
+        print(f"results: {dict(Counter(r.value for r in results))}, active bookings in DB: {active}")
+        return active == seats and results.count(BookingResult.CREATED) == seats
+    finally:
+        await _cleanup(cafe_id, slot_id, user_ids)
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--baristas", type=int, default=300)
+    parser.add_argument("--seats", type=int, default=5)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.baristas, args.seats))
+    print("OK" if ok else "OVERBOOKED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
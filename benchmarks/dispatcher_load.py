@@ -0,0 +1,267 @@
+"""
+Синтетическая нагрузка на полный конвейер диспетчера: middleware, роутеры, БД и Redis.
+
+Запуск (из каталога, содержащего пакет src):
+    python -m src.benchmarks.dispatcher_load --updates 5000 --concurrency 50 \
+        --mix start=4,registration=1,available_slots=3,booking=2
+
+Диспетчер строится той же create_dispatcher, что и в боте, а Bot API подменяется
+фейковой сессией (ответ через --api-latency секунд). По умолчанию используются БД и Redis
+из настроек (тестовые!): скрипт создаёт свои данные и удаляет их в конце.
+С --sqlite БД - временный файл SQLite со схемой из моделей, с --fakeredis - fakeredis в памяти.
+
+Сценарии (каждый виртуальный пользователь выполняет их последовательно, как в Telegram):
+  start            - /start зарегистрированного бариста;
+  registration     - /start нового пользователя, имя, контакт, выбор кофейни;
+  available_slots  - /available_slots и дата;
+  booking          - /available_slots, дата и нажатие кнопки слота.
+Печатает p50/p95/p99 времени обработки обновления по шагам и в целом и обновления в секунду.
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import typing
+from collections import Counter, defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, AsyncGenerator, Dict, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.base import BaseSession
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import Chat, Message, Update
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from src.benchmarks.updates import callback_update, contact_update, message_update
+from src.bot import create_bot, create_dispatcher
+from src.config import get_settings
+from src.db.base import Base
+from src.db.session import AsyncSessionLocal, engine
+from src.models import Booking, Cafe, Slot, User, UserRole
+
+SCENARIOS = ("start", "registration", "available_slots", "booking")
+# telegram_id виртуальных пользователей: отрицательные, чтобы не пересечься с настоящими
+BARISTA_TELEGRAM_BASE = -(10**12)
+NEW_USER_TELEGRAM_BASE = -(2 * 10**12)
+
+
+class FakeSession(BaseSession):
+    """Сессия Bot API без сети: считает вызовы и возвращает правдоподобный результат."""
+
+    def __init__(self, latency: float = 0.0):
+        super().__init__()
+        self.latency = latency
+        self.calls: Counter = Counter()
+        self._message_ids = itertools.count(1)
+
+    async def close(self) -> None:
+        pass
+
+    async def make_request(self, bot: Bot, method: TelegramMethod[TelegramType], timeout: Optional[int] = None) -> TelegramType:
+        self.calls[type(method).__name__] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        returning = method.__returning__
+        if returning is Message or Message in typing.get_args(returning):
+            chat_id = getattr(method, "chat_id", None)
+            return Message(
+                message_id=next(self._message_ids),
+                date=datetime.now(),
+                chat=Chat(id=chat_id if isinstance(chat_id, int) else 0, type="private"),
+                text=getattr(method, "text", None),
+            )
+        return True
+
+    async def stream_content(self, *args: Any, **kwargs: Any) -> AsyncGenerator[bytes, None]:
+        raise NotImplementedError
+        yield b""
+
+
+async def _seed(session_factory, baristas: int, slot_day: date, seats: int) -> Tuple[int, List[int]]:
+    async with session_factory() as session:
+        cafe = Cafe(name=f"load_{int(time.time() * 1000)}", address="load", phone_number="0")
+        session.add(cafe)
+        await session.flush()
+        session.add_all([
+            User(
+                telegram_id=BARISTA_TELEGRAM_BASE - i,
+                first_name=f"Barista{i}",
+                phone_number=f"+7000{i:07d}",
+                role=UserRole.BARISTA,
+                cafe_id=cafe.id,
+            )
+            for i in range(baristas)
+        ])
+        start = datetime.combine(slot_day, datetime.min.time())
+        session.add_all([
+            Slot(
+                cafe_id=cafe.id,
+                start_time=start + timedelta(hours=hour),
+                end_time=start + timedelta(hours=hour + 1),
+                required_baristas=seats,
+            )
+            for hour in range(8, 20)
+        ])
+        await session.commit()
+        slot_ids = (await session.execute(select(Slot.id).where(Slot.cafe_id == cafe.id))).scalars().all()
+        return cafe.id, list(slot_ids)
+
+
+async def _cleanup(session_factory, cafe_id: int) -> None:
+    async with session_factory() as session:
+        user_ids = select(User.id).where(User.telegram_id < BARISTA_TELEGRAM_BASE + 1).scalar_subquery()
+        await session.execute(delete(Booking).where(Booking.barista_id.in_(user_ids)))
+        await session.execute(delete(User).where(User.telegram_id < BARISTA_TELEGRAM_BASE + 1))
+        await session.execute(delete(Slot).where(Slot.cafe_id == cafe_id))
+        await session.execute(delete(Cafe).where(Cafe.id == cafe_id))
+        await session.commit()
+
+
+def _scenario_updates(scenario: str, telegram_id: int, new_user_id: int, cafe_id: int, slot_day: date) -> List[Tuple[str, Dict[str, Any]]]:
+    """Обновления одного прохода сценария с названием шага для статистики."""
+    day = slot_day.isoformat()
+    if scenario == "start":
+        return [("/start", message_update(telegram_id, "/start"))]
+    if scenario == "registration":
+        return [
+            ("registration:/start", message_update(new_user_id, "/start")),
+            ("registration:name", message_update(new_user_id, "Load Test User")),
+            ("registration:contact", contact_update(new_user_id, f"+7999{abs(new_user_id) % 10**7:07d}")),
+            ("registration:cafe", callback_update(new_user_id, f"select_cafe_{cafe_id}")),
+        ]
+    steps = [
+        ("/available_slots", message_update(telegram_id, "/available_slots")),
+        ("available_slots:date", message_update(telegram_id, day)),
+    ]
+    if scenario == "booking":
+        steps.append(("booking:slot", callback_update(telegram_id, f"slot_{random.randrange(4)}")))
+    return steps
+
+
+def _parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario {name!r}, expected one of {SCENARIOS}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def _percentile(samples: List[float], q: float) -> float:
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+def _report(latencies: Dict[str, List[float]], total: int, elapsed: float, session: FakeSession) -> None:
+    print(f"{total} updates in {elapsed:.2f}s: {total / elapsed:.0f} updates/s")
+    everything = sorted(itertools.chain.from_iterable(latencies.values()))
+    rows = [("all", everything)] + [(step, sorted(samples)) for step, samples in sorted(latencies.items())]
+    print(f"{'step':<24}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for step, samples in rows:
+        print(
+            f"{step:<24}{len(samples):>8}{statistics.median(samples) * 1000:>10.2f}"
+            f"{_percentile(samples, 0.95) * 1000:>10.2f}{_percentile(samples, 0.99) * 1000:>10.2f}"
+        )
+    print(f"Bot API calls: {dict(session.calls)}")
+
+
+async def _drive(
+    dp: Dispatcher,
+    bot: Bot,
+    updates: int,
+    concurrency: int,
+    weights: Dict[str, int],
+    cafe_id: int,
+    slot_day: date,
+) -> Tuple[Dict[str, List[float]], int]:
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    budget = [updates]
+    new_user_ids = itertools.count(1)
+    scenarios, scenario_weights = list(weights), list(weights.values())
+
+    async def _virtual_user(index: int) -> None:
+        # У каждого виртуального пользователя свой бариста: обновления одного пользователя не перемешиваются
+        telegram_id = BARISTA_TELEGRAM_BASE - index
+        while budget[0] > 0:
+            scenario = random.choices(scenarios, scenario_weights)[0]
+            steps = _scenario_updates(scenario, telegram_id, NEW_USER_TELEGRAM_BASE - next(new_user_ids), cafe_id, slot_day)
+            budget[0] -= len(steps)
+            for step, raw in steps:
+                update = Update.model_validate(raw, context={"bot": bot})
+                started = time.perf_counter()
+                await dp.feed_update(bot, update)
+                latencies[step].append(time.perf_counter() - started)
+
+    await asyncio.gather(*(_virtual_user(i) for i in range(concurrency)))
+    return latencies, sum(len(samples) for samples in latencies.values())
+
+
+async def run(updates: int, concurrency: int, mix: str, api_latency: float, use_sqlite: bool, use_fakeredis: bool) -> None:
+    weights = _parse_mix(mix)
+    settings = get_settings()
+
+    session_factory, db_engine, db_file = AsyncSessionLocal, engine, None
+    if use_sqlite:
+        fd, db_file = tempfile.mkstemp(suffix=".sqlite3")
+        os.close(fd)
+        # SQLite допускает одного писателя: одно соединение на всех, обновления ждут его в пуле
+        db_engine = create_async_engine(
+            f"sqlite+aiosqlite:///{db_file}", poolclass=AsyncAdaptedQueuePool, pool_size=1, max_overflow=0, pool_timeout=300
+        )
+        async with db_engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(db_engine, expire_on_commit=False, autoflush=False)
+
+    redis_client = None
+    if use_fakeredis:
+        try:
+            from fakeredis import FakeAsyncRedis
+        except ImportError:
+            sys.exit("--fakeredis needs the fakeredis package")
+        redis_client = FakeAsyncRedis()
+
+    slot_day = date.today() + timedelta(days=1)
+    cafe_id, _ = await _seed(session_factory, concurrency, slot_day, seats=concurrency)
+    session = FakeSession(api_latency)
+    bot = create_bot(settings, session=session)
+    try:
+        dp = await create_dispatcher(settings, session_factory=session_factory, redis_client=redis_client)
+        await dp.emit_startup(bot=bot)
+        started = time.perf_counter()
+        latencies, total = await _drive(dp, bot, updates, concurrency, weights, cafe_id, slot_day)
+        elapsed = time.perf_counter() - started
+        _report(latencies, total, elapsed, session)
+        try:
+            await dp.emit_shutdown(bot=bot)
+        except Exception as e:  # Например, fakeredis без aclose() у хранилища FSM
+            print(f"dispatcher shutdown failed: {e!r}")
+    finally:
+        await bot.session.close()
+        await _cleanup(session_factory, cafe_id)
+        await db_engine.dispose()
+        if db_file:
+            os.unlink(db_file)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=50, help="Одновременных виртуальных пользователей")
+    parser.add_argument("--mix", default="start=4,registration=1,available_slots=3,booking=2")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Задержка ответа фейкового Bot API, секунд")
+    parser.add_argument("--sqlite", action="store_true", help="Временная БД SQLite вместо DATABASE_URL")
+    parser.add_argument("--fakeredis", action="store_true", help="fakeredis вместо REDIS_URL")
+    args = parser.parse_args()
+    asyncio.run(run(args.updates, args.concurrency, args.mix, args.api_latency, args.sqlite, args.fakeredis))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+"""
+Проверка планов запросов сервисов: ни один не должен читать bookings, slots или users
+последовательным сканированием (Seq Scan) - только по индексам миграции 0002.
+
+Запуск (из каталога, содержащего пакет src, с DATABASE_URL на тестовую БД после alembic upgrade head):
+    python -m src.benchmarks.explain_indexes --cafes 20 --baristas 100 --days 90
+
+Скрипт заполняет БД данными реалистичной формы (кофейни, бариста и ожидающие
+подтверждения, по четыре смены в день, история броней и будущие брони), выполняет
+ANALYZE и вызывает методы сервисов, перехватывая выполненные ими SQL-запросы.
+Для каждого запроса с теми же параметрами выполняется EXPLAIN (FORMAT JSON).
+Код возврата 1, если в каком-либо плане есть Seq Scan по проверяемым таблицам.
+Созданные данные удаляются в конце.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import delete, event, insert, select
+
+from src.models import Booking, BookingStatus, Cafe, Slot, User, UserRole
+from src.services.booking import BookingService
+from src.services.slot import SlotService
+from src.services.user import UserService
+
+CHECKED_TABLES = frozenset({"bookings", "slots", "users"})
+# telegram_id созданных пользователей: отрицательные, чтобы не пересечься с настоящими
+TELEGRAM_BASE = -(3 * 10**12)
+SHIFT_HOURS = ((8, 12), (12, 16), (16, 20), (20, 24))
+PENDING_PER_CAFE = 20
+
+
+@contextmanager
+def capture_statements(engine) -> Iterator[List[Tuple[str, Any]]]:
+    """Собирает (SQL, параметры) запросов, выполненных через engine внутри блока."""
+    captured: List[Tuple[str, Any]] = []
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield captured
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+def _seq_scans(plan: Dict[str, Any]) -> List[str]:
+    """Таблицы из CHECKED_TABLES, которые узлы плана читают последовательно."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in CHECKED_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", ()):
+        found.extend(_seq_scans(child))
+    return found
+
+
+async def _seed(session_factory, tag: str, cafes: int, baristas: int, days: int) -> Dict[str, Any]:
+    today = date.today()
+    first_day = today - timedelta(days=days - days // 3)
+    async with session_factory() as session:
+        cafe_ids = list((await session.execute(
+            insert(Cafe).returning(Cafe.id),
+            [{"name": f"{tag}_{i}", "address": "bench", "phone_number": "0"} for i in range(cafes)],
+        )).scalars())
+
+        users = []
+        for c, cafe_id in enumerate(cafe_ids):
+            for i in range(baristas + PENDING_PER_CAFE):
+                users.append({
+                    "telegram_id": TELEGRAM_BASE - c * (baristas + PENDING_PER_CAFE) - i,
+                    "first_name": f"{tag}_{c}_{i}",
+                    "role": UserRole.BARISTA if i < baristas else UserRole.PENDING,
+                    "cafe_id": cafe_id,
+                })
+        await session.execute(insert(User), users)
+        rows = await session.execute(
+            select(User.id, User.cafe_id).where(User.cafe_id.in_(cafe_ids), User.role == UserRole.BARISTA).order_by(User.id)
+        )
+        baristas_by_cafe: Dict[int, List[int]] = {}
+        for user_id, cafe_id in rows:
+            baristas_by_cafe.setdefault(cafe_id, []).append(user_id)
+
+        slots = []
+        for cafe_id in cafe_ids:
+            for d in range(days):
+                day = first_day + timedelta(days=d)
+                for start_hour, end_hour in SHIFT_HOURS:
+                    start = datetime.combine(day, dt_time(), tzinfo=timezone.utc)
+                    slots.append({
+                        "cafe_id": cafe_id,
+                        "start_time": start + timedelta(hours=start_hour),
+                        "end_time": start + timedelta(hours=end_hour),
+                        "required_baristas": 3,
+                    })
+        await session.execute(insert(Slot), slots)
+        now = datetime.now(timezone.utc)
+        slot_rows = (await session.execute(
+            select(Slot.id, Slot.cafe_id, Slot.start_time > now).where(Slot.cafe_id.in_(cafe_ids)).order_by(Slot.id)
+        )).all()
+
+        # Две брони на слот; смены одной кофейни не пересекаются, поэтому активные брони
+        # не нарушают ex_booking_barista_shift. Прошлые - в завершающих статусах
+        bookings = []
+        for index, (slot_id, cafe_id, is_future) in enumerate(slot_rows):
+            staff = baristas_by_cafe[cafe_id]
+            for k in range(2):
+                if not is_future:
+                    status = (BookingStatus.COMPLETED, BookingStatus.CANCELED, BookingStatus.NO_SHOW)[(index + k) % 3]
+                else:
+                    status = (BookingStatus.BOOKED, BookingStatus.CONFIRMED_WORK, BookingStatus.CANCELED)[(index + k) % 3]
+                bookings.append({"barista_id": staff[(index * 2 + k) % len(staff)], "slot_id": slot_id, "status": status})
+        await session.execute(insert(Booking), bookings)
+        await session.commit()
+
+    future_slots = [slot_id for slot_id, cafe_id, is_future in slot_rows if is_future and cafe_id == cafe_ids[0]]
+    return {
+        "cafe_ids": cafe_ids,
+        "cafe_id": cafe_ids[0],
+        "barista_id": baristas_by_cafe[cafe_ids[0]][0],
+        "slot_id": future_slots[0],
+        "slot_ids": future_slots[:5],
+        "day": today + timedelta(days=1),
+    }
+
+
+async def _cleanup(session_factory, cafe_ids: List[int]) -> None:
+    async with session_factory() as session:
+        slot_ids = select(Slot.id).where(Slot.cafe_id.in_(cafe_ids)).scalar_subquery()
+        await session.execute(delete(Booking).where(Booking.slot_id.in_(slot_ids)))
+        await session.execute(delete(Slot).where(Slot.cafe_id.in_(cafe_ids)))
+        await session.execute(delete(User).where(User.cafe_id.in_(cafe_ids)))
+        await session.execute(delete(Cafe).where(Cafe.id.in_(cafe_ids)))
+        await session.commit()
+
+
+def _checks(seed: Dict[str, Any]):
+    """Название проверки и вызов метода сервиса по сессии."""
+    cafe_id, barista_id, day = seed["cafe_id"], seed["barista_id"], seed["day"]
+    return [
+        ("slots page of cafe", lambda s: SlotService(s).get_available_slots_page(cafe_id, day, day + timedelta(days=6))),
+        ("slots of cafe", lambda s: SlotService(s).get_available_slots_for_cafe(cafe_id, day, day)),
+        ("fill ratios of cafe", lambda s: SlotService(s).get_fill_ratios(day, day, cafe_id)),
+        ("booked count", lambda s: SlotService(s).get_booked_baristas_count(seed["slot_id"])),
+        ("free seats", lambda s: SlotService(s).get_free_seats(seed["slot_ids"])),
+        ("/my_slots", lambda s: SlotService(s).get_user_slots(barista_id)),
+        ("barista bookings", lambda s: BookingService(s).get_barista_bookings(barista_id, profile="listing")),
+        ("upcoming bookings", lambda s: BookingService(s).get_upcoming_bookings_for_user(barista_id)),
+        ("pending users of cafe", lambda s: UserService(s).get_pending_users(cafe_id)),
+        ("pending users page", lambda s: UserService(s).get_users_page(UserRole.PENDING, cafe_id)),
+    ]
+
+
+async def run(session_factory, engine, cafes: int, baristas: int, days: int) -> bool:
+    seed = await _seed(session_factory, f"explain_{int(time.time() * 1000)}", cafes, baristas, days)
+    ok = True
+    try:
+        async with engine.connect() as conn:
+            await conn.exec_driver_sql("ANALYZE bookings, slots, users")
+            await conn.commit()
+
+        for name, call in _checks(seed):
+            async with session_factory() as session:
+                with capture_statements(engine) as captured:
+                    await call(session)
+            scans = []
+            async with engine.connect() as conn:
+                for statement, parameters in captured:
+                    result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+                    plan = result.scalar_one()
+                    if isinstance(plan, str):
+                        plan = json.loads(plan)
+                    scans.extend(_seq_scans(plan[0]["Plan"]))
+            print(f"{name:<24}{len(captured):>3} statements  " + (f"SEQ SCAN on {', '.join(scans)}" if scans else "ok"))
+            ok &= not scans
+    finally:
+        await _cleanup(session_factory, seed["cafe_ids"])
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cafes", type=int, default=20)
+    parser.add_argument("--baristas", type=int, default=100, help="Бариста на кофейню")
+    parser.add_argument("--days", type=int, default=90, help="Дней расписания (две трети - в прошлом)")
+    args = parser.parse_args()
+
+    from src.db.session import AsyncSessionLocal, engine
+
+    async def _main() -> bool:
+        try:
+            return await run(AsyncSessionLocal, engine, args.cafes, args.baristas, args.days)
+        finally:
+            await engine.dispose()
+
+    ok = asyncio.run(_main())
+    print("OK" if ok else "SEQUENTIAL SCAN IN SERVICE QUERIES")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
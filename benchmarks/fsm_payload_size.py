@@ -0,0 +1,61 @@
+"""
+Размер записи данных FSM для выбора слота до и после перехода на компактный формат.
+
+Запуск (из каталога, содержащего пакет src):
+    python -m src.benchmarks.fsm_payload_size --slots 5 10 20 50
+
+"До" - слоты как ORM-объекты Slot с загруженной Cafe (JSON их не сериализует,
+поэтому размер оценивается через pickle, как у любой сериализации объектов).
+"После" - строка pack_slot_refs в JSON, как её сохраняет RedisStorage.
+"""
+import argparse
+import json
+import pickle
+from datetime import datetime, timedelta, timezone
+
+from src.fsm.payload import pack_slot_refs, unpack_slot_refs
+from src.models import Cafe, Slot
+
+
+def _make_slots(count: int) -> list[Slot]:
+    cafe = Cafe(id=1, name="Кофейня на Невском", address="Невский проспект, 1", phone_number="+78120000000")
+    start = datetime(2024, 1, 1, 8, tzinfo=timezone.utc)
+    slots = []
+    for i in range(count):
+        slot = Slot(
+            id=1000 + i,
+            cafe_id=cafe.id,
+            start_time=start + timedelta(hours=i),
+            end_time=start + timedelta(hours=i + 4),
+            required_baristas=2,
+            created_at=start,
+            updated_at=start,
+        )
+        slot.cafe = cafe
+        slots.append(slot)
+    return slots
+
+
+def measure(count: int) -> tuple[int, int, int]:
+    slots = _make_slots(count)
+    orm_bytes = len(pickle.dumps({"available_slots": slots}))
+    ids_bytes = len(json.dumps({"available_slots": [slot.id for slot in slots]}).encode())
+    packed = pack_slot_refs(slots)
+    assert [ref.slot_id for ref in unpack_slot_refs(packed)] == [slot.id for slot in slots]
+    packed_bytes = len(json.dumps({"available_slots": packed}).encode())
+    return orm_bytes, ids_bytes, packed_bytes
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, nargs="+", default=[5, 10, 20, 50])
+    args = parser.parse_args()
+
+    print(f"{'slots':>6} {'ORM (pickle)':>14} {'id list':>10} {'packed v1':>10}")
+    for count in args.slots:
+        orm_bytes, ids_bytes, packed_bytes = measure(count)
+        print(f"{count:>6} {orm_bytes:>14} {ids_bytes:>10} {packed_bytes:>10}")
+
+
+if __name__ == "__main__":
+    main()
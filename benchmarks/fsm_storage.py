@@ -0,0 +1,151 @@
+"""
+Обращения к Redis и время шага многошагового диалога FSM: RedisStorage с TTL
+(SharedRedisStorage) и двухуровневое хранилище с локальным кэшем (CachedRedisStorage).
+
+Запуск (из каталога, содержащего пакет src):
+    python -m src.benchmarks.fsm_storage --users 200 --fakeredis
+
+Каждый виртуальный пользователь проходит диалог создания кофейни (CafeCreationFSM)
+так же, как это делают хендлеры: на каждое обновление get_state (FSMContextMiddleware),
+update_data и set_state, в конце get_data и clear. Для CachedRedisStorage обновление
+обёрнуто в begin_update/flush, как в FSMWriteBehindMiddleware.
+По умолчанию используется Redis из настроек (тестовый!), с --fakeredis - fakeredis в памяти.
+Печатает число обращений к Redis на обновление и время на обновление. Обращения
+считаются по отправкам на соединении, а не по командам клиента: пайплайн - одно
+обращение, а служебные SCRIPT EXISTS/SCRIPT LOAD учитываются отдельно.
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from typing import List, Tuple
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from redis.asyncio.connection import AbstractConnection
+
+from src.fsm.storage import CachedRedisStorage, SharedRedisStorage
+from src.fsm.ttl import dialog_ttls
+from src.handlers.admin_handlers import CafeCreationFSM
+from src.redis_del.client import TimedRedis, redis_manager
+
+# telegram_id виртуальных пользователей: отрицательные, чтобы не пересечься с настоящими
+USER_BASE = -(4 * 10**12)
+STEPS = (
+    (CafeCreationFSM.waiting_for_address, "name", "Кофейня"),
+    (CafeCreationFSM.waiting_for_work_hours, "address", "ул. Тестовая, 1"),
+    (CafeCreationFSM.waiting_for_phone, "work_hours", "08:00-22:00"),
+    (CafeCreationFSM.waiting_for_manager, "phone", "+70000000000"),
+    (CafeCreationFSM.waiting_for_description, "manager_id", 1),
+)
+
+
+class RoundTrips:
+    """Счётчик отправок на соединениях Redis: каждая отправка - одно обращение к серверу."""
+
+    def __init__(self):
+        self.count = 0
+        self._send = AbstractConnection.send_packed_command
+
+    def __enter__(self) -> "RoundTrips":
+        send = self._send
+
+        async def _counted(connection, *args, **kwargs):
+            self.count += 1
+            return await send(connection, *args, **kwargs)
+
+        AbstractConnection.send_packed_command = _counted
+        return self
+
+    def __exit__(self, *exc) -> None:
+        AbstractConnection.send_packed_command = self._send
+
+
+async def _dialog(storage, user_id: int) -> List[float]:
+    key = StorageKey(bot_id=0, chat_id=user_id, user_id=user_id)
+    state = FSMContext(storage, key)
+    cached = isinstance(storage, CachedRedisStorage)
+    samples = []
+
+    async def _update(step) -> None:
+        started = time.perf_counter()
+        token = storage.begin_update() if cached else None
+        try:
+            await state.get_state()
+            await step()
+        finally:
+            if cached:
+                await storage.flush(token)
+        samples.append(time.perf_counter() - started)
+
+    await _update(lambda: state.set_state(CafeCreationFSM.waiting_for_name))
+    for next_state, field, value in STEPS:
+        async def _step(next_state=next_state, field=field, value=value):
+            await state.update_data({field: value})
+            await state.set_state(next_state)
+        await _update(_step)
+
+    async def _finish():
+        await state.get_data()
+        await state.clear()
+    await _update(_finish)
+    return samples
+
+
+async def _measure(storage, users: int, concurrency: int) -> Tuple[List[float], int]:
+    samples: List[float] = []
+    queue = list(range(users))
+
+    async def _worker() -> None:
+        while queue:
+            samples.extend(await _dialog(storage, USER_BASE - queue.pop()))
+
+    with RoundTrips() as round_trips:
+        await asyncio.gather(*(_worker() for _ in range(concurrency)))
+    return samples, round_trips.count
+
+
+def _report(name: str, samples: List[float], round_trips: int) -> None:
+    samples = sorted(samples)
+    print(
+        f"{name:<22}{round_trips / len(samples):>8.2f} round trips/update"
+        f"{statistics.median(samples) * 1e6:>12.1f} us p50{samples[int(len(samples) * 0.99) - 1] * 1e6:>12.1f} us p99"
+    )
+
+
+async def run(users: int, concurrency: int, use_fakeredis: bool) -> None:
+    if use_fakeredis:
+        try:
+            from fakeredis import FakeServer
+            from fakeredis.aioredis import FakeConnection
+        except ImportError:
+            sys.exit("--fakeredis needs the fakeredis package")
+        from redis.asyncio import ConnectionPool
+        redis = TimedRedis(connection_pool=ConnectionPool(connection_class=FakeConnection, server=FakeServer()))
+    else:
+        redis = redis_manager.client()
+
+    try:
+        shared = SharedRedisStorage(redis=redis, ttls=dialog_ttls)
+        _report("SharedRedisStorage", *await _measure(shared, users, concurrency))
+        cached = CachedRedisStorage(redis=redis, ttls=dialog_ttls, maxsize=users, local_ttl=300)
+        _report("CachedRedisStorage", *await _measure(cached, users, concurrency))
+    finally:
+        if use_fakeredis:
+            await redis.connection_pool.disconnect()
+        else:
+            await redis_manager.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--fakeredis", action="store_true", help="fakeredis вместо REDIS_URL")
+    args = parser.parse_args()
+    asyncio.run(run(args.users, args.concurrency, args.fakeredis))
+
+
+if __name__ == "__main__":
+    main()
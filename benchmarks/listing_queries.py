@@ -0,0 +1,113 @@
+"""
+Проверка числа SQL-запросов при выводе списков слотов и броней.
+
+Запуск (из каталога, содержащего пакет src, с настроенным .env / DATABASE_URL на тестовую БД):
+    python -m src.benchmarks.listing_queries --slots 50
+
+Скрипт создаёт кофейню, день из N слотов и брони одного бариста, затем строит
+клавиатуру выбора слотов и текст /my_slots и считает выполненные запросы.
+С профилем "listing" их число не зависит от N; с профилем "default" каждая
+строка подгружает slot.cafe отдельным запросом (в AsyncSession это ошибка).
+"""
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import delete, event
+
+from src.keyboards.inline import get_slots_keyboard
+from src.models import Booking, BookingStatus, Cafe, Slot, User, UserRole
+from src.services.booking import BookingService
+from src.services.slot import SlotService
+
+
+@contextmanager
+def count_statements(engine):
+    """Считает SQL-запросы, выполненные через engine внутри блока."""
+    counter = {"statements": 0}
+
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter["statements"] += 1
+
+    event.listen(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", _before_cursor_execute)
+
+
+async def run(session_factory, engine, slots_count: int) -> bool:
+    day = date.today() + timedelta(days=1)
+    async with session_factory() as session:
+        tag = f"listing_{int(time.time() * 1000)}"
+        cafe = Cafe(name=tag, address="bench", phone_number="0")
+        barista = User(telegram_id=-(10**12), first_name=tag, role=UserRole.BARISTA)
+        session.add_all([cafe, barista])
+        await session.flush()
+        start = datetime.combine(day, datetime.min.time())
+        slots = [
+            Slot(cafe_id=cafe.id, start_time=start + timedelta(minutes=10 * i),
+                 end_time=start + timedelta(minutes=10 * i + 60), required_baristas=1)
+            for i in range(slots_count)
+        ]
+        session.add_all(slots)
+        await session.flush()
+        session.add_all([Booking(barista_id=barista.id, slot_id=slot.id, status=BookingStatus.BOOKED) for slot in slots])
+        await session.commit()
+        cafe_id, barista_id = cafe.id, barista.id
+
+    ok = True
+    try:
+        async with session_factory() as session:
+            with count_statements(engine) as counter:
+                listed = await SlotService(session).get_available_slots_page(cafe_id, day, day)
+                get_slots_keyboard(listed)
+            print(f"slots keyboard (page of {len(listed.items)} slots): {counter['statements']} statements")
+            ok &= counter["statements"] == 1
+
+        async with session_factory() as session:
+            with count_statements(engine) as counter:
+                my_slots = await SlotService(session).get_user_slots(barista_id, profile="listing")
+                "".join(f"- {slot.start_time} - {slot.end_time}, Кофейня: {slot.cafe.name}\n" for slot in my_slots)
+            print(f"/my_slots ({len(my_slots)} slots): {counter['statements']} statements")
+            ok &= counter["statements"] == 1
+
+        async with session_factory() as session:
+            with count_statements(engine) as counter:
+                bookings = await BookingService(session).get_barista_bookings(barista_id, profile="listing")
+                [booking.slot.cafe.name for booking in bookings]
+            print(f"bookings list ({len(bookings)} bookings): {counter['statements']} statements")
+            ok &= counter["statements"] == 1
+    finally:
+        async with session_factory() as session:
+            await session.execute(delete(Booking).where(Booking.barista_id == barista_id))
+            await session.execute(delete(Slot).where(Slot.cafe_id == cafe_id))
+            await session.execute(delete(User).where(User.id == barista_id))
+            await session.execute(delete(Cafe).where(Cafe.id == cafe_id))
+            await session.commit()
+    return ok
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--slots", type=int, default=50)
+    args = parser.parse_args()
+
+    from src.db.session import AsyncSessionLocal, engine
+
+    async def _main() -> bool:
+        try:
+            return await run(AsyncSessionLocal, engine, args.slots)
+        finally:
+            await engine.dispose()
+
+    ok = asyncio.run(_main())
+    print("OK" if ok else "STATEMENT COUNT DEPENDS ON LIST SIZE")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Проверка логирования в воркерах, запущенных через fork (WEBHOOK_WORKERS > 1 и BOT_MODE=sharded):
+родитель вызывает setup_logging, затем дочерний процесс вызывает его снова и пишет запись.
+Запись должна дойти до stderr воркера - иначе воркер складывает записи в очередь без потока вывода.
+
+Запуск (из каталога, содержащего пакет src):
+    python -m src.benchmarks.log_fork
+
+Код возврата 1, если запись воркера не выведена.
+"""
+import logging
+import multiprocessing
+import os
+import sys
+
+from src.config import get_settings
+from src.log import setup_logging, shutdown_logging
+
+MARKER = "forked worker log record"
+OUTPUT_TIMEOUT = 10.0
+
+
+def _worker(write_fd: int) -> None:
+    # stderr воркера - в канал, который читает родитель
+    os.dup2(write_fd, sys.stderr.fileno())
+    setup_logging(get_settings())
+    try:
+        logging.getLogger(__name__).warning(MARKER)
+    finally:
+        shutdown_logging()
+
+
+def main() -> None:
+    if "fork" not in multiprocessing.get_all_start_methods():
+        sys.exit("fork start method is not available on this platform")
+    setup_logging(get_settings())
+    logging.getLogger(__name__).info("Parent logging is set up")
+
+    read_fd, write_fd = os.pipe()
+    process = multiprocessing.get_context("fork").Process(target=_worker, args=(write_fd,))
+    process.start()
+    os.close(write_fd)
+    process.join(OUTPUT_TIMEOUT)
+    with os.fdopen(read_fd, encoding="utf-8", errors="replace") as pipe:
+        output = pipe.read() if process.exitcode is not None else ""
+    if process.is_alive():
+        process.kill()
+
+    if MARKER not in output:
+        print(f"FAIL: worker record was not emitted (exit code {process.exitcode})")
+        sys.exit(1)
+    print("OK: worker record was emitted")
+
+
+if __name__ == "__main__":
+    main()
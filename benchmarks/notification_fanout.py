@@ -0,0 +1,91 @@
+"""
+Рассылка уведомлений через notification_service на фейковый Bot.
+
+Запуск:
+    python -m src.benchmarks.notification_fanout --recipients 200 --rate 25 --latency 0.05 --flood-every 100
+
+Фейковый бот отвечает с задержкой --latency и на каждый --flood-every вызов
+возвращает RetryAfter. Печатает время постановки в очередь (то, что ждёт обработчик),
+время полной доставки, фактическую частоту отправки и счётчики сервиса.
+"""
+import argparse
+import asyncio
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import SendMessage
+
+from src.metrics import registry
+from src.services.notifications import NotificationService
+
+
+class FakeBot:
+    """Минимальная замена Bot: записывает отправленные сообщения."""
+
+    def __init__(self, latency: float, flood_every: int, retry_after: int = 1):
+        self.latency = latency
+        self.flood_every = flood_every
+        self.retry_after = retry_after
+        self.calls = 0
+        self.sent: Dict[int, List[float]] = defaultdict(list)
+
+    async def send_message(self, chat_id: int, text: str) -> None:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.flood_every and self.calls % self.flood_every == 0:
+            raise TelegramRetryAfter(
+                method=SendMessage(chat_id=chat_id, text=text),
+                message="Flood control exceeded",
+                retry_after=self.retry_after,
+            )
+        self.sent[chat_id].append(time.monotonic())
+
+
+async def run(recipients: int, messages_per_chat: int, workers: int, rate: float, latency: float, flood_every: int) -> None:
+    bot = FakeBot(latency=latency, flood_every=flood_every)
+    service = NotificationService(
+        workers=workers,
+        global_rate=rate,
+        chat_interval=1.0,
+        max_retries=5,
+        retry_base_delay=0.5,
+        queue_size=recipients * messages_per_chat,
+    )
+    service.start(bot)
+
+    started = time.perf_counter()
+    for n in range(messages_per_chat):
+        service.notify_many(range(1, recipients + 1), f"Уведомление {n}")
+    enqueued = time.perf_counter() - started
+    await service.join()
+    delivered = time.perf_counter() - started
+    await service.stop()
+
+    total = sum(len(times) for times in bot.sent.values())
+    min_gap = min(
+        (later - earlier for times in bot.sent.values() for earlier, later in zip(times, times[1:])),
+        default=None,
+    )
+    print(f"enqueue: {enqueued * 1000:.2f} ms for {recipients * messages_per_chat} notifications")
+    print(f"delivered {total} in {delivered:.2f} s ({total / delivered:.1f} msg/s, limit {rate})")
+    if min_gap is not None:
+        print(f"min gap between messages to one chat: {min_gap:.2f} s")
+    print({name: value for name, value in registry.snapshot().items() if name.startswith("notifications_")})
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recipients", type=int, default=200)
+    parser.add_argument("--messages-per-chat", type=int, default=1)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=25.0)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--flood-every", type=int, default=100)
+    args = parser.parse_args()
+    asyncio.run(run(args.recipients, args.messages_per_chat, args.workers, args.rate, args.latency, args.flood_every))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Генерация расписания: create_schedule (один INSERT ... RETURNING) против create_slot в цикле.
+
+Запуск (из каталога, содержащего пакет src, с настроенным .env / DATABASE_URL на тестовую БД):
+    python -m src.benchmarks.schedule_bulk --cafes 5 --weeks 4
+
+Скрипт создаёт кофейни, строит расписание по шаблону "3 смены в день, 7 дней в неделю"
+обоими способами, печатает число SQL-запросов и время, затем повторяет create_schedule
+и проверяет, что все смены пропущены как пересекающиеся. Созданные данные удаляются.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from datetime import date, time as dtime, timedelta
+
+from sqlalchemy import delete
+
+from src.benchmarks.listing_queries import count_statements
+from src.db.session import AsyncSessionLocal, commit, engine
+from src.models import Cafe, Slot
+from src.services.slot import ShiftTemplate, SlotService, expand_schedule
+
+TEMPLATE = [
+    ShiftTemplate(weekday, start, end, 2)
+    for weekday in range(7)
+    for start, end in ((dtime(7), dtime(12)), (dtime(12), dtime(17)), (dtime(17), dtime(22)))
+]
+
+
+async def _seed_cafes(count: int, tag: str) -> list[int]:
+    async with AsyncSessionLocal() as session:
+        cafes = [Cafe(name=f"{tag}_{i}", address="bench", phone_number="0") for i in range(count)]
+        session.add_all(cafes)
+        await session.commit()
+        return [cafe.id for cafe in cafes]
+
+
+async def _cleanup(cafe_ids: list[int]) -> None:
+    async with AsyncSessionLocal() as session:
+        await session.execute(delete(Slot).where(Slot.cafe_id.in_(cafe_ids)))
+        await session.execute(delete(Cafe).where(Cafe.id.in_(cafe_ids)))
+        await session.commit()
+
+
+async def run(cafes: int, weeks: int) -> bool:
+    tag = f"schedule_{int(time.time() * 1000)}"
+    start_date = date.today() + timedelta(days=1)
+    bulk_cafes = await _seed_cafes(cafes, f"{tag}_bulk")
+    loop_cafes = await _seed_cafes(cafes, f"{tag}_loop")
+    try:
+        async with AsyncSessionLocal() as session:
+            with count_statements(engine) as statements:
+                started = time.perf_counter()
+                result = await SlotService(session).create_schedule(bulk_cafes, TEMPLATE, start_date, weeks)
+                await commit(session)
+                bulk_time = time.perf_counter() - started
+        print(f"create_schedule: {len(result.created)} slots, {statements['statements']} statements, {bulk_time * 1000:.1f} ms")
+
+        shifts = expand_schedule(TEMPLATE, start_date, weeks)
+        async with AsyncSessionLocal() as session:
+            service = SlotService(session)
+            with count_statements(engine) as statements:
+                started = time.perf_counter()
+                for cafe_id in loop_cafes:
+                    for start, end, required in shifts:
+                        await service.create_slot(cafe_id, start, end, required)
+                await commit(session)
+                loop_time = time.perf_counter() - started
+        print(f"create_slot loop: {len(shifts) * cafes} slots, {statements['statements']} statements, {loop_time * 1000:.1f} ms")
+
+        async with AsyncSessionLocal() as session:
+            repeat = await SlotService(session).create_schedule(bulk_cafes, TEMPLATE, start_date, weeks)
+            await commit(session)
+        print(f"repeat create_schedule: {len(repeat.created)} created, {repeat.skipped} skipped as overlapping")
+        return len(result.created) == len(shifts) * cafes and not repeat.created
+    finally:
+        await _cleanup(bulk_cafes + loop_cafes)
+        await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cafes", type=int, default=5)
+    parser.add_argument("--weeks", type=int, default=4)
+    args = parser.parse_args()
+    ok = asyncio.run(run(args.cafes, args.weeks))
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Пропускная способность шардированного рантайма в зависимости от числа воркеров.
+
+Запуск:
+    python -m src.benchmarks.sharding_throughput --workers 1 2 4 --updates 2000 --users 200 --work 20000
+
+Каждый воркер поднимает свой Dispatcher (MemoryStorage, без БД и Redis) с обработчиком,
+который выполняет --work итераций CPU-нагрузки. Печатает обработанные обновления в секунду.
+"""
+import argparse
+import asyncio
+import functools
+import multiprocessing
+import random
+import time
+from typing import Any
+
+from aiogram import Bot, Dispatcher, F
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Message
+
+from src.benchmarks.updates import message_update
+from src.sharding import ShardedRuntime, consume_updates
+
+# Токен нужного формата: в бенчмарке к Telegram API не обращаемся
+BENCH_TOKEN = "123456789:AAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAAA"
+
+
+def _bench_worker(processed: Any, work: int, index: int, updates: Any, heartbeats: Any) -> None:
+    dp = Dispatcher(storage=MemoryStorage())
+
+    @dp.message(F.text)
+    async def _handler(message: Message) -> None:
+        total = 0
+        for i in range(work):
+            total += i * i
+        with processed.get_lock():
+            processed.value += 1
+
+    async def _main() -> None:
+        bot = Bot(token=BENCH_TOKEN)
+        try:
+            await consume_updates(dp, bot, updates, heartbeats, index)
+        finally:
+            await bot.session.close()
+
+    asyncio.run(_main())
+
+
+def _wait_for(processed: Any, expected: int) -> None:
+    while processed.value < expected:
+        time.sleep(0.01)
+
+
+def run(workers: int, updates: int, users: int, work: int) -> float:
+    """Прогнать updates обновлений через workers воркеров, вернуть обновлений в секунду."""
+    processed = multiprocessing.Value("i", 0)
+    runtime = ShardedRuntime(
+        workers,
+        heartbeat_timeout=60.0,
+        worker_target=functools.partial(_bench_worker, processed, work),
+    )
+    runtime.start()
+    try:
+        # Прогрев: по одному обновлению на шард, чтобы не мерить запуск процессов
+        for user_id in range(workers):
+            runtime.dispatch(message_update(user_id, "warmup"))
+        _wait_for(processed, workers)
+
+        batch = [message_update(random.randint(1, users), "bench") for _ in range(updates)]
+        started = time.perf_counter()
+        for update in batch:
+            runtime.dispatch(update)
+        _wait_for(processed, workers + updates)
+        elapsed = time.perf_counter() - started
+    finally:
+        runtime.stop(timeout=10.0)
+    return updates / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--updates", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--work", type=int, default=20000, help="итераций CPU-нагрузки на обновление")
+    args = parser.parse_args()
+
+    baseline = None
+    for workers in args.workers:
+        rate = run(workers, args.updates, args.users, args.work)
+        baseline = baseline or rate
+        print(f"workers={workers}: {rate:.0f} updates/s (x{rate / baseline:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Задержка обработчика /start с кэшированными клавиатурами меню и без кэша.
+
+Запуск:
+    python -m src.benchmarks.start_latency --iterations 20000
+
+Обработчик cmd_start вызывается напрямую с фейковым Message (answer ничего не отправляет)
+по очереди для администратора, управляющего и бариста. Режим "uncached" подменяет
+функции клавиатур их исходными (некэшированными) версиями - так, как было до кэша.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from contextlib import contextmanager
+
+from src.handlers import start
+from src.keyboards import reply
+from src.models import User, UserRole
+
+ROLES = (UserRole.ADMIN, UserRole.MANAGER, UserRole.BARISTA)
+KEYBOARD_GETTERS = ("get_admin_menu_keyboard", "get_manager_menu_keyboard", "get_barista_menu_keyboard")
+
+
+class _FakeMessage:
+    async def answer(self, text, reply_markup=None, **kwargs):
+        return None
+
+
+@contextmanager
+def _uncached():
+    """Временно вернуть в модуль start некэшированные версии клавиатур."""
+    originals = {name: getattr(start, name) for name in KEYBOARD_GETTERS}
+    for name in KEYBOARD_GETTERS:
+        setattr(start, name, getattr(reply, name).__wrapped__)
+    try:
+        yield
+    finally:
+        for name, value in originals.items():
+            setattr(start, name, value)
+
+
+async def _measure(iterations: int) -> list[float]:
+    message = _FakeMessage()
+    users = [User(role=role, first_name="Bench") for role in ROLES]
+    samples = []
+    for i in range(iterations):
+        user = users[i % len(users)]
+        started = time.perf_counter()
+        await start.cmd_start(message, state=None, current_user=user)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def _report(name: str, samples: list[float]) -> None:
+    samples = sorted(samples)
+    print(
+        f"{name}: median {statistics.median(samples) * 1e6:.1f} us, "
+        f"p99 {samples[int(len(samples) * 0.99) - 1] * 1e6:.1f} us"
+    )
+
+
+async def run(iterations: int) -> None:
+    with _uncached():
+        before = await _measure(iterations)
+    reply.prebuild_keyboards()
+    after = await _measure(iterations)
+    _report("uncached keyboards", before)
+    _report("cached keyboards  ", after)
+    print(f"speedup: x{statistics.median(before) / statistics.median(after):.1f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+    asyncio.run(run(args.iterations))
+
+
+if __name__ == "__main__":
+    main()
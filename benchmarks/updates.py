@@ -0,0 +1,51 @@
+"""Построение синтетических обновлений Telegram (в виде JSON-словарей) для нагрузочных скриптов."""
+import itertools
+import time
+from typing import Any, Dict
+
+_update_ids = itertools.count(1)
+_message_ids = itertools.count(1)
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "language_code": "ru"}
+
+
+def _message(user_id: int, text: str) -> Dict[str, Any]:
+    message = {
+        "message_id": next(_message_ids),
+        "date": int(time.time()),
+        "chat": {"id": user_id, "type": "private", "first_name": f"User{user_id}"},
+        "from": _user(user_id),
+        "text": text,
+    }
+    if text.startswith("/"):
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return message
+
+
+def message_update(user_id: int, text: str) -> Dict[str, Any]:
+    """Обновление с текстовым сообщением (команды размечаются как bot_command)."""
+    return {"update_id": next(_update_ids), "message": _message(user_id, text)}
+
+
+def contact_update(user_id: int, phone_number: str) -> Dict[str, Any]:
+    """Обновление с контактом пользователя (кнопка "Поделиться номером телефона")."""
+    message = _message(user_id, "")
+    del message["text"]
+    message["contact"] = {"phone_number": phone_number, "first_name": f"User{user_id}", "user_id": user_id}
+    return {"update_id": next(_update_ids), "message": message}
+
+
+def callback_update(user_id: int, data: str) -> Dict[str, Any]:
+    """Обновление с нажатием inline-кнопки."""
+    return {
+        "update_id": next(_update_ids),
+        "callback_query": {
+            "id": str(next(_update_ids)),
+            "from": _user(user_id),
+            "chat_instance": str(user_id),
+            "data": data,
+            "message": _message(user_id, "inline keyboard"),
+        },
+    }
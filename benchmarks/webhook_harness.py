@@ -0,0 +1,66 @@
+"""
+Отправка синтетических обновлений на локальный webhook-сервер.
+
+Запуск (бот должен быть запущен с BOT_MODE=webhook):
+    python -m src.benchmarks.webhook_harness --url http://127.0.0.1:8080/webhook --updates 1000 --concurrency 50
+
+Печатает распределение HTTP-статусов, время ответа и число принятых обновлений в секунду.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import time
+from collections import Counter
+
+import aiohttp
+
+from src.benchmarks.updates import message_update
+
+
+async def run(url: str, updates: int, concurrency: int, users: int, secret: str | None, text: str) -> None:
+    headers = {"X-Telegram-Bot-Api-Secret-Token": secret} if secret else {}
+    statuses: Counter = Counter()
+    latencies: list[float] = []
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(updates):
+        queue.put_nowait(message_update(random.randint(1, users), text))
+
+    async def _worker(http: aiohttp.ClientSession) -> None:
+        while not queue.empty():
+            update = queue.get_nowait()
+            started = time.perf_counter()
+            try:
+                async with http.post(url, json=update, headers=headers) as response:
+                    await response.read()
+                    statuses[response.status] += 1
+            except aiohttp.ClientError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    async with aiohttp.ClientSession() as http:
+        await asyncio.gather(*(_worker(http) for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    print(f"statuses: {dict(statuses)}")
+    print(f"{updates} updates in {elapsed:.2f}s: {updates / elapsed:.0f} updates/s")
+    print(f"latency p50={statistics.median(latencies) * 1000:.1f}ms "
+          f"p99={latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--updates", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100, help="Число различных from_user.id")
+    parser.add_argument("--secret", default=None, help="WEBHOOK_SECRET, если задан")
+    parser.add_argument("--text", default="/start")
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.updates, args.concurrency, args.users, args.secret, args.text))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,30 +1,42 @@
 import asyncio
 import logging
-from typing import Callable, Dict, Any, Awaitable, Union
+from typing import Callable, Dict, Any, Awaitable, Optional, Union
 
 from aiogram import Bot, Dispatcher, BaseMiddleware, Router
+from aiohttp import web
+from redis.asyncio import Redis
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.redis import RedisStorage
+from aiogram.client.session.base import BaseSession
 from aiogram.types import Message, CallbackQuery
 from sqlalchemy.ext.asyncio import AsyncSession
 # from redis.asyncio import Redis
 
-from handlers import manager_handlers
-from src.config import get_settings
-from src.db.session import AsyncSessionLocal
-from src.redis_del.client import get_redis_client
+from src.config import Settings, get_settings
+from src.log import HandlerLogContextMiddleware, UpdateLogContextMiddleware, setup_logging
+from src.metrics import start_metrics_server
+from src.middlewares.metrics import HandlerMetricsMiddleware, TelegramRequestMetricsMiddleware, UpdateMetricsMiddleware
+from src.db.session import AsyncSessionLocal, LazySession
+from src.fsm.storage import AbandonedDialogSweeper, CachedRedisStorage, FSMWriteBehindMiddleware, SharedRedisStorage, fsm_local_cache_enabled
+from src.fsm.ttl import dialog_ttls
+from src.redis_del.client import get_redis_client, redis_manager
+from src.redis_del.availability import availability_index
+from src.redis_del.staff_roster import staff_roster
+from src.redis_del.user_cache import user_cache
 from aiogram.types import Message, TelegramObject 
 
 # Импортируем все наши роутеры
 # from src.handlers import start, registration, barista_slots, admin_handlers, manager_handlers, common
-from src.handlers import start, registration, common, barista_slots, admin_handlers
+from src.handlers import start, registration, common, barista_slots, admin_handlers, manager_handlers
 from src.middlewares.role_check import UserRegisterMiddleware, RoleMiddleware
+from src.keyboards.reply import prebuild_keyboards
 from src.models import UserRole
+from src.services.notifications import notification_service
+from src.services.slot import SlotService
 
 logger = logging.getLogger(__name__)
 # redis_client = Redis(host='localhost', port=6379, db=0)
 
-# --- ИСПРАВЛЕННЫЙ Middleware для инъекции сессии ---
+# --- Middleware для инъекции ленивой сессии ---
 class DBSessionMiddleware(BaseMiddleware):
     def __init__(self, session_pool: Callable[[], AsyncSession]):
         super().__init__()
@@ -36,50 +48,148 @@ class DBSessionMiddleware(BaseMiddleware):
             event: TelegramObject,
             data: Dict[str, Any],
     ) -> Any:
-        async with self.session_pool() as session: # Открываем сессию
-            data["session"] = session
-
-            try:
-                # Теперь вызываем следующий handler в цепочке, передавая ему event и data
-                result = await handler(event, data)
-                await session.commit()
-            except Exception as e:
-                print(f"Ошибка в обработчике: {e}")
-                await session.rollback()
-                raise
-            return result
+        # Соединение из пула берётся только при первом обращении к сессии
+        session = LazySession(self.session_pool)
+        data["session"] = session
 
-async def main() -> None:
-    settings = get_settings()
+        try:
+            result = await handler(event, data)
+        except Exception as e:
+            logger.warning("Handler failed, rolling back the session: %s", e)
+            await session.finish(commit=False)
+            raise
+        await session.finish(commit=True)
+        return result
 
-    # Инициализация бота
+def create_bot(settings: Settings, session: Optional[BaseSession] = None) -> Bot:
+    """Создать экземпляр бота с настройками по умолчанию (session - своя сессия Bot API, например в бенчмарках)."""
     bot = Bot(
         token=settings.TELEGRAM_BOT_TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode="HTML")
     )
+    bot.session.middleware(TelegramRequestMetricsMiddleware())
+    return bot
+
+
+async def start_metrics(settings: Settings, worker_index: int = 0) -> Optional[web.AppRunner]:
+    """Поднять /metrics для процесса (порт METRICS_PORT + номер воркера). Ошибка порта не мешает работе бота."""
+    if not settings.METRICS_PORT:
+        return None
+    try:
+        return await start_metrics_server(settings.METRICS_HOST, settings.METRICS_PORT + worker_index)
+    except OSError as e:
+        logger.warning("Metrics endpoint is not available: %s", e)
+        return None
+
+
+async def _start_notifications(bot: Bot) -> None:
+    notification_service.start(bot)
+
+
+async def _stop_notifications() -> None:
+    await notification_service.stop()
+
+
+async def _start_user_cache_listener() -> None:
+    user_cache.start_invalidation_listener()
+
+
+async def _stop_user_cache_listener() -> None:
+    await user_cache.stop_invalidation_listener()
+
+
+async def _start_staff_roster() -> None:
+    await staff_roster.start()
+
+
+async def _stop_staff_roster() -> None:
+    await staff_roster.stop()
 
-    # Инициализация Redis для FSM
-    redis_client = await get_redis_client()
+
+async def _close_redis() -> None:
+    await redis_manager.close()
+
+
+async def create_dispatcher(
+    settings: Settings,
+    session_factory: Optional[Callable[[], AsyncSession]] = None,
+    redis_client: Optional[Redis] = None,
+) -> Dispatcher:
+    """
+    Создать диспетчер со всеми middleware и роутерами.
+    Используется и в режиме long polling, и в режиме webhook.
+    session_factory и redis_client по умолчанию берутся из настроек (подменяются в бенчмарках).
+    """
+    session_factory = session_factory or AsyncSessionLocal
+    # Общий клиент Redis процесса: FSM, кэши и индекс доступности работают через один пул
+    own_redis = redis_client is None
+    if own_redis:
+        redis_client = await get_redis_client()
     # storage = MemoryStorage(redis=redis_client)
-    storage = RedisStorage(redis=redis_client)
+    # Состояние и данные FSM живут TTL своей группы состояний, брошенные диалоги убирает sweeper.
+    # Если обновления пользователя всегда приходят в этот процесс, горячие диалоги читаются из локального кэша
+    if fsm_local_cache_enabled(settings):
+        storage = CachedRedisStorage(
+            redis=redis_client,
+            ttls=dialog_ttls,
+            maxsize=settings.FSM_LOCAL_CACHE_SIZE,
+            local_ttl=settings.FSM_LOCAL_CACHE_TTL,
+        )
+    else:
+        storage = SharedRedisStorage(redis=redis_client, ttls=dialog_ttls)
+    dialog_sweeper = AbandonedDialogSweeper(storage, dialog_ttls, settings.FSM_SWEEP_INTERVAL)
+
+    # Общий (Redis) уровень кэша пользователей
+    user_cache.setup(redis_client)
+
+    # Индекс доступности слотов: после холодного старта Redis восстанавливаем его из БД
+    availability_index.setup(redis_client)
+    if not await availability_index.is_ready():
+        async with session_factory() as session:
+            await SlotService(session).rebuild_availability_index()
+
+    # Статические клавиатуры меню строятся один раз
+    prebuild_keyboards()
 
     # Инициализация диспетчера
     dp = Dispatcher(storage=storage)
 
+    # Воркеры уведомлений живут столько же, сколько диспетчер
+    dp.startup.register(_start_notifications)
+    dp.shutdown.register(_stop_notifications)
+    # Локальный кэш пользователей получает инвалидации (смена роли и т.п.) из других процессов
+    dp.startup.register(_start_user_cache_listener)
+    dp.shutdown.register(_stop_user_cache_listener)
+    # Состав администраторов/управляющих перечитывается из Redis без перезапуска
+    staff_roster.setup(redis_client)
+    dp.startup.register(_start_staff_roster)
+    dp.shutdown.register(_stop_staff_roster)
+    dp.startup.register(dialog_sweeper.start)
+    dp.shutdown.register(dialog_sweeper.stop)
+    # Пул Redis закрывается последним, после остановки фоновых задач, которые им пользуются
+    if own_redis:
+        dp.shutdown.register(_close_redis)
+
     # Регистрация Middlewares (ОБЩИЕ для ВСЕХ сообщений и коллбэков)
+    # Контекст лога (update_id, user_id, хендлер) для всех записей, сделанных при обработке обновления
+    dp.update.outer_middleware(UpdateLogContextMiddleware(logging.getLevelName(settings.LOG_UPDATE_LEVEL.upper())))
+    # Изменения FSM за обновление записываются в Redis одним пайплайном после его обработки
+    if isinstance(storage, CachedRedisStorage):
+        dp.update.outer_middleware(FSMWriteBehindMiddleware(storage))
+    dp.message.middleware(HandlerLogContextMiddleware())
+    dp.callback_query.middleware(HandlerLogContextMiddleware())
+    # Метрики: время обновления (в т.ч. БД/Redis/Telegram) и время хендлеров по хендлеру и состоянию FSM
+    dp.update.outer_middleware(UpdateMetricsMiddleware())
+    dp.message.middleware(HandlerMetricsMiddleware())
+    dp.callback_query.middleware(HandlerMetricsMiddleware())
     # Middleware для управления сессиями БД
-    dp.message.outer_middleware(DBSessionMiddleware(AsyncSessionLocal))
-    dp.callback_query.outer_middleware(DBSessionMiddleware(AsyncSessionLocal))
+    dp.message.outer_middleware(DBSessionMiddleware(session_factory))
+    dp.callback_query.outer_middleware(DBSessionMiddleware(session_factory))
 
     # Middleware для регистрации пользователей и внедрения объекта User в data
-    dp.message.middleware(UserRegisterMiddleware(
-        admin_ids=settings.get_admin_ids(),
-        manager_ids=settings.get_manager_ids()
-    ))
-    dp.callback_query.middleware(UserRegisterMiddleware(
-        admin_ids=settings.get_admin_ids(),
-        manager_ids=settings.get_manager_ids()
-    ))
+    dp.message.middleware(UserRegisterMiddleware(roster=staff_roster))
+    dp.callback_query.middleware(UserRegisterMiddleware(roster=staff_roster))
 
     # Регистрация роутеров. Порядок важен!
     # Общие хендлеры, которые должны быть доступны всем без проверки роли до регистрации
@@ -110,10 +220,39 @@ async def main() -> None:
     admin_base_router.include_router(admin_handlers.router)
     dp.include_router(admin_base_router)
 
+    return dp
+
+
+async def main() -> None:
+    """Запуск бота в режиме long polling."""
+    settings = get_settings()
+    bot = create_bot(settings)
+    dp = await create_dispatcher(settings)
+
+    metrics_runner = await start_metrics(settings)
+
     # Запуск бота
     logger.info("Starting bot...")
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+
+
+def run() -> None:
+    """Точка входа: режим работы выбирается настройкой BOT_MODE."""
+    settings = get_settings()
+    if settings.BOT_MODE == "webhook":
+        # Импорт здесь: webhook-режим сам импортирует create_bot/create_dispatcher из этого модуля
+        from src.webhook import run_webhook
+        run_webhook(settings)
+    elif settings.BOT_MODE == "sharded":
+        from src.sharding import run_sharded
+        run_sharded(settings)
+    else:
+        asyncio.run(main())
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
-    asyncio.run(main())
+    setup_logging(get_settings())
+    run()
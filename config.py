@@ -1,5 +1,5 @@
-import os
-from functools import lru_cache
+from functools import cached_property, lru_cache
+from typing import Optional
 
 from pydantic import PostgresDsn, RedisDsn
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -19,25 +19,82 @@ class Settings(BaseSettings):
     TELEGRAM_BOT_TOKEN: str
     DATABASE_URL: PostgresDsn
     REDIS_URL: RedisDsn
+    # Общий пул соединений Redis процесса (redis_del/client.py): FSM, кэши, индекс доступности, состав персонала
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT: float = 5.0  # Сколько ждать свободного соединения из пула, секунд
+    REDIS_SOCKET_TIMEOUT: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT: float = 5.0
+    REDIS_HEALTH_CHECK_INTERVAL: int = 30  # Соединение, простоявшее дольше, проверяется PING перед командой
+    REDIS_RETRIES: int = 3  # Повторов команды при таймауте или обрыве соединения (с экспоненциальной паузой)
 
     ADMIN_IDS: list[int]
     MANAGER_IDS: list[int]
+    # Состав администраторов/управляющих можно менять без перезапуска через Redis (см. redis_del/staff_roster.py)
+    STAFF_ROSTER_REFRESH_INTERVAL: float = 30.0  # Секунд между проверками; 0 - не перечитывать
 
-    @classmethod
-    def get_admin_ids(cls) -> list[int]:
-        """Парсит строку ADMIN_IDS в список целых чисел."""
-        admin_ids_str = os.getenv("ADMIN_IDS")
-        if admin_ids_str:
-            return [int(uid.strip()) for uid in admin_ids_str.split(',') if uid.strip().isdigit()]
-        return []
-
-    @classmethod
-    def get_manager_ids(cls) -> list[int]:
-        """Парсит строку MANAGER_IDS в список целых чисел."""
-        manager_ids_str = os.getenv("MANAGER_IDS")
-        if manager_ids_str:
-            return [int(uid.strip()) for uid in manager_ids_str.split(',') if uid.strip().isdigit()]
-        return []
+    # Движок БД: профиль "dev" (echo SQL, маленький пул) или "prod"; поля DB_* со значением None берутся из профиля
+    DB_PROFILE: str = "prod"
+    DB_ECHO: Optional[bool] = None
+    DB_POOL_SIZE: Optional[int] = None
+    DB_MAX_OVERFLOW: Optional[int] = None
+    DB_POOL_TIMEOUT: Optional[float] = None  # Сколько ждать свободного соединения из пула, секунд
+    DB_POOL_RECYCLE: Optional[int] = None  # Пересоздавать соединения старше, секунд (-1 - никогда)
+    DB_POOL_PRE_PING: Optional[bool] = None
+    DB_STATEMENT_CACHE_SIZE: Optional[int] = None  # Кэш подготовленных выражений asyncpg на соединение
+    DB_COMMAND_TIMEOUT: Optional[float] = None  # Таймаут одного запроса, секунд
+
+    # HTTP-эндпоинт /metrics; воркер i (webhook/sharded) слушает METRICS_PORT + i. 0 - не поднимать
+    METRICS_HOST: str = "127.0.0.1"
+    METRICS_PORT: int = 9100
+
+    # Логирование: "json" (одна JSON-строка на запись) или "text"; DEBUG-записи пишутся с долей LOG_DEBUG_SAMPLE_RATE
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json"
+    LOG_DEBUG_SAMPLE_RATE: float = 0.01
+    LOG_UPDATE_LEVEL: str = "INFO"  # Уровень записи "Update handled" с длительностью обработки обновления
+
+    # Незавершённые диалоги FSM: TTL по группам состояний (fsm/ttl.py) и периодическая уборка брошенных
+    FSM_DEFAULT_TTL: int = 86400  # Для групп без своего TTL, секунд
+    FSM_DIALOG_TTLS: dict[str, int] = {}  # Переопределения по имени StatesGroup, например {"CafeCreationFSM": 7200}
+    FSM_SWEEP_INTERVAL: float = 3600.0  # Секунд между проходами уборки; 0 - не запускать
+    # Локальный кэш FSM процесса (fsm/storage.py: CachedRedisStorage); 0 - только Redis
+    FSM_LOCAL_CACHE_SIZE: int = 10000
+    FSM_LOCAL_CACHE_TTL: float = 300.0
+
+    # Кэш пользователей (UserRegisterMiddleware)
+    USER_CACHE_MAXSIZE: int = 10000
+    USER_CACHE_LOCAL_TTL: float = 30.0
+    USER_CACHE_REDIS_TTL: int = 3600
+
+    # Режим получения обновлений: "polling", "webhook" или "sharded" (webhook-фронт + воркеры по telegram_id)
+    BOT_MODE: str = "polling"
+    WEBHOOK_BASE_URL: Optional[str] = None  # Публичный адрес, например https://bot.example.com
+    WEBHOOK_PATH: str = "/webhook"
+    WEBHOOK_SECRET: Optional[str] = None
+    WEBHOOK_HOST: str = "0.0.0.0"
+    WEBHOOK_PORT: int = 8080
+    WEBHOOK_WORKERS: int = 1  # Число процессов, слушающих один порт (SO_REUSEPORT)
+    WEBHOOK_DRAIN_TIMEOUT: float = 30.0  # Сколько ждать обработки принятых обновлений при остановке
+    SHARD_WORKERS: int = 2  # Число воркеров в режиме sharded
+    SHARD_HEARTBEAT_TIMEOUT: float = 15.0  # Воркер без heartbeat дольше этого перезапускается
+
+    # Фоновая отправка уведомлений
+    NOTIFY_WORKERS: int = 4
+    NOTIFY_GLOBAL_RATE: float = 25.0  # Сообщений в секунду на бота (лимит Telegram ~30)
+    NOTIFY_CHAT_INTERVAL: float = 1.0  # Секунд между сообщениями в один чат
+    NOTIFY_MAX_RETRIES: int = 5
+    NOTIFY_RETRY_BASE_DELAY: float = 1.0  # Задержка первого повтора, далее удваивается
+    NOTIFY_QUEUE_SIZE: int = 10000
+
+    @cached_property
+    def admin_ids(self) -> frozenset[int]:
+        """ADMIN_IDS в виде множества; вычисляется один раз на экземпляр настроек."""
+        return frozenset(self.ADMIN_IDS)
+
+    @cached_property
+    def manager_ids(self) -> frozenset[int]:
+        """MANAGER_IDS в виде множества; вычисляется один раз на экземпляр настроек."""
+        return frozenset(self.MANAGER_IDS)
 
 @lru_cache()
 def get_settings() -> Settings:
@@ -1,15 +1,112 @@
-from typing import AsyncGenerator
+import inspect
+import logging
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Optional, Union
 
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine, async_sessionmaker
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 
-from src.config import get_settings
+from src.config import Settings, get_settings
+from src.metrics import record_update_time, registry
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
 DATABASE_URL = str(settings.DATABASE_URL) # Приводим DSN к строке
 
-engine = create_async_engine(DATABASE_URL, echo=True, future=True, pool_size=10, max_overflow=20)
-# echo=True делает логирование всех SQL-запросов, полезно для отладки
+# Параметры движка по профилю. dev логирует каждый SQL-запрос (echo) - в проде это
+# синхронный вывод в stdout на каждый запрос, поэтому там он выключен.
+ENGINE_PROFILES: Dict[str, Dict[str, Any]] = {
+    "dev": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 5,
+        "pool_timeout": 30.0,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+        "statement_cache_size": 100,
+        "command_timeout": None,
+    },
+    "prod": {
+        "echo": False,
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 10.0,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+        "statement_cache_size": 500,
+        "command_timeout": 30.0,
+    },
+}
+
+pool_checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds", "Ожидание соединения из пула (включая открытие нового соединения)"
+)
+pool_checkout_timeouts = registry.counter("db_pool_checkout_timeouts", "Не дождались соединения за pool_timeout")
+
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    """Пул соединений, который замеряет время получения соединения."""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_checkout_timeouts.inc()
+            raise
+        finally:
+            pool_checkout_wait.observe(time.perf_counter() - started)
+
+
+def engine_options(settings: Settings) -> Dict[str, Any]:
+    """Аргументы create_async_engine: профиль DB_PROFILE, поверх него заданные поля DB_*."""
+    try:
+        profile = dict(ENGINE_PROFILES[settings.DB_PROFILE])
+    except KeyError:
+        raise ValueError(f"Unknown DB_PROFILE {settings.DB_PROFILE!r}, expected one of {sorted(ENGINE_PROFILES)}")
+    overrides = {
+        "echo": settings.DB_ECHO,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "statement_cache_size": settings.DB_STATEMENT_CACHE_SIZE,
+        "command_timeout": settings.DB_COMMAND_TIMEOUT,
+    }
+    profile.update({key: value for key, value in overrides.items() if value is not None})
+
+    connect_args: Dict[str, Any] = {
+        # Кэш подготовленных выражений диалекта asyncpg (на соединение)
+        "prepared_statement_cache_size": profile.pop("statement_cache_size"),
+    }
+    command_timeout = profile.pop("command_timeout")
+    if command_timeout is not None:
+        connect_args["command_timeout"] = command_timeout
+    return {**profile, "poolclass": TimedQueuePool, "connect_args": connect_args}
+
+
+engine = create_async_engine(DATABASE_URL, future=True, **engine_options(settings))
+
+sql_query_time = registry.histogram("db_query_seconds", "Время выполнения одного SQL-запроса")
+
+
+@event.listens_for(engine.sync_engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    conn.info["query_started"] = time.perf_counter()
+
+
+@event.listens_for(engine.sync_engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    started = conn.info.pop("query_started", None)
+    if started is not None:
+        elapsed = time.perf_counter() - started
+        sql_query_time.observe(elapsed)
+        record_update_time("db", elapsed)
 
 AsyncSessionLocal = async_sessionmaker(
     autocommit=False,
@@ -26,3 +123,158 @@ async def get_async_session() -> AsyncGenerator[AsyncSession, None]:
     """
     async with AsyncSessionLocal() as session:
         yield session
+
+
+# Отложенные до COMMIT побочные эффекты в session.info: ожидающие фиксации и уже зафиксированные
+ON_COMMIT_HOOKS = "on_commit_hooks"
+COMMITTED_HOOKS = "committed_hooks"
+CommitHook = Callable[[], Union[Awaitable[Any], Any]]
+
+
+def on_commit(session: Union[AsyncSession, "LazySession"], hook: CommitHook) -> None:
+    """
+    Выполнить hook (инвалидация кэша, обновление индекса, уведомление) после фиксации
+    текущей транзакции. Если транзакция откатится, hook отбрасывается.
+    Сервисы только делают flush; COMMIT выполняет DBSessionMiddleware (или commit() ниже).
+    """
+    # Запоминаем SAVEPOINT, в котором зарегистрирован hook: его откат отменяет только такие hooks
+    savepoint = session.sync_session.get_nested_transaction()
+    session.info.setdefault(ON_COMMIT_HOOKS, []).append((savepoint, hook))
+
+
+def _inside(transaction, savepoint) -> bool:
+    while transaction is not None:
+        if transaction is savepoint:
+            return True
+        transaction = transaction.parent
+    return False
+
+
+def _is_savepoint_release(session: Session) -> bool:
+    """
+    after_commit срабатывает и на RELEASE SAVEPOINT. Во время события текущей
+    остаётся фиксируемая транзакция, так что выход из begin_nested() виден как вложенная.
+    """
+    return session.in_nested_transaction()
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_commit_hooks(session: Session) -> None:
+    if _is_savepoint_release(session):
+        return
+    hooks = session.info.pop(ON_COMMIT_HOOKS, None)
+    if hooks:
+        session.info.setdefault(COMMITTED_HOOKS, []).extend(hook for _, hook in hooks)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_commit_hooks(session: Session) -> None:
+    hooks = session.info.get(ON_COMMIT_HOOKS)
+    if not hooks:
+        return
+    if session.in_nested_transaction():
+        savepoint = session.get_nested_transaction()
+        session.info[ON_COMMIT_HOOKS] = [(owner, hook) for owner, hook in hooks if not _inside(owner, savepoint)]
+    else:
+        session.info.pop(ON_COMMIT_HOOKS, None)
+
+
+async def run_commit_hooks(session: Union[AsyncSession, "LazySession"]) -> None:
+    """Выполнить hooks уже зафиксированных транзакций. Ошибка одного hook не мешает остальным."""
+    for hook in session.info.pop(COMMITTED_HOOKS, None) or ():
+        try:
+            result = hook()
+            if inspect.isawaitable(result):
+                await result
+        except Exception:
+            logger.exception("After-commit hook %r failed", hook)
+
+
+async def commit(session: Union[AsyncSession, "LazySession"]) -> None:
+    """COMMIT и отложенные до него hooks - для кода, который сам завершает транзакцию."""
+    await session.commit()
+    await run_commit_hooks(session)
+
+
+sessions_opened = registry.counter("db_sessions_opened", "Обновления, которым понадобилось соединение с БД")
+sessions_unused = registry.counter("db_sessions_unused", "Обновления, обработанные без соединения с БД")
+commits_done = registry.counter("db_commits", "Выполненные COMMIT в конце обновления")
+commits_skipped = registry.counter("db_commits_skipped", "Пропущенные COMMIT (в сессии ничего не записывалось)")
+
+
+class LazySession:
+    """
+    Ленивая обёртка над AsyncSession.
+    Настоящая сессия создаётся при первом обращении сервиса к ней, поэтому
+    обновления, которым БД не нужна, не берут соединение из пула.
+    Все атрибуты и методы проксируются в AsyncSession.
+    """
+
+    def __init__(self, session_factory: Callable[[], AsyncSession]):
+        self._session_factory = session_factory
+        self._session: Optional[AsyncSession] = None
+        self._connection_acquired = False
+        # В транзакции что-то записано: flush ORM или DML через session.execute()
+        self._written = False
+
+    def _get_session(self) -> AsyncSession:
+        if self._session is None:
+            session = self._session_factory()
+            event.listen(session.sync_session, "after_begin", self._on_after_begin)
+            event.listen(session.sync_session, "after_flush", self._on_after_flush)
+            event.listen(session.sync_session, "do_orm_execute", self._on_orm_execute)
+            event.listen(session.sync_session, "after_commit", self._on_after_commit)
+            self._session = session
+        return self._session
+
+    def _on_after_begin(self, session, transaction, connection) -> None:
+        self._connection_acquired = True
+
+    def _on_after_flush(self, session, flush_context) -> None:
+        self._written = True
+
+    def _on_orm_execute(self, orm_execute_state) -> None:
+        # insert/update/delete и текстовый SQL через session.execute() идут мимо flush
+        if not orm_execute_state.is_select:
+            self._written = True
+
+    def _on_after_commit(self, session) -> None:
+        # Хендлер уже зафиксировал свои изменения сам (выход из begin_nested() - ещё не фиксация)
+        if not _is_savepoint_release(session):
+            self._written = False
+
+    def __getattr__(self, name: str):
+        return getattr(self._get_session(), name)
+
+    @property
+    def has_writes(self) -> bool:
+        """Были ли в сессии изменения (сброшенные, выполненные через execute() или ожидающие flush)."""
+        if self._session is None:
+            return False
+        session = self._session
+        return self._written or bool(session.new or session.dirty or session.deleted or session.info.get(ON_COMMIT_HOOKS))
+
+    async def finish(self, commit: bool = True) -> None:
+        """
+        Завершить работу с сессией в конце обновления (единица работы - одно обновление).
+        COMMIT выполняется только если в сессии что-то записывалось; после него,
+        уже вернув соединение в пул, выполняются отложенные hooks (см. on_commit).
+        """
+        if self._session is None:
+            sessions_unused.inc()
+            return
+        try:
+            if commit and self.has_writes:
+                await self._session.commit()
+                commits_done.inc()
+            elif commit:
+                commits_skipped.inc()
+            else:
+                await self._session.rollback()
+        finally:
+            if self._connection_acquired:
+                sessions_opened.inc()
+            else:
+                sessions_unused.inc()
+            await self._session.close()
+            await run_commit_hooks(self._session)
@@ -0,0 +1,52 @@
+import base64
+import struct
+from datetime import datetime, timezone
+from typing import Iterable, List, NamedTuple
+
+# Версия формата упаковки списка слотов в данных FSM.
+# При изменении формата увеличиваем версию: старые записи распознаются и отбрасываются.
+SLOT_REFS_VERSION = 1
+
+_SLOT_REF_STRUCT = struct.Struct("<III")  # slot_id, start (unix ts), end (unix ts)
+
+
+class SlotRef(NamedTuple):
+    """Компактная ссылка на слот для выбора в диалоге."""
+    slot_id: int
+    start_time: datetime
+    end_time: datetime
+
+
+def pack_slot_refs(slots: Iterable) -> str:
+    """
+    Упаковать слоты (объекты с slot_id/id, start_time, end_time) в короткую строку
+    вида "<версия>:<base64>" для хранения в RedisStorage.
+    """
+    buffer = bytearray()
+    for slot in slots:
+        slot_id = getattr(slot, "slot_id", None) or slot.id
+        buffer += _SLOT_REF_STRUCT.pack(slot_id, int(slot.start_time.timestamp()), int(slot.end_time.timestamp()))
+    return f"{SLOT_REFS_VERSION}:{base64.urlsafe_b64encode(bytes(buffer)).decode()}"
+
+
+def unpack_slot_refs(payload: str) -> List[SlotRef]:
+    """
+    Распаковать строку, созданную pack_slot_refs.
+    Бросает ValueError для неизвестной версии или повреждённых данных.
+    """
+    if not isinstance(payload, str) or ":" not in payload:
+        raise ValueError("Unsupported slot refs payload")
+    version, data = payload.split(":", 1)
+    if version != str(SLOT_REFS_VERSION):
+        raise ValueError(f"Unsupported slot refs version: {version}")
+    raw = base64.urlsafe_b64decode(data)
+    if len(raw) % _SLOT_REF_STRUCT.size:
+        raise ValueError("Corrupted slot refs payload")
+    return [
+        SlotRef(
+            slot_id=slot_id,
+            start_time=datetime.fromtimestamp(start_ts, tz=timezone.utc),
+            end_time=datetime.fromtimestamp(end_ts, tz=timezone.utc),
+        )
+        for slot_id, start_ts, end_ts in _SLOT_REF_STRUCT.iter_unpack(raw)
+    ]
@@ -1,17 +1,22 @@
 from aiogram.fsm.state import State, StatesGroup
 
+from src.fsm.ttl import HOUR, MINUTE, dialog_ttls
 
+
+@dialog_ttls.expire_after(24 * HOUR)  # Пользователь может вернуться к регистрации позже
 class RegistrationStates(StatesGroup):
     """Состояния для сценария регистрации баристы."""
     waiting_for_name = State()
     waiting_for_phone = State()
     waiting_for_cafe_selection = State()
 
+@dialog_ttls.expire_after(30 * MINUTE)
 class BaristaSlotStates(StatesGroup):
     """Состояния для сценариев выбора слота бариста."""
     waiting_for_slot_selection = State()
     waiting_for_booking_confirmation = State()
 
+@dialog_ttls.expire_after(3 * HOUR)
 class AdminCafeStates(StatesGroup):
     """Состояния для сценариев управления кофейнями администратором."""
     waiting_for_cafe_name = State()
@@ -20,6 +25,7 @@ class AdminCafeStates(StatesGroup):
     waiting_for_cafe_description = State()
     waiting_for_cafe_manager = State()
 
+@dialog_ttls.expire_after(3 * HOUR)
 class ManagerShiftCreationStates(StatesGroup):
     """Состояния для сценария создания смен управляющим."""
     waiting_for_shift_date = State()
@@ -28,6 +34,7 @@ class ManagerShiftCreationStates(StatesGroup):
     waiting_for_required_baristas = State()
     confirm_add_more_shifts = State()
 
+@dialog_ttls.expire_after(HOUR)
 class ManagerUserConfirmationStates(StatesGroup):
     """Состояния для управляющего для подтверждения регистрации бариста."""
     waiting_for_user_selection = State()
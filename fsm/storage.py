@@ -0,0 +1,418 @@
+import asyncio
+import logging
+from collections import Counter
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, NamedTuple, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import StateType, StorageKey
+from aiogram.fsm.storage.redis import KeyBuilder, RedisStorage
+from redis.asyncio import Redis
+from redis.asyncio.client import Pipeline
+from redis.exceptions import RedisError
+
+from aiogram.types import TelegramObject
+
+from src.config import Settings
+from src.fsm.ttl import DialogTTLs
+from src.metrics import registry
+from src.redis_del.user_cache import LocalTTLCache
+
+logger = logging.getLogger(__name__)
+
+# Только один процесс за интервал выполняет уборку (воркеры webhook/sharded запускают её все)
+FSM_SWEEP_LOCK_KEY = "fsm_sweep:lock"
+
+# Записывает данные с оставшимся TTL состояния (или TTL по умолчанию, если состояния нет)
+_SET_DATA_SCRIPT = """
+local ttl = redis.call('PTTL', KEYS[2])
+if ttl > 0 then
+    return redis.call('SET', KEYS[1], ARGV[1], 'PX', ttl)
+end
+return redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+"""
+
+fsm_dialogs_evicted = registry.counter("fsm_dialogs_evicted", "Брошенные диалоги FSM без TTL, удалённые уборкой")
+fsm_cache_hits = registry.counter("fsm_cache_hits", "Чтения FSM из локального кэша процесса")
+fsm_cache_misses = registry.counter("fsm_cache_misses", "Чтения FSM, потребовавшие обращения к Redis")
+fsm_flush_failures = registry.counter("fsm_flush_failures", "Не удалось записать изменения FSM в Redis")
+
+
+def _dialogs_gauge(group: str):
+    return registry.gauge("fsm_dialogs", "Незавершённые диалоги FSM по группам состояний", labels={"group": group})
+
+
+class SharedRedisStorage(RedisStorage):
+    """
+    RedisStorage поверх общего пула соединений процесса (redis_del/client.py).
+    Пул принадлежит redis_manager и закрывается им после остановки фоновых задач,
+    поэтому close() хранилища соединения не закрывает.
+    Состояние и данные живут TTL группы состояний (DialogTTLs) от последнего
+    перехода состояния, так что брошенные диалоги исчезают из Redis сами.
+    """
+
+    def __init__(self, redis: Redis, ttls: DialogTTLs, key_builder: Optional[KeyBuilder] = None, **kwargs: Any):
+        super().__init__(redis, key_builder=key_builder, **kwargs)
+        self.ttls = ttls
+        self._set_data_script = redis.register_script(_SET_DATA_SCRIPT)
+
+    def _queue_state(self, pipe: Pipeline, key: StorageKey, state: Optional[str]) -> None:
+        """Добавить в пайплайн запись состояния."""
+        state_key = self.key_builder.build(key, "state")
+        if state is None:
+            pipe.delete(state_key)
+            return
+        ttl = self.ttls.for_state(state)
+        # Данные диалога живут столько же, сколько его состояние
+        pipe.set(state_key, state, ex=ttl)
+        pipe.expire(self.key_builder.build(key, "data"), ttl)
+
+    def _queue_data(self, pipe: Pipeline, key: StorageKey, data: Dict[str, Any], ttl: int) -> None:
+        """Добавить в пайплайн запись данных с TTL, посчитанным по известному состоянию."""
+        data_key = self.key_builder.build(key, "data")
+        if not data:
+            pipe.delete(data_key)
+            return
+        pipe.set(data_key, self.json_dumps(data), ex=ttl)
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            self._queue_state(pipe, key, state.state if isinstance(state, State) else state)
+            await pipe.execute()
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        data_key = self.key_builder.build(key, "data")
+        if not data:
+            await self.redis.delete(data_key)
+            return
+        # Состояние здесь неизвестно, TTL берёт скрипт. Вне пайплайна это один EVALSHA
+        # (SCRIPT LOAD - только если Redis скрипт ещё не видел)
+        await self._set_data_script(
+            keys=[data_key, self.key_builder.build(key, "state")],
+            args=[self.json_dumps(data), self.ttls.default],
+        )
+
+    async def close(self) -> None:
+        pass
+
+
+class _Entry:
+    """
+    Состояние и данные FSM одного ключа в локальном кэше с пометками о незаписанных изменениях.
+    version растёт при каждом изменении: запись в Redis снимает пометки, только если
+    за время её выполнения ключ не поменяло другое обновление.
+    """
+
+    __slots__ = ("state", "data", "state_dirty", "data_dirty", "version")
+
+    def __init__(self, state: Optional[str], data: Dict[str, Any]):
+        self.state = state
+        self.data = data
+        self.state_dirty = False
+        self.data_dirty = False
+        self.version = 0
+
+
+class _PendingWrites:
+    """Изменения FSM, накопленные за обработку одного обновления."""
+
+    __slots__ = ("entries", "closed")
+
+    def __init__(self):
+        self.entries: Dict[StorageKey, _Entry] = {}
+        self.closed = False
+
+
+# Изменения текущего обновления; None - вне обновления (запись сразу уходит в Redis)
+_pending_writes: ContextVar[Optional[_PendingWrites]] = ContextVar("fsm_pending_writes", default=None)
+
+
+class CachedRedisStorage(SharedRedisStorage):
+    """
+    Двухуровневое хранилище FSM: горячие ключи лежат в LRU-кэше процесса,
+    Redis остаётся постоянным хранилищем.
+    Чтение: из кэша, при промахе - состояние и данные одним пайплайном из Redis.
+    Запись: меняет кэш, а в Redis изменения обновления уходят одним пайплайном
+    в конце его обработки (FSMWriteBehindMiddleware); вне обновления - сразу.
+    Кэш корректен, только если обновления одного пользователя всегда обрабатывает
+    один процесс (polling, sharded по telegram_id) - см. fsm_local_cache_enabled.
+    Запись кэша живёт не дольше local_ttl и оставшегося TTL ключа в Redis.
+    """
+
+    def __init__(self, redis: Redis, ttls: DialogTTLs, maxsize: int, local_ttl: float, **kwargs: Any):
+        super().__init__(redis, ttls, **kwargs)
+        self.local_ttl = local_ttl
+        self._local = LocalTTLCache(maxsize=maxsize, ttl=local_ttl)
+
+    async def _entry(self, key: StorageKey) -> _Entry:
+        pending = _pending_writes.get()
+        if pending is not None and key in pending.entries:
+            return pending.entries[key]
+        entry = self._local.get(key)
+        if entry is not None:
+            fsm_cache_hits.inc()
+            return entry
+
+        fsm_cache_misses.inc()
+        state_key = self.key_builder.build(key, "state")
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.get(state_key)
+            pipe.get(self.key_builder.build(key, "data"))
+            pipe.pttl(state_key)
+            state, raw_data, pttl = await pipe.execute()
+        if isinstance(state, bytes):
+            state = state.decode()
+        if isinstance(raw_data, bytes):
+            raw_data = raw_data.decode()
+        entry = _Entry(state, self.json_loads(raw_data) if raw_data else {})
+        ttl = self.local_ttl if pttl is None or pttl < 0 else min(self.local_ttl, pttl / 1000)
+        self._local.set(key, entry, ttl)
+        return entry
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._entry(key)).state
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._entry(key)).data.copy()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        entry = await self._entry(key)
+        entry.state = state.state if isinstance(state, State) else state
+        entry.state_dirty = True
+        entry.version += 1
+        await self._written(key, entry)
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        entry = await self._entry(key)
+        entry.data = data.copy()
+        entry.data_dirty = True
+        entry.version += 1
+        await self._written(key, entry)
+
+    async def _written(self, key: StorageKey, entry: _Entry) -> None:
+        self._local.set(key, entry)
+        pending = _pending_writes.get()
+        if pending is None or pending.closed:
+            await self._flush_entries({key: entry})
+        else:
+            pending.entries[key] = entry
+
+    def begin_update(self):
+        """Начать накопление изменений обновления; токен передаётся в flush."""
+        return _pending_writes.set(_PendingWrites())
+
+    async def flush(self, token) -> None:
+        """Записать изменения обновления в Redis одним пайплайном."""
+        pending = _pending_writes.get()
+        _pending_writes.reset(token)
+        if pending is None:
+            return
+        # Фоновые задачи, унаследовавшие контекст обновления, дальше пишут сразу в Redis
+        pending.closed = True
+        await self._flush_entries(pending.entries)
+
+    async def _flush_entries(self, entries: Dict[StorageKey, _Entry]) -> None:
+        dirty = {key: entry for key, entry in entries.items() if entry.state_dirty or entry.data_dirty}
+        if not dirty:
+            return
+        versions = {key: entry.version for key, entry in dirty.items()}
+        try:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                for key, entry in dirty.items():
+                    if entry.state_dirty:
+                        self._queue_state(pipe, key, entry.state)
+                    if entry.data_dirty:
+                        # Состояние ключа известно из кэша, поэтому хватает обычного SET EX
+                        self._queue_data(pipe, key, entry.data, self.ttls.for_state(entry.state))
+                await pipe.execute()
+        except RedisError as e:
+            # Кэш не должен расходиться с Redis: следующее чтение возьмёт сохранённую версию
+            fsm_flush_failures.inc()
+            for key in dirty:
+                self._local.pop(key)
+            logger.error("FSM write to Redis failed for %d keys: %s", len(dirty), e)
+            return
+        for key, entry in dirty.items():
+            # Изменения, сделанные во время execute(), в пайплайн не попали - их запишет flush их обновления
+            if entry.version == versions[key]:
+                entry.state_dirty = entry.data_dirty = False
+
+class FSMWriteBehindMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: изменения FSM за обработку обновления
+    (set_state, update_data и т.д.) записываются в Redis одним пайплайном в конце.
+    """
+
+    def __init__(self, storage: CachedRedisStorage):
+        super().__init__()
+        self.storage = storage
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        token = self.storage.begin_update()
+        try:
+            return await handler(event, data)
+        finally:
+            await self.storage.flush(token)
+
+
+def fsm_local_cache_enabled(settings: Settings) -> bool:
+    """
+    Локальный кэш FSM допустим, только если обновления пользователя всегда
+    обрабатывает один процесс: polling (один процесс) и sharded (воркер по telegram_id).
+    Воркеры webhook на общем порту получают обновления одного пользователя вперемешку.
+    """
+    if settings.FSM_LOCAL_CACHE_SIZE <= 0:
+        return False
+    if settings.BOT_MODE == "webhook":
+        return settings.WEBHOOK_WORKERS <= 1
+    return True
+
+
+class SweepReport(NamedTuple):
+    dialogs: Dict[str, int]  # Незавершённых диалогов по группам состояний
+    evicted: int  # Удалено брошенных диалогов и данных без состояния
+    expiring: int  # Ключей без TTL, которым назначен оставшийся срок
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class AbandonedDialogSweeper:
+    """
+    Периодическая уборка FSM в Redis. Считает незавершённые диалоги по группам
+    (метрика fsm_dialogs) и разбирается с ключами без TTL, оставшимися от записей
+    до появления TTL: если ключ не трогали дольше TTL его группы (OBJECT IDLETIME),
+    диалог брошен и удаляется, иначе ключу назначается оставшийся срок.
+    """
+
+    def __init__(self, storage: RedisStorage, ttls: DialogTTLs, interval: float, batch_size: int = 500):
+        self.storage = storage
+        self.ttls = ttls
+        self.interval = interval
+        self.batch_size = batch_size
+        self._watcher: Optional[asyncio.Task] = None
+        self._reported_groups: set = set()
+
+    @property
+    def _redis(self) -> Redis:
+        return self.storage.redis
+
+    def _key_parts(self):
+        builder = self.storage.key_builder
+        return getattr(builder, "prefix", "fsm"), getattr(builder, "separator", ":")
+
+    async def sweep(self) -> SweepReport:
+        """Один проход по всем ключам FSM (SCAN, пачками по batch_size)."""
+        prefix, separator = self._key_parts()
+        dialogs: Counter = Counter()
+        evicted = expiring = 0
+        batch: List[str] = []
+        async for key in self._redis.scan_iter(match=f"{prefix}{separator}*", count=self.batch_size):
+            batch.append(_decode(key))
+            if len(batch) >= self.batch_size:
+                evicted, expiring = await self._sweep_batch(batch, separator, dialogs, evicted, expiring)
+                batch = []
+        if batch:
+            evicted, expiring = await self._sweep_batch(batch, separator, dialogs, evicted, expiring)
+
+        for group in self._reported_groups - set(dialogs):
+            _dialogs_gauge(group).set(0)
+        for group, count in dialogs.items():
+            _dialogs_gauge(group).set(count)
+        self._reported_groups = set(dialogs)
+        fsm_dialogs_evicted.inc(evicted)
+        return SweepReport(dict(dialogs), evicted, expiring)
+
+    async def _sweep_batch(self, keys: List[str], separator: str, dialogs: Counter, evicted: int, expiring: int):
+        state_suffix, data_suffix = f"{separator}state", f"{separator}data"
+        state_keys = [key for key in keys if key.endswith(state_suffix)]
+        data_keys = [key for key in keys if key.endswith(data_suffix)]
+
+        # OBJECT IDLETIME читается до GET: GET сбрасывает время простоя ключа
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for key in state_keys:
+                pipe.ttl(key)
+                pipe.object("idletime", key)
+                pipe.get(key)
+            for key in data_keys:
+                pipe.ttl(key)
+                pipe.object("idletime", key)
+                pipe.exists(key[: -len(data_suffix)] + state_suffix)
+            results = await pipe.execute(raise_on_error=False)
+
+        to_delete: List[str] = []
+        to_expire: List[tuple] = []
+        for i, key in enumerate(state_keys):
+            ttl, idle, state = results[3 * i: 3 * i + 3]
+            if ttl == -2 or state is None or isinstance(state, Exception):
+                continue  # Ключ истёк между SCAN и чтением
+            state = _decode(state)
+            data_key = key[: -len(state_suffix)] + data_suffix
+            if ttl == -1:
+                limit = self.ttls.for_state(state)
+                idle = idle if isinstance(idle, int) else 0  # OBJECT IDLETIME недоступен при LFU-вытеснении
+                if idle >= limit:
+                    to_delete += [key, data_key]
+                    evicted += 1
+                    continue
+                to_expire += [(key, limit - idle), (data_key, limit - idle)]
+                expiring += 1
+            dialogs[state.rpartition(":")[0]] += 1
+
+        offset = 3 * len(state_keys)
+        for i, key in enumerate(data_keys):
+            ttl, idle, has_state = results[offset + 3 * i: offset + 3 * i + 3]
+            if ttl != -1 or has_state:
+                continue  # Данные с состоянием живут вместе с ним
+            idle = idle if isinstance(idle, int) else 0
+            if idle >= self.ttls.default:
+                to_delete.append(key)
+                evicted += 1
+            else:
+                to_expire.append((key, self.ttls.default - idle))
+                expiring += 1
+
+        if to_delete or to_expire:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                if to_delete:
+                    pipe.delete(*to_delete)
+                for key, ttl in to_expire:
+                    pipe.expire(key, ttl)
+                await pipe.execute()
+        return evicted, expiring
+
+    async def start(self) -> None:
+        if self.interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watcher is None:
+            return
+        self._watcher.cancel()
+        try:
+            await self._watcher
+        except asyncio.CancelledError:
+            pass
+        self._watcher = None
+
+    async def _watch(self) -> None:
+        while True:
+            try:
+                if await self._redis.set(FSM_SWEEP_LOCK_KEY, "1", nx=True, ex=max(int(self.interval) - 1, 1)):
+                    report = await self.sweep()
+                    logger.info(
+                        "FSM sweep: %d dialogs, %d abandoned evicted, %d keys got a TTL",
+                        sum(report.dialogs.values()), report.evicted, report.expiring,
+                        extra={"dialogs_by_group": report.dialogs},
+                    )
+            except RedisError as e:
+                logger.warning("FSM sweep failed: %s", e)
+            await asyncio.sleep(self.interval)
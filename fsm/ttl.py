@@ -0,0 +1,48 @@
+from typing import Callable, Dict, Optional, Type, TypeVar
+
+from aiogram.fsm.state import StatesGroup
+
+from src.config import get_settings
+
+settings = get_settings()
+
+MINUTE = 60
+HOUR = 60 * MINUTE
+
+_Group = TypeVar("_Group", bound=Type[StatesGroup])
+
+
+class DialogTTLs:
+    """
+    Время жизни незавершённых диалогов по группам состояний (StatesGroup).
+    Срок отсчитывается от последнего перехода состояния: если пользователь
+    бросил диалог, его состояние и данные FSM исчезают из Redis сами.
+    Значение группы задаётся декоратором expire_after рядом с её объявлением
+    и переопределяется настройкой FSM_DIALOG_TTLS; для остальных - FSM_DEFAULT_TTL.
+    """
+
+    def __init__(self, default: int, overrides: Dict[str, int]):
+        self.default = default
+        self._overrides = dict(overrides)
+        self._groups: Dict[str, int] = {}
+
+    def expire_after(self, seconds: int) -> Callable[[_Group], _Group]:
+        """Декоратор StatesGroup: незавершённый диалог группы живёт seconds секунд."""
+        def decorator(group: _Group) -> _Group:
+            self._groups[group.__full_group_name__] = seconds
+            return group
+        return decorator
+
+    def for_group(self, group_name: str) -> int:
+        if group_name in self._overrides:
+            return self._overrides[group_name]
+        return self._groups.get(group_name, self.default)
+
+    def for_state(self, state: Optional[str]) -> int:
+        """TTL по строке состояния вида "Группа:состояние"."""
+        if not state:
+            return self.default
+        return self.for_group(state.rpartition(":")[0])
+
+
+dialog_ttls = DialogTTLs(settings.FSM_DEFAULT_TTL, settings.FSM_DIALOG_TTLS)
@@ -1,12 +1,21 @@
 import logging
+from functools import partial
 
 
-from aiogram import Router, types, F, Bot
+from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.session import on_commit
+from src.fsm.ttl import HOUR, dialog_ttls
 from src.services import cafe as cafe_service
 from src.services import user as user_service
+from src.services.notifications import notification_service
+from src.services.slot import SlotService
+from src.services.cafe import CafeService
+from src.services.user import UserService
+from src.keyboards.inline import get_cafes_keyboard, get_users_keyboard
+from src.keyboards.pagination import PageCallback
 from src.config import get_settings
 from src.models import User, UserRole
 from aiogram.filters import Command
@@ -21,6 +30,7 @@ router = Router()
                                 # Пока оставлю как есть, но это может быть нежелательным поведением.
 
 
+@dialog_ttls.expire_after(3 * HOUR)
 class CafeCreationFSM(StatesGroup):
     waiting_for_name = State()
     waiting_for_address = State()
@@ -30,12 +40,14 @@ class CafeCreationFSM(StatesGroup):
     waiting_for_description = State()
 
 
+@dialog_ttls.expire_after(HOUR)
 class CafeEditionFSM(StatesGroup):
     waiting_for_cafe_selection = State()
     waiting_for_field_to_edit = State()
     waiting_for_new_value = State()
 
 
+@dialog_ttls.expire_after(3 * HOUR)
 class UserCreationFSM(StatesGroup):
     waiting_for_telegram_id = State()
     waiting_for_first_name = State()
@@ -45,6 +57,7 @@ class UserCreationFSM(StatesGroup):
     waiting_for_password = State()
 
 
+@dialog_ttls.expire_after(HOUR)
 class UserEditionFSM(StatesGroup):
     waiting_for_user_selection = State()
     waiting_for_field_to_edit = State()
@@ -97,23 +110,29 @@ async def process_phone(message: types.Message, state: FSMContext, session: Asyn
     """
     await state.update_data(phone=message.text)
 
-    # Get All available managers.
-    managers = await user_service.get_users_by_role(session, UserRole.MANAGER)
+    # Managers are listed page by page.
+    managers_page = await UserService(session).get_users_page(UserRole.MANAGER)
 
-    if not managers:
+    if not managers_page.items:
         await message.answer("Нет доступных менеджеров для выбора.")
         await state.clear()
         return
 
-    keyboard = []
-    for manager in managers:
-        keyboard.append([types.InlineKeyboardButton(text=manager.first_name, callback_data=f"manager_{manager.id}")])
-    keyboard.append([types.InlineKeyboardButton(text="Отмена", callback_data="cancel")])
-
-    reply_markup = types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+    reply_markup = get_users_keyboard(managers_page, "new_cafe_managers", "manager_", cancel=True)
     await message.answer("Выберите управляющего кофейни:", reply_markup=reply_markup)
     await state.set_state(CafeCreationFSM.waiting_for_manager)  # Corrected
 
+@router.callback_query(CafeCreationFSM.waiting_for_manager, PageCallback.filter(F.list == "new_cafe_managers"))
+async def process_manager_page(query: types.CallbackQuery, callback_data: PageCallback, session: AsyncSession):
+    """
+    Переход на другую страницу списка управляющих.
+    """
+    managers_page = await UserService(session).get_users_page(UserRole.MANAGER, **callback_data.page_args())
+    await query.message.edit_reply_markup(
+        reply_markup=get_users_keyboard(managers_page, "new_cafe_managers", "manager_", cancel=True)
+    )
+    await query.answer()
+
 @router.callback_query(CafeCreationFSM.waiting_for_manager)
 async def process_manager(query: types.CallbackQuery, state: FSMContext):
     """
@@ -142,7 +161,6 @@ async def process_description(message: types.Message, state: FSMContext, session
     try:
         # ЭТИ СТРОКИ ДОЛЖНЫ БЫТЬ ВНУТРИ БЛОКА TRY (ИСПРАВЛЕН ОТСТУП)
         await cafe_service.create_cafe(session, data["name"], data["address"], data["work_hours"], data["phone"], data["manager_id"], data["description"])  # Corrected
-        await session.commit()
         await message.answer("Кофейня успешно создана!")
     except Exception as e :
         logger.exception("Error creating cafe: %s", e)
@@ -155,21 +173,25 @@ async def command_edit_cafe(message: types.Message, state: FSMContext, session:
     """
     Запуск процесса редактирования кофейни.
     """
-    cafes = await cafe_service.get_all_cafes(session)
-    if not cafes:
+    cafes_page = await CafeService(session).get_cafes_page()
+    if not cafes_page.items:
         await message.answer("Нет доступных кофеен для редактирования.")
         await state.clear()
         return
 
-    keyboard = []
-    for cafe in cafes:
-        keyboard.append([types.InlineKeyboardButton(text=cafe.name, callback_data=f"cafe_{cafe.id}")])
-    keyboard.append([types.InlineKeyboardButton(text="Отмена", callback_data="cancel")])
-
-    reply_markup = types.InlineKeyboardMarkup(inline_keyboard=keyboard)
+    reply_markup = get_cafes_keyboard(cafes_page, "edit_cafes", "cafe_", cancel=True)
     await message.answer("Выберите кофейню для редактирования:", reply_markup=reply_markup)
     await state.set_state(CafeEditionFSM.waiting_for_cafe_selection)
 
+@router.callback_query(CafeEditionFSM.waiting_for_cafe_selection, PageCallback.filter(F.list == "edit_cafes"))
+async def process_cafe_page_for_edit(query: types.CallbackQuery, callback_data: PageCallback, session: AsyncSession):
+    """
+    Переход на другую страницу списка кофеен.
+    """
+    cafes_page = await CafeService(session).get_cafes_page(**callback_data.page_args())
+    await query.message.edit_reply_markup(reply_markup=get_cafes_keyboard(cafes_page, "edit_cafes", "cafe_", cancel=True))
+    await query.answer()
+
 @router.callback_query(CafeEditionFSM.waiting_for_cafe_selection)
 async def process_cafe_selection_for_edit(query: types.CallbackQuery, state: FSMContext):
     """
@@ -215,7 +237,7 @@ async def process_field_selection(query: types.CallbackQuery, state: FSMContext)
     await query.answer()  # Ensure you answer the callback query
 
 @router.message(CafeEditionFSM.waiting_for_new_value)
-async def process_new_value(message: types.Message, state: FSMContext, session: AsyncSession, bot: Bot):
+async def process_new_value(message: types.Message, state: FSMContext, session: AsyncSession):
     """
     Обработка нового значения для поля и сохранение изменений.
     """
@@ -223,6 +245,7 @@ async def process_new_value(message: types.Message, state: FSMContext, session:
     cafe_id = data.get("cafe_id")
     field_to_edit = data.get("field_to_edit")
     new_value = message.text
+    notifications = []  # (chat_id, text) - отправляются только после COMMIT в конце обновления
 
     try:
         # Checking if the field being edited is manager
@@ -242,24 +265,19 @@ async def process_new_value(message: types.Message, state: FSMContext, session:
             new_manager = await user_service.get_user(session, new_manager_id)
 
             if old_manager and old_manager.telegram_id and old_manager.telegram_id != new_manager_id: # Отправляем только если менеджер был и он другой
-                 try:
-                    await bot.send_message(chat_id=old_manager.telegram_id, text=f"Вы больше не являетесь управляющим кофейни {current_cafe.name}.")
-                 except Exception as err:
-                    logger.warning(f"Could not send message to old manager {old_manager.telegram_id}: {err}")
-
+                notifications.append((old_manager.telegram_id, f"Вы больше не являетесь управляющим кофейни {current_cafe.name}."))
 
             if new_manager and new_manager.telegram_id:
-                try:
-                    await bot.send_message(chat_id=new_manager.telegram_id, text=f"Вы назначены управляющим кофейни {current_cafe.name}.")
-                except Exception as err:
-                    logger.warning(f"Could not send message to new manager {new_manager.telegram_id}: {err}")
+                notifications.append((new_manager.telegram_id, f"Вы назначены управляющим кофейни {current_cafe.name}."))
 
 
             await cafe_service.update_cafe(session, cafe_id, field_to_edit, new_manager_id) # Сохраняем ID, не новый_value
         else:
             await cafe_service.update_cafe(session, cafe_id, field_to_edit, new_value) # update other fields normally
 
-        await session.commit()
+        # Уведомления ставятся в очередь после COMMIT и отправляются в фоне, ошибки доставки обрабатывает notification_service
+        for chat_id, text in notifications:
+            on_commit(session, partial(notification_service.notify, chat_id, text))
         await message.answer("Информация о кофейне успешно обновлена!")
     except ValueError:
         await message.answer("Неверный формат для менеджера. Пожалуйста, введите числовой ID.")
@@ -333,3 +351,15 @@ async def process_role(query: types.CallbackQuery, state: FSMContext, session: A
         await state.clear()
         return
 
+
+@router.message(Command("rebuild_availability"))
+async def command_rebuild_availability(message: types.Message, session: AsyncSession):
+    """
+    Перестроение индекса доступности слотов в Redis по данным БД.
+    """
+    try:
+        count = await SlotService(session).rebuild_availability_index()
+        await message.answer(f"Индекс доступности перестроен. Слотов в индексе: {count}.")
+    except Exception as e:
+        logger.exception("Error rebuilding availability index: %s", e)
+        await message.answer("Произошла ошибка при перестроении индекса доступности.")
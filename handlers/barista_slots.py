@@ -1,13 +1,18 @@
 import logging
-from datetime import datetime # Импортируем явно datetime
+from datetime import date, datetime, timedelta # Импортируем явно datetime
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy.ext.asyncio import AsyncSession
 from aiogram.filters import Command
 
+from src.fsm.payload import pack_slot_refs, unpack_slot_refs
+from src.fsm.ttl import MINUTE, dialog_ttls
+from src.keyboards.inline import get_confirm_booking_keyboard, get_slots_keyboard
+from src.keyboards.pagination import PageCallback
 from src.models import User
-from src.services import slot as slots_service
+from src.services.booking import BookingService, BookingResult
+from src.services.slot import SlotService
 
 
 logger = logging.getLogger(__name__) # Лучше использовать __name__ вместо name
@@ -21,25 +26,45 @@ router.message.filter(F.text) # Это фильтр для всех сообще
                              # Если этот роутер только для текстовых команд и сообщений, то ок.
 
 
+# Список слотов в данных быстро устаревает
+@dialog_ttls.expire_after(30 * MINUTE)
 class BaristaSlotFSM(StatesGroup):
     waiting_for_date = State()
     waiting_for_slot_choice = State()
+    browsing_slots = State()
+    confirm_booking = State()
+
+
+# /slots показывает слоты кофейни на столько дней вперёд, по странице за раз
+SLOTS_LIST_DAYS = 7
+
+
+def _booking_result_text(result: BookingResult, start_time: datetime, end_time: datetime) -> str:
+    """Ответ бариста на попытку бронирования."""
+    if result == BookingResult.CREATED:
+        return f"Вы забронировали слот: {start_time} - {end_time}"
+    if result == BookingResult.ALREADY_BOOKED:
+        return "Вы уже забронировали этот слот."
+    if result == BookingResult.FULL:
+        return "Все места в этом слоте уже заняты."
+    if result == BookingResult.OVERLAP:
+        return "У вас уже есть смена, пересекающаяся с этим слотом по времени."
+    return "Ошибка: Слот больше не доступен."
 
 
 @router.message(Command("my_slots"))
-async def command_my_slots(message: types.Message, state: FSMContext, session: AsyncSession, user: User):
+async def command_my_slots(message: types.Message, state: FSMContext, session: AsyncSession, current_user: User):
     """
     Показать бариста его забронированные слоты.
     """
     try:
-        slots = await slots_service.get_user_slots(session, user.id)
+        # Профиль "listing" загружает кофейни тем же запросом (без N+1 на slot.cafe)
+        slots = await SlotService(session).get_user_slots(current_user.id, profile="listing")
         if not slots:
              await message.answer("У вас нет забробированных слотов.")
         else:
             response = "Ваши забробированные слоты:\n"
             for slot in slots:
-                # Убедитесь, что slot.cafe действительно объект и у него есть name
-                # и что start_time/end_time в удобном формате (например, datetime.time)
                 slot_info = f"- {slot.start_time} - {slot.end_time}, Кофейня: {slot.cafe.name}\n"
                 response += slot_info
             await message.answer(response)
@@ -61,7 +86,7 @@ async def command_available_slots(message: types.Message, state: FSMContext):
 
 
 @router.message(BaristaSlotFSM.waiting_for_date)
-async def process_date(message: types.Message, state: FSMContext, session: AsyncSession, user: User):
+async def process_date(message: types.Message, state: FSMContext, session: AsyncSession, current_user: User):
     """
     Обработка введенной даты и отображение доступных слотов.
     """
@@ -70,21 +95,24 @@ async def process_date(message: types.Message, state: FSMContext, session: Async
         # Валидация формата даты
         selected_date = datetime.strptime(date_str, '%Y-%m-%d').date()
 
-        # Здесь был неверный отступ. available_slots и все последующее должно быть внутри try
-        available_slots = await slots_service.get_available_slots_by_date(session, selected_date)
+        if not current_user.cafe_id:
+            await message.answer("Вы не привязаны к кофейне. Обратитесь к управляющему.")
+            await state.clear()
+            return
+
+        # Слоты со свободными местами из индекса доступности (или из БД, если индекс не построен)
+        available_slots = await SlotService(session).get_bookable_slots(current_user.cafe_id, selected_date)
         if not available_slots:
             await message.answer("Нет доступных слотов на выбранную дату.")
             await state.clear()
             return
 
-        # Сохраняем доступные слоты в состоянии для следующего шага
-        await state.update_data(available_slots=available_slots)
+        # Сохраняем в состоянии компактные ссылки на слоты (id и время), а не ORM-объекты
+        await state.update_data(available_slots=pack_slot_refs(available_slots))
 
         keyboard = []
         for i, slot in enumerate(available_slots):
-            # Убедитесь, что slot.cafe действительно объект и у него есть name
-            # и что start_time/end_time в удобном формате
-            slot_info = f"{slot.start_time} - {slot.end_time}, Кофейня: {slot.cafe.name}"
+            slot_info = f"{slot.start_time} - {slot.end_time}, свободных мест: {slot.remaining}"
             keyboard.append([types.InlineKeyboardButton(text=slot_info, callback_data=f"slot_{i}")])
         keyboard.append([types.InlineKeyboardButton(text="Отмена", callback_data="cancel")])
 
@@ -103,7 +131,7 @@ async def process_date(message: types.Message, state: FSMContext, session: Async
 
 
 @router.callback_query(BaristaSlotFSM.waiting_for_slot_choice)
-async def process_slot_choice(query: types.CallbackQuery, state: FSMContext, session: AsyncSession, user: User):
+async def process_slot_choice(query: types.CallbackQuery, state: FSMContext, session: AsyncSession, current_user: User):
     """
     Обработка выбора слота для бронирования.
     """
@@ -116,7 +144,10 @@ async def process_slot_choice(query: types.CallbackQuery, state: FSMContext, ses
     if query.data.startswith("slot_"):
         slot_index = int(query.data.split("_")[1])
         state_data = await state.get_data()
-        available_slots = state_data.get("available_slots")
+        try:
+            available_slots = unpack_slot_refs(state_data.get("available_slots"))
+        except ValueError:
+            available_slots = [] # Данные устаревшего формата или повреждены
         if not available_slots or slot_index >= len(available_slots):
             await query.answer("Ошибка: Слот больше не доступен.")
             await state.clear()
@@ -125,10 +156,8 @@ async def process_slot_choice(query: types.CallbackQuery, state: FSMContext, ses
         selected_slot = available_slots[slot_index]
 
         try:
-            # Убедитесь, что slots_service.book_slot принимает user_id и slot_id
-            await slots_service.book_slot(session, user.id, selected_slot.id)
-            await session.commit()
-            await query.message.edit_text(f"Вы забронировали слот: {selected_slot.start_time} - {selected_slot.end_time}, Кофейня: {selected_slot.cafe.name}")
+            result, _ = await BookingService(session).book_slot(current_user.id, selected_slot.slot_id)
+            await query.message.edit_text(_booking_result_text(result, selected_slot.start_time, selected_slot.end_time))
         except Exception as e:
             logger.exception("Error booking slot: %s", e)
             await query.message.answer("Произошла ошибка при бронировании слота. Возможно, он уже занят.")
@@ -137,3 +166,95 @@ async def process_slot_choice(query: types.CallbackQuery, state: FSMContext, ses
 
     # await query.answer() должен быть в конце функции, но убедитесь, что он на правильном уровне отступа
     await query.answer()
+
+
+@router.message(Command("slots"))
+async def command_slots(message: types.Message, state: FSMContext, session: AsyncSession, current_user: User):
+    """
+    Слоты кофейни бариста на неделю вперёд: одна страница за раз (keyset-пагинация).
+    """
+    if not current_user.cafe_id:
+        await message.answer("Вы не привязаны к кофейне. Обратитесь к управляющему.")
+        await state.clear()
+        return
+
+    start_date = date.today()
+    end_date = start_date + timedelta(days=SLOTS_LIST_DAYS - 1)
+    slots_page = await SlotService(session).get_available_slots_page(current_user.cafe_id, start_date, end_date)
+    if not slots_page.items:
+        await message.answer("В вашей кофейне нет слотов на ближайшую неделю.")
+        await state.clear()
+        return
+
+    # Период фиксируется при открытии списка, чтобы страницы не съезжали после полуночи
+    await state.update_data(slots_period=[start_date.isoformat(), end_date.isoformat()])
+    await message.answer("Слоты вашей кофейни. Выберите слот для бронирования:", reply_markup=get_slots_keyboard(slots_page, cancel=True))
+    await state.set_state(BaristaSlotFSM.browsing_slots)
+
+
+@router.callback_query(BaristaSlotFSM.browsing_slots, PageCallback.filter(F.list == "slots"))
+async def process_slots_page(
+    query: types.CallbackQuery, callback_data: PageCallback, state: FSMContext, session: AsyncSession, current_user: User
+):
+    """
+    Переход на другую страницу списка слотов.
+    """
+    start_date, end_date = (date.fromisoformat(value) for value in (await state.get_data())["slots_period"])
+    slots_page = await SlotService(session).get_available_slots_page(
+        current_user.cafe_id, start_date, end_date, **callback_data.page_args()
+    )
+    await query.message.edit_reply_markup(reply_markup=get_slots_keyboard(slots_page, cancel=True))
+    await query.answer()
+
+
+@router.callback_query(BaristaSlotFSM.browsing_slots, F.data.startswith("select_slot_"))
+async def process_slot_selection(query: types.CallbackQuery, state: FSMContext, session: AsyncSession, current_user: User):
+    """
+    Выбор слота из списка: запрос подтверждения бронирования.
+    """
+    try:
+        slot_id = int(query.data.removeprefix("select_slot_"))
+    except ValueError:
+        slot_id = None
+    slot = await SlotService(session).get_slot_by_id(slot_id) if slot_id is not None else None
+    if slot is None or slot.cafe_id != current_user.cafe_id:
+        await query.answer("Ошибка: Слот больше не доступен.", show_alert=True)
+        return
+
+    await query.message.edit_text(
+        f"Забронировать слот {slot.start_time} - {slot.end_time}?",
+        reply_markup=get_confirm_booking_keyboard(slot.id),
+    )
+    await state.set_state(BaristaSlotFSM.confirm_booking)
+    await query.answer()
+
+
+@router.callback_query(BaristaSlotFSM.confirm_booking, F.data.startswith("confirm_booking_"))
+async def process_confirm_booking(query: types.CallbackQuery, state: FSMContext, session: AsyncSession, current_user: User):
+    """
+    Бронирование выбранного в /slots слота.
+    """
+    try:
+        slot = await SlotService(session).get_slot_by_id(int(query.data.removeprefix("confirm_booking_")))
+        if slot is None or slot.cafe_id != current_user.cafe_id:
+            await query.message.edit_text("Ошибка: Слот больше не доступен.")
+        else:
+            result, _ = await BookingService(session).book_slot(current_user.id, slot.id)
+            await query.message.edit_text(_booking_result_text(result, slot.start_time, slot.end_time))
+    except Exception as e:
+        logger.exception("Error booking slot: %s", e)
+        await query.message.answer("Произошла ошибка при бронировании слота. Возможно, он уже занят.")
+    finally:
+        await state.clear()
+    await query.answer()
+
+
+@router.callback_query(BaristaSlotFSM.browsing_slots, F.data == "cancel")
+@router.callback_query(BaristaSlotFSM.confirm_booking, F.data == "cancel_action")
+async def process_slots_cancel(query: types.CallbackQuery, state: FSMContext):
+    """
+    Отмена бронирования из /slots.
+    """
+    await query.message.edit_text("Бронирование слота отменено.")
+    await state.clear()
+    await query.answer()
@@ -1,16 +1,26 @@
 import logging
+from functools import partial
 
 
 from aiogram import Router, types, F
 from aiogram.fsm.context import FSMContext
-from aiogram.client.bot import Bot 
 from aiogram.fsm.state import State, StatesGroup
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.session import on_commit
+from src.fsm.ttl import HOUR, dialog_ttls
 from src.services import slot as slots_service
 from src.services import user as user_service
+from src.redis_del.staff_roster import staff_roster
+from src.services.notifications import notification_service
+from src.services.user import UserService
+from src.services.cafe import CafeService
+from src.services.slot import SlotService, ShiftTemplate
 from src.config import get_settings
-from src.models import User
+from src.keyboards.inline import get_confirm_registration_keyboard, get_manager_user_selection_keyboard
+from src.keyboards.pagination import PageCallback
+from src.models import User, UserRole
 from aiogram.filters import Command
+from datetime import datetime
 
 
 logger = logging.getLogger(__name__)
@@ -21,6 +31,7 @@ router = Router()
 router.message.filter(F.text)
 
 
+@dialog_ttls.expire_after(3 * HOUR)
 class SlotCreationFSM(StatesGroup):
     waiting_for_cafe = State()
     waiting_for_start_time = State()
@@ -29,15 +40,66 @@ class SlotCreationFSM(StatesGroup):
     confirm_creation = State()
 
 
+@dialog_ttls.expire_after(HOUR)
 class EmploymentConfirmationFSM(StatesGroup):
     waiting_for_barista = State()
     confirm_or_decline = State()
 
 
+@dialog_ttls.expire_after(HOUR)
+class UserConfirmationFSM(StatesGroup):
+    waiting_for_user = State()
+    confirm_or_decline = State()
+
+
 class MonitoringFSM(StatesGroup):
     waiting_for_date = State()
 
 
+class ScheduleFSM(StatesGroup):
+    waiting_for_cafes = State()
+    waiting_for_template = State()
+    waiting_for_period = State()
+
+
+WEEKDAYS = {"пн": 0, "вт": 1, "ср": 2, "чт": 3, "пт": 4, "сб": 5, "вс": 6}
+MAX_SCHEDULE_WEEKS = 12
+
+SCHEDULE_TEMPLATE_HELP = (
+    "Введите недельный шаблон, по смене на строку:\n"
+    "<code>дни HH:MM-HH:MM [число бариста]</code>\n\n"
+    "Например:\n"
+    "<code>пн,вт,ср,чт,пт 08:00-14:00 2\n"
+    "пн,вт,ср,чт,пт 14:00-20:00\n"
+    "сб,вс 10:00-18:00 1</code>"
+)
+
+
+def parse_week_template(text: str) -> list[ShiftTemplate]:
+    """Разобрать недельный шаблон из сообщения менеджера. Ошибки формата - ValueError."""
+    templates = []
+    for line in filter(None, (line.strip() for line in text.splitlines())):
+        parts = line.split()
+        if len(parts) not in (2, 3):
+            raise ValueError(f"Неверная строка: {line}")
+        start_str, _, end_str = parts[1].partition("-")
+        try:
+            start = datetime.strptime(start_str, "%H:%M").time()
+            end = datetime.strptime(end_str, "%H:%M").time()
+        except ValueError:
+            raise ValueError(f"Неверное время смены: {parts[1]}")
+        required = int(parts[2]) if len(parts) == 3 else 1
+        if required < 1:
+            raise ValueError(f"Число бариста должно быть положительным: {line}")
+        for day in parts[0].lower().split(","):
+            if day not in WEEKDAYS:
+                raise ValueError(f"Неизвестный день недели: {day}")
+            templates.append(ShiftTemplate(WEEKDAYS[day], start, end, required))
+    if not templates:
+        raise ValueError("Шаблон пуст")
+    return templates
+
+
 @router.message(Command("create_slot"))
 async def command_create_slot(message: types.Message, state: FSMContext, session: AsyncSession, user:User):
     """
@@ -162,7 +224,6 @@ async def process_confirmation(query: types.CallbackQuery, state: FSMContext, se
 
     try:
         await slots_service.create_slot(session, cafe_id,selected_date, start_time, end_time)
-        await session.commit()
         await query.message.edit_text("Слот успешно создан!")
     except Exception as e:
         logger.exception("Error creating slot: %s", e)
@@ -233,7 +294,7 @@ async def process_barista_selection(query: types.CallbackQuery, state: FSMContex
     await query.answer()  # Ensure answer is awaited
 
 @router.callback_query(EmploymentConfirmationFSM.confirm_or_decline)
-async def process_confirmation_or_decline(query: types.CallbackQuery, state: FSMContext, session: AsyncSession, bot: Bot):
+async def process_confirmation_or_decline(query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
     """
     Обработка подтверждения или отклонения выхода бариста на смену.
     """
@@ -243,17 +304,20 @@ async def process_confirmation_or_decline(query: types.CallbackQuery, state: FSM
         try:
             # Update barista.
             await user_service.confirm_barista_employment(session, barista_id)
-            await session.commit()
-
-            await bot.send_message(chat_id=settings.get_admin_ids()[0], text=f"Бариста (id={barista_id}) подтвердил выход на смену.")
 
             # Send confirmation message to manager
             await query.message.edit_text("Вы подтвердили выход бариста на смену.")
 
-            # Send notification to barista (assuming you have their Telegram ID stored)
+            # Уведомления отправляются в фоне после COMMIT: администраторам и управляющим кофейни бариста, затем самому бариста
             user = await user_service.get_user(session, barista_id) # Предполагается, что get_user_by_id не было переименовано
+            staff_ids = await UserService(session).get_cafe_staff_telegram_ids(user.cafe_id if user else None)
+            on_commit(session, partial(
+                notification_service.notify_many,
+                staff_roster.admin_ids.union(staff_ids),
+                f"Бариста (id={barista_id}) подтвердил выход на смену.",
+            ))
             if user and user.telegram_id:
-                await bot.send_message(chat_id=user.telegram_id, text="Ваш выход на смену подтвержден менеджером.")
+                on_commit(session, partial(notification_service.notify, user.telegram_id, "Ваш выход на смену подтвержден менеджером."))
         except Exception as e:
             await session.rollback() # Откатываем транзакцию в случае ошибки
             logger.exception("Error confirming barista: %s", e)
@@ -268,7 +332,6 @@ async def process_confirmation_or_decline(query: types.CallbackQuery, state: FSM
         try:
             #Update barista.
             await user_service.decline_barista_employment(session, barista_id)
-            await session.commit()
 
             #Send notification to manager
             await query.message.edit_text("Вы отклонили выход бариста на смену.")
@@ -276,7 +339,7 @@ async def process_confirmation_or_decline(query: types.CallbackQuery, state: FSM
             # Send notification to barista (assuming you have their Telegram ID stored)
             user = await user_service.get_user(session, barista_id) # Предполагается, что get_user_by_id не было переименовано
             if user and user.telegram_id:
-                await bot.send_message(chat_id=user.telegram_id, text="Ваш выход на смену отклонен менеджером.")
+                on_commit(session, partial(notification_service.notify, user.telegram_id, "Ваш выход на смену отклонен менеджером."))
         except Exception as e:
             await session.rollback() # Откатываем транзакцию в случае ошибки
             logger.exception("Error declining barista: %s", e)
@@ -295,6 +358,124 @@ async def process_confirmation_or_decline(query: types.CallbackQuery, state: FSM
     # await query.answer() # Эту строку можно удалить, если она уже в каждом блоке.
 
 
+async def _pending_cafe_ids(session: AsyncSession, current_user: User):
+    """Кофейни, заявки которых видит пользователь: администратор - все (None), управляющий - свои."""
+    if current_user.role == UserRole.ADMIN:
+        return None
+    return [cafe.id for cafe in await CafeService(session).get_managed_cafes(current_user.id)]
+
+
+@router.message(Command("user_conf"))
+async def command_user_conf(message: types.Message, state: FSMContext, session: AsyncSession, current_user: User):
+    """
+    Запуск подтверждения регистрации: заявки в кофейнях пользователя, по странице за раз.
+    """
+    cafe_ids = await _pending_cafe_ids(session, current_user)
+    if cafe_ids == []:
+        await message.answer("Вы не управляете ни одной кофейней.")
+        await state.clear()
+        return
+
+    users_page = await UserService(session).get_pending_users_page(cafe_ids)
+    if not users_page.items:
+        await message.answer("Нет заявок, ожидающих подтверждения.")
+        await state.clear()
+        return
+
+    await state.update_data(pending_cafe_ids=cafe_ids)
+    await message.answer(
+        "Выберите пользователя для подтверждения регистрации:",
+        reply_markup=get_manager_user_selection_keyboard(users_page, cancel=True),
+    )
+    await state.set_state(UserConfirmationFSM.waiting_for_user)
+
+
+@router.callback_query(UserConfirmationFSM.waiting_for_user, PageCallback.filter(F.list == "pending_users"))
+async def process_pending_users_page(
+    query: types.CallbackQuery, callback_data: PageCallback, state: FSMContext, session: AsyncSession
+):
+    """
+    Переход на другую страницу списка заявок.
+    """
+    cafe_ids = (await state.get_data()).get("pending_cafe_ids")
+    users_page = await UserService(session).get_pending_users_page(cafe_ids, **callback_data.page_args())
+    await query.message.edit_reply_markup(reply_markup=get_manager_user_selection_keyboard(users_page, cancel=True))
+    await query.answer()
+
+
+async def _pending_user_from_callback(query: types.CallbackQuery, prefix: str, state: FSMContext, session: AsyncSession):
+    """Пользователь из callback_data, если его заявка всё ещё ждёт подтверждения в доступной кофейне."""
+    try:
+        user_id = int(query.data.removeprefix(prefix))
+    except ValueError:
+        return None
+    user = await UserService(session).get_user_by_id(user_id)
+    if user is None or user.role != UserRole.PENDING:
+        return None
+    cafe_ids = (await state.get_data()).get("pending_cafe_ids")
+    if cafe_ids is not None and user.cafe_id not in cafe_ids:
+        return None
+    return user
+
+
+@router.callback_query(UserConfirmationFSM.waiting_for_user, F.data.startswith("select_pending_user_"))
+async def process_pending_user_selection(query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+    """
+    Выбор заявки: подтвердить или отклонить регистрацию.
+    """
+    user = await _pending_user_from_callback(query, "select_pending_user_", state, session)
+    if user is None:
+        await query.answer("Заявка уже обработана или недоступна.", show_alert=True)
+        return
+
+    await query.message.edit_text(
+        f"Заявка: {' '.join(filter(None, (user.first_name, user.last_name)))} ({user.phone_number}). Подтвердить регистрацию?",
+        reply_markup=get_confirm_registration_keyboard(user.id),
+    )
+    await state.set_state(UserConfirmationFSM.confirm_or_decline)
+    await query.answer()
+
+
+@router.callback_query(UserConfirmationFSM.confirm_or_decline, F.data.startswith("confirm_reg_") | F.data.startswith("decline_reg_"))
+async def process_registration_decision(query: types.CallbackQuery, state: FSMContext, session: AsyncSession):
+    """
+    Подтверждение (роль бариста) или отклонение (заявка удаляется, можно зарегистрироваться заново).
+    """
+    confirm = query.data.startswith("confirm_reg_")
+    try:
+        user = await _pending_user_from_callback(query, "confirm_reg_" if confirm else "decline_reg_", state, session)
+        if user is None:
+            await query.message.edit_text("Заявка уже обработана или недоступна.")
+        elif confirm:
+            await UserService(session).update_user_role(user, UserRole.BARISTA)
+            await query.message.edit_text(f"Регистрация {user.first_name} подтверждена.")
+            on_commit(session, partial(
+                notification_service.notify, user.telegram_id, "Ваша регистрация подтверждена. Отправьте /start, чтобы открыть меню."
+            ))
+        else:
+            await UserService(session).delete_user(user)
+            await query.message.edit_text(f"Заявка {user.first_name} отклонена.")
+            on_commit(session, partial(
+                notification_service.notify, user.telegram_id, "Ваша заявка на регистрацию отклонена. Отправьте /start, чтобы подать её заново."
+            ))
+    except Exception as e:
+        logger.exception("Error processing registration decision: %s", e)
+        await query.message.edit_text("Произошла ошибка при обработке заявки.")
+    finally:
+        await state.clear()
+    await query.answer()
+
+
+@router.callback_query(UserConfirmationFSM.waiting_for_user, F.data == "cancel")
+async def process_user_conf_cancel(query: types.CallbackQuery, state: FSMContext):
+    """
+    Отмена подтверждения регистрации.
+    """
+    await query.message.edit_text("Подтверждение регистрации отменено.")
+    await state.clear()
+    await query.answer()
+
+
 @router.message(Command("monitoring"))
 async def command_monitoring(message: types.Message, state: FSMContext):
         """
@@ -332,4 +513,115 @@ async def process_monitoring_date(message: types.Message, state: FSMContext, ses
         logger.exception("Error during monitoring: %s", e)
         await message.answer("Произошла ошибка при получении информации о загруженности смен.")
     finally:
-        await state.clear()
\ No newline at end of file
+        await state.clear()
+
+
+@router.message(Command("schedule"))
+async def command_schedule(message: types.Message, state: FSMContext, session: AsyncSession, current_user: User):
+    """
+    Генерация расписания по недельному шаблону на несколько недель вперёд.
+    """
+    cafe_service = CafeService(session)
+    if current_user.role == UserRole.ADMIN:
+        cafes = await cafe_service.get_all_cafes()
+    else:
+        cafes = await cafe_service.get_managed_cafes(current_user.id)
+    if not cafes:
+        await message.answer("Вы не управляете ни одной кофейней. Невозможно создать расписание.")
+        return
+
+    keyboard = [[types.InlineKeyboardButton(text=cafe.name, callback_data=f"schedcafe_{cafe.id}")] for cafe in cafes]
+    if len(cafes) > 1:
+        keyboard.append([types.InlineKeyboardButton(text="Все кофейни", callback_data="schedcafe_all")])
+    keyboard.append([types.InlineKeyboardButton(text="Отмена", callback_data="cancel")])
+
+    await state.update_data(schedule_cafe_ids=[cafe.id for cafe in cafes])
+    await message.answer("Выберите кофейню для расписания:", reply_markup=types.InlineKeyboardMarkup(inline_keyboard=keyboard))
+    await state.set_state(ScheduleFSM.waiting_for_cafes)
+
+
+@router.callback_query(ScheduleFSM.waiting_for_cafes)
+async def process_schedule_cafes(query: types.CallbackQuery, state: FSMContext):
+    """
+    Выбор кофейни (или всех доступных кофеен) для расписания.
+    """
+    if query.data == "cancel":
+        await query.message.edit_text("Создание расписания отменено.")
+        await state.clear()
+        await query.answer()
+        return
+
+    choice = query.data.split("_", 1)[-1]
+    if choice != "all":
+        # Принимаем только кофейни из предложенного списка: callback_data приходит от клиента
+        data = await state.get_data()
+        try:
+            cafe_id = int(choice)
+        except ValueError:
+            cafe_id = None
+        if cafe_id not in data.get("schedule_cafe_ids", []):
+            await query.answer("Некорректный выбор кофейни.", show_alert=True)
+            return
+        await state.update_data(schedule_cafe_ids=[cafe_id])
+    await query.message.edit_text(SCHEDULE_TEMPLATE_HELP)
+    await state.set_state(ScheduleFSM.waiting_for_template)
+    await query.answer()
+
+
+@router.message(ScheduleFSM.waiting_for_template)
+async def process_schedule_template(message: types.Message, state: FSMContext):
+    """
+    Разбор недельного шаблона смен.
+    """
+    try:
+        templates = parse_week_template(message.text)
+    except ValueError as e:
+        await message.answer(f"Не удалось разобрать шаблон: {e}\n\n{SCHEDULE_TEMPLATE_HELP}")
+        return
+
+    # В FSM храним только JSON-совместимые значения
+    await state.update_data(schedule_template=[
+        [t.weekday, t.start.strftime("%H:%M"), t.end.strftime("%H:%M"), t.required_baristas] for t in templates
+    ])
+    await message.answer(f"Введите дату начала и число недель (до {MAX_SCHEDULE_WEEKS}), например: <code>2024-07-01 4</code>")
+    await state.set_state(ScheduleFSM.waiting_for_period)
+
+
+@router.message(ScheduleFSM.waiting_for_period)
+async def process_schedule_period(message: types.Message, state: FSMContext, session: AsyncSession):
+    """
+    Создание слотов по шаблону одним запросом.
+    """
+    try:
+        date_str, weeks_str = message.text.split()
+        start_date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        weeks = int(weeks_str)
+        if not 1 <= weeks <= MAX_SCHEDULE_WEEKS:
+            raise ValueError
+    except ValueError:
+        await message.answer(f"Неверный формат. Введите дату (YYYY-MM-DD) и число недель от 1 до {MAX_SCHEDULE_WEEKS}.")
+        return
+
+    data = await state.get_data()
+    templates = [
+        ShiftTemplate(weekday, datetime.strptime(start, "%H:%M").time(), datetime.strptime(end, "%H:%M").time(), required)
+        for weekday, start, end, required in data["schedule_template"]
+    ]
+    try:
+        result = await SlotService(session).create_schedule(data["schedule_cafe_ids"], templates, start_date, weeks)
+    except ValueError as e:
+        # Шаблон пересекается сам с собой: возвращаемся к вводу шаблона
+        await message.answer(f"Шаблон некорректен: {e}\n\n{SCHEDULE_TEMPLATE_HELP}")
+        await state.set_state(ScheduleFSM.waiting_for_template)
+        return
+    except Exception as e:
+        logger.exception("Error creating schedule: %s", e)
+        await message.answer("Произошла ошибка при создании расписания.")
+        await state.clear()
+        return
+
+    text = f"Расписание создано: {len(result.created)} слотов."
+    if result.skipped:
+        text += f"\nПропущено {result.skipped} смен, пересекающихся с существующими слотами."
+    await message.answer(text)
+    await state.clear()
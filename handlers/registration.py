@@ -1,13 +1,18 @@
+from functools import partial
+
 from aiogram import Router, F
 from aiogram.types import Message, CallbackQuery
 from aiogram.fsm.context import FSMContext
 from sqlalchemy.ext.asyncio import AsyncSession
+from src.db.session import on_commit
 from src.fsm.states import RegistrationStates
 from src.models import User, UserRole, Cafe
 from src.services.user import UserService
 from src.services.cafe import CafeService
 from src.keyboards.reply import get_phone_request_keyboard
-from src.keyboards.inline import InlineKeyboardBuilder # Re-use builder for cafe selection
+from src.keyboards.inline import get_cafes_keyboard
+from src.keyboards.pagination import PageCallback
+from src.redis_del.user_cache import user_cache
 
 router = Router()
 
@@ -18,11 +23,9 @@ async def process_name(message: Message, state: FSMContext, current_user: User,
         await message.answer("Пожалуйста, введите корректное полное имя.")
         return
 
-    # Обновляем имя user'а в БД. Phone number будет обновлен позже.
-    user_service = UserService(session)
+    # Обновляем имя user'а в БД (COMMIT - в конце обновления). Phone number будет обновлен позже.
     current_user.first_name = message.text.strip()
-    await user_service.session.commit() # Сохраняем изменения имени
-    await user_service.session.refresh(current_user)
+    on_commit(session, partial(user_cache.invalidate, current_user.telegram_id))
 
     await state.update_data(first_name=message.text.strip())
     await message.answer(
@@ -37,30 +40,39 @@ async def process_phone(message: Message, state: FSMContext, current_user: User,
     phone_number = message.contact.phone_number
     await state.update_data(phone_number=phone_number)
 
-    user_service = UserService(session)
     # Обновляем номер телефона пользователя
     # Если user был создан с заглушкой temp_*, то мы теперь ее заменяем.
     current_user.phone_number = phone_number
-    await user_service.session.commit()
-    await user_service.session.refresh(current_user)
+    on_commit(session, partial(user_cache.invalidate, current_user.telegram_id))
 
     cafe_service = CafeService(session)
-    all_cafes = await cafe_service.get_all_cafes()
+    cafes_page = await cafe_service.get_cafes_page()
 
-    if not all_cafes:
+    if not cafes_page.items:
         await message.answer("В настоящее время нет доступных кофеен для выбора. Пожалуйста, ожидайте подтверждения администратором.", reply_markup=None)
         await state.clear()
         # Возможно, здесь нужно уведомить админа, что новый юзер не смог выбрать кофейню
         return
 
-    builder = InlineKeyboardBuilder()
-    for cafe in all_cafes:
-        builder.button(text=cafe.name, callback_data=f"select_cafe_{cafe.id}")
-    builder.adjust(1)
-    await message.answer("Отлично! Теперь выберите кофейню, в которой вы работаете (базовая):", reply_markup=builder.as_markup())
+    await message.answer(
+        "Отлично! Теперь выберите кофейню, в которой вы работаете (базовая):",
+        reply_markup=get_cafes_keyboard(cafes_page, "reg_cafes", "select_cafe_"),
+    )
     await state.set_state(RegistrationStates.waiting_for_cafe_selection)
 
 
+@router.callback_query(RegistrationStates.waiting_for_cafe_selection, PageCallback.filter(F.list == "reg_cafes"))
+async def process_cafe_page(
+    callback_query: CallbackQuery, callback_data: PageCallback, session: AsyncSession
+) -> None:
+    """Переход на другую страницу списка кофеен."""
+    cafes_page = await CafeService(session).get_cafes_page(**callback_data.page_args())
+    await callback_query.message.edit_reply_markup(
+        reply_markup=get_cafes_keyboard(cafes_page, "reg_cafes", "select_cafe_")
+    )
+    await callback_query.answer()
+
+
 @router.message(RegistrationStates.waiting_for_phone)
 async def process_phone_invalid(message: Message, state: FSMContext) -> None:
     """Обработка невалидного ввода номера телефона."""
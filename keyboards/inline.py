@@ -1,7 +1,18 @@
+from functools import lru_cache
+
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 
+from src.keyboards.pagination import paginated_keyboard
+from src.services.pagination import Page
+
+CANCEL_BUTTON = InlineKeyboardButton(text="Отмена", callback_data="cancel")
+
+# Клавиатуры с параметрами кэшируются по набору аргументов; старые наборы вытесняются (LRU)
+KEYBOARD_CACHE_SIZE = 1024
 
+
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_confirm_registration_keyboard(user_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для подтверждения/отклонения регистрации бариста."""
     builder = InlineKeyboardBuilder()
@@ -9,16 +20,19 @@ def get_confirm_registration_keyboard(user_id: int) -> InlineKeyboardMarkup:
     builder.button(text="Отклонить ❌", callback_data=f"decline_reg_{user_id}")
     return builder.as_markup()
 
-def get_slots_keyboard(slots: list) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора слотов."""
-    builder = InlineKeyboardBuilder()
-    for slot in slots:
+def get_slots_keyboard(page: Page, list_name: str = "slots", cancel: bool = False) -> InlineKeyboardMarkup:
+    """
+    Клавиатура для выбора слотов (одна страница, см. SlotService.get_available_slots_page).
+    Слоты должны быть загружены с профилем "listing" (SlotService), иначе slot.cafe
+    будет загружаться отдельным запросом для каждой кнопки.
+    """
+    def _button(slot):
         # Пример: "2023-11-15 10:00 - 12:00 (Кофейня А)"
         text = f"{slot.start_time.strftime('%Y-%m-%d %H:%M')} - {slot.end_time.strftime('%H:%M')} ({slot.cafe.name})"
-        builder.button(text=text, callback_data=f"select_slot_{slot.id}")
-    builder.adjust(1) # По одной кнопке на строку
-    return builder.as_markup()
+        return text, f"select_slot_{slot.id}"
+    return paginated_keyboard(page, list_name, _button, extra_buttons=[CANCEL_BUTTON] if cancel else ())
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_confirm_booking_keyboard(slot_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для подтверждения бронирования слота."""
     builder = InlineKeyboardBuilder()
@@ -26,6 +40,7 @@ def get_confirm_booking_keyboard(slot_id: int) -> InlineKeyboardMarkup:
     builder.button(text="Отмена ❌", callback_data="cancel_action")
     return builder.as_markup()
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_confirm_user_going_keyboard(booking_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для подтверждения выхода на смену бариста."""
     builder = InlineKeyboardBuilder()
@@ -33,6 +48,7 @@ def get_confirm_user_going_keyboard(booking_id: int) -> InlineKeyboardMarkup:
     builder.button(text="Отмена ❌", callback_data="cancel_action")
     return builder.as_markup()
 
+@lru_cache(maxsize=KEYBOARD_CACHE_SIZE)
 def get_manager_confirmation_keyboard(booking_id: int, user_id: int) -> InlineKeyboardMarkup:
     """Клавиатура для управляющего для подтверждения выхода бариста на смену."""
     builder = InlineKeyboardBuilder()
@@ -40,10 +56,23 @@ def get_manager_confirmation_keyboard(booking_id: int, user_id: int) -> InlineKe
     builder.button(text="Отклонить выход ❌", callback_data=f"manager_decline_going_{booking_id}")
     return builder.as_markup()
 
-def get_manager_user_selection_keyboard(users: list) -> InlineKeyboardMarkup:
-    """Клавиатура для выбора пользователя управляющим для подтверждения регистрации."""
-    builder = InlineKeyboardBuilder()
-    for user in users:
-        builder.button(text=f"{user.first_name} ({user.telegram_id})", callback_data=f"select_pending_user_{user.id}")
-    builder.adjust(1)
-    return builder.as_markup()
+def get_manager_user_selection_keyboard(page: Page, list_name: str = "pending_users", cancel: bool = False) -> InlineKeyboardMarkup:
+    """Клавиатура для выбора пользователя управляющим для подтверждения регистрации (одна страница)."""
+    return paginated_keyboard(
+        page, list_name, lambda user: (f"{user.first_name} ({user.telegram_id})", f"select_pending_user_{user.id}"),
+        extra_buttons=[CANCEL_BUTTON] if cancel else (),
+    )
+
+def get_cafes_keyboard(page: Page, list_name: str, callback_prefix: str, cancel: bool = False) -> InlineKeyboardMarkup:
+    """Клавиатура выбора кофейни (одна страница, см. CafeService.get_cafes_page)."""
+    return paginated_keyboard(
+        page, list_name, lambda cafe: (cafe.name, f"{callback_prefix}{cafe.id}"),
+        extra_buttons=[CANCEL_BUTTON] if cancel else (),
+    )
+
+def get_users_keyboard(page: Page, list_name: str, callback_prefix: str, cancel: bool = False) -> InlineKeyboardMarkup:
+    """Клавиатура выбора пользователя (одна страница, см. UserService.get_users_page)."""
+    return paginated_keyboard(
+        page, list_name, lambda user: (user.first_name or str(user.telegram_id), f"{callback_prefix}{user.id}"),
+        extra_buttons=[CANCEL_BUTTON] if cancel else (),
+    )
@@ -0,0 +1,58 @@
+from typing import Any, Callable, Dict, Optional, Sequence, Tuple
+
+from aiogram.filters.callback_data import CallbackData
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+from src.services.pagination import Page
+
+
+class PageCallback(CallbackData, prefix="pg"):
+    """
+    Переход между страницами списка: "pg:<list>:<n|p>:<id>".
+    cursor - id первой (назад) или последней (вперёд) строки текущей страницы.
+    """
+    list: str
+    direction: str
+    cursor: int
+
+    def page_args(self) -> Dict[str, Optional[int]]:
+        """Аргументы after_id / before_id для метода сервиса, возвращающего Page."""
+        if self.direction == "p":
+            return {"after_id": None, "before_id": self.cursor}
+        return {"after_id": self.cursor, "before_id": None}
+
+
+def paginated_keyboard(
+    page: Page,
+    list_name: str,
+    item_button: Callable[[Any], Tuple[str, str]],
+    extra_buttons: Sequence[InlineKeyboardButton] = (),
+) -> InlineKeyboardMarkup:
+    """
+    Клавиатура одной страницы списка: по кнопке на элемент, строка навигации
+    (если есть соседние страницы) и дополнительные кнопки (например, "Отмена").
+    item_button(item) возвращает (текст, callback_data) кнопки элемента.
+    """
+    builder = InlineKeyboardBuilder()
+    for item in page.items:
+        text, callback_data = item_button(item)
+        builder.row(InlineKeyboardButton(text=text, callback_data=callback_data))
+
+    navigation = []
+    if page.has_prev and page.items:
+        navigation.append(InlineKeyboardButton(
+            text="◀️",
+            callback_data=PageCallback(list=list_name, direction="p", cursor=page.items[0].id).pack(),
+        ))
+    if page.has_next and page.items:
+        navigation.append(InlineKeyboardButton(
+            text="▶️",
+            callback_data=PageCallback(list=list_name, direction="n", cursor=page.items[-1].id).pack(),
+        ))
+    if navigation:
+        builder.row(*navigation)
+
+    for button in extra_buttons:
+        builder.row(button)
+    return builder.as_markup()
@@ -1,44 +1,50 @@
+from functools import cache
+
 from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from aiogram.utils.keyboard import ReplyKeyboardBuilder
 
-def get_barista_menu_keyboard() -> ReplyKeyboardMarkup:
+# Статические клавиатуры строятся один раз и переиспользуются: aiogram только сериализует
+# reply_markup при отправке, поэтому один экземпляр можно отправлять в любом количестве ответов.
+# Модели aiogram изменяемы (frozen=False), так что кэшированные клавиатуры - только для чтения:
+# чтобы что-то поменять, сделайте копию (markup.model_copy(deep=True)) или соберите новую.
+
+BARISTA_COMMANDS = ("/slots", "/my_slots", "/going")
+MANAGER_COMMANDS = ("/user_conf", "/creating_shifts", "/edit_shifts", "/change_booking", "/employment_conf", "/monitoring")
+# Admin also has manager commands
+ADMIN_COMMANDS = ("/create_cafe", "/edit_cafe", "/create_user", "/edit_user") + MANAGER_COMMANDS
+
+
+def _build_menu(commands: tuple) -> ReplyKeyboardMarkup:
     builder = ReplyKeyboardBuilder()
-    builder.button(text="/slots")
-    builder.button(text="/my_slots")
-    builder.button(text="/going")
+    for command in commands:
+        builder.button(text=command)
     builder.adjust(2)
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=False)
 
+@cache
+def get_barista_menu_keyboard() -> ReplyKeyboardMarkup:
+    return _build_menu(BARISTA_COMMANDS)
+
+@cache
 def get_manager_menu_keyboard() -> ReplyKeyboardMarkup:
-    builder = ReplyKeyboardBuilder()
-    builder.button(text="/user_conf")
-    builder.button(text="/creating_shifts")
-    builder.button(text="/edit_shifts")
-    builder.button(text="/change_booking")
-    builder.button(text="/employment_conf")
-    builder.button(text="/monitoring")
-    builder.adjust(2)
-    return builder.as_markup(resize_keyboard=True, one_time_keyboard=False)
+    return _build_menu(MANAGER_COMMANDS)
 
+@cache
 def get_admin_menu_keyboard() -> ReplyKeyboardMarkup:
-    builder = ReplyKeyboardBuilder()
-    builder.button(text="/create_cafe")
-    builder.button(text="/edit_cafe")
-    builder.button(text="/create_user")
-    builder.button(text="/edit_user")
-    # Admin also has manager commands
-    builder.button(text="/user_conf")
-    builder.button(text="/creating_shifts")
-    builder.button(text="/edit_shifts")
-    builder.button(text="/change_booking")
-    builder.button(text="/employment_conf")
-    builder.button(text="/monitoring")
-    builder.adjust(2)
-    return builder.as_markup(resize_keyboard=True, one_time_keyboard=False)
+    return _build_menu(ADMIN_COMMANDS)
 
 
+@cache
 def get_phone_request_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура для запроса номера телефона."""
     builder = ReplyKeyboardBuilder()
     builder.button(text="Поделиться номером телефона", request_contact=True)
     return builder.as_markup(resize_keyboard=True, one_time_keyboard=True)
+
+
+def prebuild_keyboards() -> None:
+    """Построить статические клавиатуры заранее (при старте), а не на первом /start."""
+    get_barista_menu_keyboard()
+    get_manager_menu_keyboard()
+    get_admin_menu_keyboard()
+    get_phone_request_keyboard()
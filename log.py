@@ -0,0 +1,188 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from aiogram import BaseMiddleware
+from aiogram.types import TelegramObject, Update
+
+from src.config import Settings
+
+logger = logging.getLogger(__name__)
+
+# Поля текущего обновления (update_id, user_id, handler), которые попадают в каждую запись лога
+log_context: ContextVar[Optional[Dict[str, Any]]] = ContextVar("log_context", default=None)
+
+# Стандартные атрибуты LogRecord - всё остальное пришло через extra= и выводится как поле JSON
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[QueueListener] = None
+# Процесс, в котором запущен поток _listener: после fork дочерний процесс наследует
+# _listener, но не его поток, и должен поднять свою очередь и свой поток вывода
+_listener_pid: Optional[int] = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна JSON-строка на запись: время, уровень, логгер, сообщение, контекст обновления и extra."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload: Dict[str, Any] = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_info:
+            payload["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Копирует контекст обновления в запись. Стоит на QueueHandler, то есть выполняется
+    в потоке, который пишет в лог, пока contextvar ещё указывает на нужное обновление.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        if context:
+            for key, value in context.items():
+                if not hasattr(record, key):
+                    setattr(record, key, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю rate записей уровня DEBUG, более важные - всегда.
+    Внутри обновления решение принимается по update_id, поэтому обновление
+    попадает в лог либо со всеми своими DEBUG-записями, либо без них.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate >= 1:
+            return True
+        context = log_context.get()
+        if context and context.get("update_id") is not None:
+            return (context["update_id"] * 2654435761) % 2**32 < self.rate * 2**32
+        return random.random() < self.rate
+
+
+class InProcessQueueHandler(QueueHandler):
+    """
+    QueueHandler для очереди внутри процесса: запись передаётся потоку вывода
+    как есть, без форматирования в prepare() - иначе сообщение и traceback
+    форматировались бы в event loop, а поток вывода только печатал бы готовую строку.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(settings: Settings) -> None:
+    """
+    Настроить логирование процесса. Запись в лог только кладёт LogRecord в очередь;
+    форматирование и вывод в stdout выполняет отдельный поток QueueListener,
+    поэтому event loop не блокируется на выводе.
+    Повторный вызов в том же процессе ничего не делает, в дочернем (после fork) -
+    заменяет унаследованные очередь и поток своими.
+    """
+    global _listener, _listener_pid
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+
+    if settings.LOG_FORMAT == "json":
+        formatter: logging.Formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(name)s - %(message)s")
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(formatter)
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    queue_handler = InProcessQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(settings.LOG_DEBUG_SAMPLE_RATE))
+    queue_handler.addFilter(ContextFilter())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(settings.LOG_LEVEL)
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    if _listener_pid is None:
+        atexit.register(shutdown_logging)
+    _listener_pid = os.getpid()
+
+
+def shutdown_logging() -> None:
+    """
+    Дописать оставшиеся в очереди записи и остановить поток вывода.
+    Процессы multiprocessing завершаются без atexit, поэтому воркеры вызывают её сами.
+    """
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+
+class UpdateLogContextMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: заполняет контекст лога для обновления
+    и пишет запись с длительностью обработки (уровень - LOG_UPDATE_LEVEL).
+    """
+
+    def __init__(self, level: int = logging.INFO):
+        super().__init__()
+        self.level = level
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        from_user = data.get("event_from_user")
+        context = {"update_id": event.update_id, "user_id": from_user.id if from_user else None}
+        token = log_context.set(context)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            logger.log(
+                self.level,
+                "Update handled",
+                extra={"duration_ms": round((time.perf_counter() - started) * 1000, 3), "event_type": event.event_type},
+            )
+            log_context.reset(token)
+
+
+class HandlerLogContextMiddleware(BaseMiddleware):
+    """Inner-middleware: добавляет в контекст лога имя выбранного хендлера."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        context = log_context.get()
+        handler_object = data.get("handler")
+        if context is not None and handler_object is not None:
+            context["handler"] = getattr(handler_object.callback, "__name__", repr(handler_object.callback))
+        return await handler(event, data)
@@ -1,5 +1,4 @@
 import asyncio
-import logging
 import os
 import sys
 # Вот данные штиуки у Вас и без них должно работать у меня на ПК потерял путь по этому дописал костыли
@@ -11,8 +10,10 @@ project_root = os.path.abspath(os.path.join(current_dir, '..'))
 # Добавляем корневую директорию в sys.path
 if project_root not in sys.path:
     sys.path.insert(0, project_root)
-from src.bot import main
+from src.bot import run
+from src.config import get_settings
+from src.log import setup_logging
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(name)s - %(message)s")
-    asyncio.run(main())
+    setup_logging(get_settings())
+    run()
@@ -0,0 +1,202 @@
+import logging
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин по умолчанию, в секундах
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Counter:
+    """Монотонно возрастающий счётчик."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0
+
+    def inc(self, amount: int = 1) -> None:
+        self.value += amount
+
+
+class Gauge:
+    """Текущее значение, которое может как расти, так и уменьшаться."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.value = 0
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+
+class Histogram:
+    """
+    Распределение значений (обычно длительностей) по корзинам.
+    Корзина i считает значения <= buckets[i], последняя (+Inf) - все остальные.
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        labels: Optional[Dict[str, str]] = None,
+    ):
+        self.name = name
+        self.description = description
+        self.labels = labels or {}
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def cumulative(self) -> Dict[str, int]:
+        """Накопленные счётчики по верхним границам корзин (как le в Prometheus)."""
+        result, total = {}, 0
+        for bound, count in zip((*self.buckets, float("inf")), self.counts):
+            total += count
+            result["+Inf" if bound == float("inf") else repr(bound)] = total
+        return result
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля: верхняя граница корзины, в которую он попадает."""
+        if not self.count:
+            return 0.0
+        rank, total = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return bound
+        return float("inf")
+
+    @property
+    def value(self) -> Dict[str, Any]:
+        return {"count": self.count, "sum": self.sum, "buckets": self.cumulative()}
+
+
+def _series_key(name: str, labels: Optional[Dict[str, str]]) -> str:
+    """Имя ряда в формате Prometheus: name{label="value",...}."""
+    if not labels:
+        return name
+    rendered = ",".join(f'{key}="{_escape(value)}"' for key, value in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса. Ряды с метками хранятся отдельно под ключом name{labels}."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Union[Counter, Gauge, Histogram]] = {}
+
+    def counter(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None) -> Counter:
+        """Вернуть счётчик по имени (и меткам), создав его при первом обращении."""
+        key = _series_key(name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = Counter(name, description, labels)
+            self._metrics[key] = metric
+        return metric
+
+    def gauge(self, name: str, description: str = "", labels: Optional[Dict[str, str]] = None) -> Gauge:
+        """Вернуть gauge по имени (и меткам), создав его при первом обращении."""
+        key = _series_key(name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = Gauge(name, description, labels)
+            self._metrics[key] = metric
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        description: str = "",
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        labels: Optional[Dict[str, str]] = None,
+    ) -> Histogram:
+        """Вернуть гистограмму по имени (и меткам), создав её при первом обращении."""
+        key = _series_key(name, labels)
+        metric = self._metrics.get(key)
+        if metric is None:
+            metric = Histogram(name, description, buckets, labels)
+            self._metrics[key] = metric
+        return metric
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущие значения всех метрик."""
+        return {name: metric.value for name, metric in self._metrics.items()}
+
+    def render_prometheus(self) -> str:
+        """Все метрики в текстовом формате экспорта Prometheus."""
+        families: Dict[str, List[Union[Counter, Gauge, Histogram]]] = {}
+        for metric in self._metrics.values():
+            families.setdefault(metric.name, []).append(metric)
+
+        lines: List[str] = []
+        for name, series in sorted(families.items()):
+            lines.append(f"# HELP {name} {series[0].description}")
+            lines.append(f"# TYPE {name} {series[0].kind}")
+            for metric in series:
+                if isinstance(metric, (Counter, Gauge)):
+                    lines.append(f"{_series_key(name, metric.labels)} {metric.value}")
+                    continue
+                for bound, total in metric.cumulative().items():
+                    lines.append(f"{_series_key(name + '_bucket', {**metric.labels, 'le': bound})} {total}")
+                lines.append(f"{_series_key(name + '_sum', metric.labels)} {metric.sum}")
+                lines.append(f"{_series_key(name + '_count', metric.labels)} {metric.count}")
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+# Время, потраченное текущим обновлением на БД, Redis и т.п. (заполняется хуками, читается middleware метрик)
+update_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("update_timings", default=None)
+
+
+def record_update_time(kind: str, seconds: float) -> None:
+    """Добавить seconds ко времени kind текущего обновления (вне обновления ничего не делает)."""
+    timings = update_timings.get()
+    if timings is not None:
+        timings[kind] = timings.get(kind, 0.0) + seconds
+
+
+async def start_metrics_server(host: str, port: int) -> web.AppRunner:
+    """Поднять HTTP-эндпоинт /metrics этого процесса."""
+    async def _handle_metrics(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render_prometheus(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", _handle_metrics)
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info("Metrics available on http://%s:%s/metrics", host, port)
+    return runner
@@ -0,0 +1,91 @@
+import time
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware, Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import Response, TelegramMethod
+from aiogram.methods.base import TelegramType
+from aiogram.types import TelegramObject, Update
+
+from src.metrics import record_update_time, registry, update_timings
+
+update_latency = registry.histogram("update_latency_seconds", "Полное время обработки обновления")
+update_db_time = registry.histogram("update_db_seconds", "Время SQL-запросов за одно обновление")
+update_redis_time = registry.histogram("update_redis_seconds", "Время команд Redis за одно обновление")
+update_telegram_time = registry.histogram("update_telegram_seconds", "Время вызовов Telegram API за одно обновление")
+
+
+def _handler_name(data: Dict[str, Any]) -> str:
+    handler_object = data.get("handler")
+    if handler_object is None:
+        return "unknown"
+    callback = handler_object.callback
+    return f"{getattr(callback, '__module__', '')}.{getattr(callback, '__name__', repr(callback))}"
+
+
+class UpdateMetricsMiddleware(BaseMiddleware):
+    """
+    Outer-middleware на dp.update: считает обновления и время их обработки,
+    а также собирает время БД/Redis/Telegram, накопленное хуками за это обновление.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: Update,
+        data: Dict[str, Any],
+    ) -> Any:
+        timings: Dict[str, float] = {}
+        token = update_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            update_latency.observe(time.perf_counter() - started)
+            update_db_time.observe(timings.get("db", 0.0))
+            update_redis_time.observe(timings.get("redis", 0.0))
+            update_telegram_time.observe(timings.get("telegram", 0.0))
+            registry.counter("updates_total", "Обработанные обновления", labels={"type": event.event_type}).inc()
+            update_timings.reset(token)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware: время хендлера с разбивкой по хендлеру и по состоянию FSM."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        started = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.histogram(
+                "handler_latency_seconds", "Время хендлера", labels={"handler": _handler_name(data)}
+            ).observe(elapsed)
+            registry.histogram(
+                "fsm_state_latency_seconds", "Время хендлера по состоянию FSM", labels={"state": data.get("raw_state") or "none"}
+            ).observe(elapsed)
+
+
+class TelegramRequestMetricsMiddleware(BaseRequestMiddleware):
+    """Middleware сессии бота: время каждого вызова Telegram API по методам."""
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Response[TelegramType]:
+        started = time.perf_counter()
+        try:
+            return await make_request(bot, method)
+        finally:
+            elapsed = time.perf_counter() - started
+            registry.histogram(
+                "telegram_request_seconds", "Время вызова Telegram API", labels={"method": type(method).__name__}
+            ).observe(elapsed)
+            record_update_time("telegram", elapsed)
@@ -1,18 +1,34 @@
-from typing import Callable, Dict, Any, Awaitable, Union
+import logging
+from typing import Callable, Dict, Any, Awaitable, Iterable, Union
 
 from aiogram import BaseMiddleware
 from aiogram.types import Message, CallbackQuery, ChatMemberUpdated
 from sqlalchemy.ext.asyncio import AsyncSession
-from enum import Enum
 
 from src.models import User, UserRole
+from src.redis_del.staff_roster import StaffRoster
 from src.services.user import UserService
 
+logger = logging.getLogger(__name__)
+
+# Бит на каждую роль. Маска ролей пользователя вычисляется один раз на обновление
+# (UserRegisterMiddleware кладёт её в data["role_mask"]), проверка прав - одно побитовое И.
+ROLE_BITS: Dict[UserRole, int] = {role: 1 << index for index, role in enumerate(UserRole)}
+
+
+def role_mask(roles: Iterable[UserRole]) -> int:
+    """Маска для набора ролей."""
+    mask = 0
+    for role in roles:
+        mask |= ROLE_BITS[role]
+    return mask
+
 
 class RoleMiddleware(BaseMiddleware):
     def __init__(self, required_roles: list[UserRole]):
         super().__init__()
         self.required_roles = required_roles
+        self.required_mask = role_mask(required_roles)
 
     async def __call__(
         self,
@@ -20,21 +36,8 @@ class RoleMiddleware(BaseMiddleware):
         event: Union[Message, CallbackQuery],
         data: Dict[str, Any]
     ) -> Any:
-        # Получение сессии из данных
-        session: AsyncSession = data["session"]
-        user_service = UserService(session)
-
-        # Попытка получить текущего пользователя из данных
-        user: Union[User, None] = data.get("current_user")
-
-        # Если пользователь не найден, пытаемся получить по telegram_id
-        if user is None and hasattr(event, 'from_user') and event.from_user:
-            user = await user_service.get_user_by_telegram_id(event.from_user.id)
-            if user:
-                data["current_user"] = user
-
-        # Проверка прав пользователя
-        if not user or user.role not in self.required_roles:
+        # Пользователь и маска его ролей уже определены UserRegisterMiddleware для этого обновления
+        if not data.get("role_mask", 0) & self.required_mask:
             if isinstance(event, Message):
                 await event.answer("У вас нет прав для выполнения этого действия.")
             elif isinstance(event, CallbackQuery):
@@ -45,10 +48,9 @@ class RoleMiddleware(BaseMiddleware):
 
 
 class UserRegisterMiddleware(BaseMiddleware):
-    def __init__(self, admin_ids: list[int], manager_ids: list[int]):
+    def __init__(self, roster: StaffRoster):
         super().__init__()
-        self.admin_ids = admin_ids
-        self.manager_ids = manager_ids
+        self.roster = roster
 
     async def __call__(
         self,
@@ -75,13 +77,14 @@ class UserRegisterMiddleware(BaseMiddleware):
             else:
                  # Для других типов событий, где from_user может отсутствовать (например, ChatMemberUpdated для других пользователей)
                  # можно либо пропустить, либо логировать и затем прервать.
-                 print(f"Warning: Attempted to register user from event type {type(event).__name__} without from_user.")
+                 logger.warning("Cannot register user from %s without from_user", type(event).__name__)
                  return await handler(event, data) # Возможно, просто пропустить, если это не критично для регистрации
 
             return None # Прерываем, если не удалось определить telegram_id и это критично
 
 
-        user: Union[User, None] = await user_service.get_user_by_telegram_id(telegram_id)
+        # Читаем через кэш: для известного пользователя это не требует запроса к БД
+        user: Union[User, None] = await user_service.get_user_by_telegram_id_cached(telegram_id)
 
         if not user:
             first_name = event.from_user.first_name or "Неизвестный"
@@ -90,16 +93,11 @@ class UserRegisterMiddleware(BaseMiddleware):
             temp_phone_number = f"temp_{telegram_id}"
 
             initial_role = UserRole.PENDING
-            if telegram_id in self.admin_ids:
+            if telegram_id in self.roster.admin_ids:
                 initial_role = UserRole.ADMIN
-            elif telegram_id in self.manager_ids:
+            elif telegram_id in self.roster.manager_ids:
                 initial_role = UserRole.MANAGER
-            
-            print(f"DEBUG (Middleware): initial_role type: {type(initial_role)}")
-            print(f"DEBUG (Middleware): initial_role value: {initial_role}")
-            if isinstance(initial_role, Enum):
-                print(f"DEBUG (Middleware): initial_role .name: {initial_role.name}")
-                print(f"DEBUG (Middleware): initial_role .value: {initial_role.value}")
+            logger.debug("Registering new user", extra={"initial_role": initial_role.value})
 
             user = await user_service.create_user(
                 telegram_id=telegram_id,
@@ -114,6 +112,7 @@ class UserRegisterMiddleware(BaseMiddleware):
                 data["is_new_pending_user"] = True
 
         data["current_user"] = user # Сохраняем найденного или созданного пользователя в данных
+        data["role_mask"] = ROLE_BITS.get(user.role, 0)
 
         # Передаем управление следующему в цепочке
         return await handler(event, data)
@@ -0,0 +1,89 @@
+import asyncio
+import sys
+from logging.config import fileConfig
+from pathlib import Path
+
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import async_engine_from_config
+
+from alembic import context
+
+# Код бота импортируется как пакет src: добавляем в путь каталог, содержащий src
+sys.path.insert(0, str(Path(__file__).absolute().parents[2]))
+
+from src.config import get_settings  # noqa: E402
+from src.db.base import Base  # noqa: E402
+import src.models  # noqa: E402,F401  Регистрирует модели в Base.metadata
+
+config = context.config
+
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name)
+
+# Адрес БД берётся из настроек бота (.env), а не из alembic.ini
+config.set_main_option("sqlalchemy.url", str(get_settings().DATABASE_URL).replace("%", "%%"))
+
+target_metadata = Base.metadata
+
+# Объекты, которые есть только в БД (создаются миграциями, в моделях их нет):
+# колонка bookings.shift и исключающее ограничение по ней (0001_booking_shift_overlap).
+# Без исключения autogenerate предлагал бы их удалить
+DB_ONLY_OBJECTS = {
+    ("column", "bookings", "shift"),
+    ("index", "bookings", "ex_booking_barista_shift"),
+    ("unique_constraint", "bookings", "ex_booking_barista_shift"),
+}
+
+
+def include_object(object, name, type_, reflected, compare_to) -> bool:
+    """Фильтр autogenerate: не сравнивать объекты из DB_ONLY_OBJECTS."""
+    if reflected and compare_to is None:
+        table = getattr(getattr(object, "table", None), "name", None)
+        if (type_, table, name) in DB_ONLY_OBJECTS:
+            return False
+    return True
+
+
+def run_migrations_offline() -> None:
+    """Сгенерировать SQL миграций без подключения к БД (alembic upgrade --sql)."""
+    context.configure(
+        url=config.get_main_option("sqlalchemy.url"),
+        target_metadata=target_metadata,
+        include_object=include_object,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(connection=connection, target_metadata=target_metadata, include_object=include_object)
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+async def run_async_migrations() -> None:
+    connectable = async_engine_from_config(
+        config.get_section(config.config_ini_section, {}),
+        prefix="sqlalchemy.",
+        poolclass=pool.NullPool,
+    )
+
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    asyncio.run(run_async_migrations())
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,100 @@
+"""Запрет пересекающихся активных броней одного бариста
+
+Бронь получает колонку shift (tstzrange времени слота), которую заполняют триггеры:
+при вставке брони и смене slot_id, а также при изменении времени слота.
+Исключающее GiST-ограничение ex_booking_barista_shift не даёт одному бариста
+иметь две активные брони с пересекающимися сменами (в том числе в разных кофейнях);
+проверка идёт по индексу, а не перебором истории броней.
+
+Базовая схема создана до появления миграций, поэтому это первая ревизия.
+
+Revision ID: 0001
+Revises:
+Create Date: 2024-07-01 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Должно совпадать с ACTIVE_BOOKING_STATUSES в services/slot.py
+ACTIVE_STATUSES = "('booked', 'confirmed_work')"
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS btree_gist")
+
+    op.add_column("bookings", sa.Column("shift", postgresql.TSTZRANGE(), nullable=True))
+    op.execute("""
+        UPDATE bookings AS b
+        SET shift = tstzrange(s.start_time, s.end_time)
+        FROM slots AS s
+        WHERE s.id = b.slot_id
+    """)
+    op.alter_column("bookings", "shift", nullable=False)
+
+    op.execute("""
+        CREATE FUNCTION bookings_set_shift() RETURNS trigger AS $$
+        BEGIN
+            SELECT tstzrange(start_time, end_time) INTO NEW.shift FROM slots WHERE id = NEW.slot_id;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER bookings_set_shift
+        BEFORE INSERT OR UPDATE OF slot_id ON bookings
+        FOR EACH ROW EXECUTE FUNCTION bookings_set_shift()
+    """)
+    op.execute("""
+        CREATE FUNCTION slots_sync_booking_shift() RETURNS trigger AS $$
+        BEGIN
+            UPDATE bookings SET shift = tstzrange(NEW.start_time, NEW.end_time) WHERE slot_id = NEW.id;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("""
+        CREATE TRIGGER slots_sync_booking_shift
+        AFTER UPDATE OF start_time, end_time ON slots
+        FOR EACH ROW EXECUTE FUNCTION slots_sync_booking_shift()
+    """)
+
+    # Уже существующие пересечения не дадут создать ограничение - сообщаем, какие именно
+    if not context.is_offline_mode():
+        conflicts = op.get_bind().execute(sa.text(f"""
+            SELECT a.id, b.id
+            FROM bookings AS a
+            JOIN bookings AS b ON a.barista_id = b.barista_id AND a.id < b.id AND a.shift && b.shift
+            WHERE a.status IN {ACTIVE_STATUSES} AND b.status IN {ACTIVE_STATUSES}
+            LIMIT 20
+        """)).all()
+        if conflicts:
+            raise RuntimeError(
+                "Active bookings overlap, resolve them before upgrading: "
+                + ", ".join(f"{first}/{second}" for first, second in conflicts)
+            )
+
+    op.execute(f"""
+        ALTER TABLE bookings ADD CONSTRAINT ex_booking_barista_shift
+        EXCLUDE USING gist (barista_id WITH =, shift WITH &&)
+        WHERE (status IN {ACTIVE_STATUSES})
+    """)
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE bookings DROP CONSTRAINT ex_booking_barista_shift")
+    op.execute("DROP TRIGGER slots_sync_booking_shift ON slots")
+    op.execute("DROP FUNCTION slots_sync_booking_shift()")
+    op.execute("DROP TRIGGER bookings_set_shift ON bookings")
+    op.execute("DROP FUNCTION bookings_set_shift()")
+    op.drop_column("bookings", "shift")
@@ -0,0 +1,71 @@
+"""Индексы под реальные запросы сервисов
+
+Составные и частичные индексы для основных путей доступа:
+- брони бариста по статусу (/my_slots, предстоящие смены, список броней);
+- число активных броней слота (свободные места, занятость) - частичный индекс
+  только по активным броням, которых намного меньше, чем истории;
+- слоты кофейни по времени начала в порядке keyset-пагинации (cafe_id, start_time, id);
+- ожидающие подтверждения пользователи кофейни - частичный индекс по role = PENDING.
+Одиночные индексы ix_bookings_barista_id и ix_slots_cafe_id покрываются новыми
+составными (они их префиксы) и удаляются, чтобы не замедлять запись.
+
+Индексы строятся CREATE INDEX CONCURRENTLY, без блокировки записи в таблицы,
+поэтому каждая команда выполняется вне транзакции миграции (autocommit_block).
+Если построение прервалось, в БД остаётся невалидный индекс - его нужно удалить
+(DROP INDEX CONCURRENTLY) и повторить upgrade.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2024-07-15 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Должно совпадать с ACTIVE_BOOKING_STATUSES в services/slot.py
+ACTIVE_STATUSES = "('booked', 'confirmed_work')"
+# Тип user_role хранит имена членов UserRole
+PENDING_ROLE = "'PENDING'"
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_bookings_barista_id_status", "bookings", ["barista_id", "status"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_bookings_slot_id_active", "bookings", ["slot_id"],
+            postgresql_where=sa.text(f"status IN {ACTIVE_STATUSES}"),
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_slots_cafe_id_start_time", "slots", ["cafe_id", "start_time", "id"],
+            postgresql_concurrently=True,
+        )
+        op.create_index(
+            "ix_users_pending_cafe_id", "users", ["cafe_id", "id"],
+            postgresql_where=sa.text(f"role = {PENDING_ROLE}"),
+            postgresql_concurrently=True,
+        )
+        op.drop_index("ix_bookings_barista_id", table_name="bookings", postgresql_concurrently=True)
+        op.drop_index("ix_slots_cafe_id", table_name="slots", postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_slots_cafe_id", "slots", ["cafe_id"], postgresql_concurrently=True)
+        op.create_index("ix_bookings_barista_id", "bookings", ["barista_id"], postgresql_concurrently=True)
+        op.drop_index("ix_users_pending_cafe_id", table_name="users", postgresql_concurrently=True)
+        op.drop_index("ix_slots_cafe_id_start_time", table_name="slots", postgresql_concurrently=True)
+        op.drop_index("ix_bookings_slot_id_active", table_name="bookings", postgresql_concurrently=True)
+        op.drop_index("ix_bookings_barista_id_status", table_name="bookings", postgresql_concurrently=True)
@@ -1,7 +1,7 @@
 from enum import Enum
 from typing import Optional
 
-from sqlalchemy import ForeignKey, String, UniqueConstraint
+from sqlalchemy import ForeignKey, Index, String, UniqueConstraint, text
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.db.base import Base
@@ -20,7 +20,7 @@ class Booking(Base):
     """Модель бронирования слота бариста."""
     __tablename__ = "bookings"
 
-    barista_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True, nullable=False)
+    barista_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     barista: Mapped["User"] = relationship(back_populates="bookings")
 
     slot_id: Mapped[int] = mapped_column(ForeignKey("slots.id"), index=True, nullable=False)
@@ -28,8 +28,17 @@ class Booking(Base):
 
     status: Mapped[BookingStatus] = mapped_column(String(50), default=BookingStatus.BOOKED)
 
+    # Колонка shift (tstzrange времени слота) и ограничение ex_booking_barista_shift на пересечение
+    # активных броней бариста существуют только в БД: их создаёт и поддерживает миграция 0001.
+    # Индексы ниже строит миграция 0002 (CREATE INDEX CONCURRENTLY)
     __table_args__ = (
         UniqueConstraint("barista_id", "slot_id", name="uq_booking_barista_slot"),
+        Index("ix_bookings_barista_id_status", "barista_id", "status"),
+        # Подсчёт занятых мест слота: только активные брони, без истории
+        Index(
+            "ix_bookings_slot_id_active", "slot_id",
+            postgresql_where=text("status IN ('booked', 'confirmed_work')"),
+        ),
     )
 
     def __repr__(self):
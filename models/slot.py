@@ -1,7 +1,7 @@
 from datetime import datetime
 from typing import List, Optional
 
-from sqlalchemy import DateTime, ForeignKey, Integer
+from sqlalchemy import DateTime, ForeignKey, Index, Integer
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from src.db.base import Base
@@ -15,10 +15,15 @@ class Slot(Base):
     end_time: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
     required_baristas: Mapped[int] = mapped_column(Integer, default=1, nullable=False)
 
-    cafe_id: Mapped[int] = mapped_column(ForeignKey("cafes.id"), index=True, nullable=False)
+    cafe_id: Mapped[int] = mapped_column(ForeignKey("cafes.id"), nullable=False)
     cafe: Mapped["Cafe"] = relationship(back_populates="slots")
 
     bookings: Mapped[List["Booking"]] = relationship(back_populates="slot")
 
+    # Слоты кофейни в диапазоне дат в порядке keyset-пагинации (миграция 0002)
+    __table_args__ = (
+        Index("ix_slots_cafe_id_start_time", "cafe_id", "start_time", "id"),
+    )
+
     def __repr__(self):
         return f"<Slot(cafe_id={self.cafe_id}, start={self.start_time.strftime('%Y-%m-%d %H:%M')}, end={self.end_time.strftime('%H:%M')})>"
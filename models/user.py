@@ -7,7 +7,7 @@ from sqlalchemy import Column, BigInteger, String, ForeignKey, UniqueConstraint,
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.dialects.postgresql import ENUM as PG_ENUM
 from src.db.base import Base
-from sqlalchemy import DateTime, Boolean 
+from sqlalchemy import DateTime, Boolean, Index, text
 
 
 class UserRole(str, Enum):
@@ -57,5 +57,10 @@ class User(Base):
         foreign_keys="[Cafe.manager_id]"
     )
 
+    # Ожидающие подтверждения пользователи кофейни (миграция 0002)
+    __table_args__ = (
+        Index("ix_users_pending_cafe_id", "cafe_id", "id", postgresql_where=text("role = 'PENDING'")),
+    )
+
     def __repr__(self):
         return f"<User(username={self.username or 'N/A'}, email={self.email or 'N/A'})>"
\ No newline at end of file
@@ -0,0 +1,233 @@
+# src/redis_del/availability.py
+import logging
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.models import Slot
+
+logger = logging.getLogger(__name__)
+
+AVAILABILITY_KEY = "avail:{cafe_id}:{day}"              # ZSET: slot_id -> свободные места
+AVAILABILITY_WINDOWS_KEY = "avail:{cafe_id}:{day}:win"  # HASH: slot_id -> "start_ts,end_ts"
+AVAILABILITY_LOCATIONS_KEY = "avail:slots"              # HASH: slot_id -> "cafe_id:day"
+AVAILABILITY_READY_KEY = "avail:ready"                  # Индекс построен и поддерживается
+AVAILABILITY_PRUNED_KEY = "avail:pruned:{day}"          # Прошедшие дни из avail:slots сегодня уже убраны
+
+# Атомарно меняет число свободных мест слота, если он есть в индексе
+_ADJUST_SEATS_SCRIPT = """
+local location = redis.call('HGET', KEYS[1], ARGV[1])
+if not location then
+    return nil
+end
+local key = 'avail:' .. location
+if not redis.call('ZSCORE', key, ARGV[1]) then
+    return nil
+end
+return redis.call('ZINCRBY', key, ARGV[2], ARGV[1])
+"""
+
+
+class AvailableSlot(NamedTuple):
+    """Слот с временным окном и числом свободных мест."""
+    slot_id: int
+    start_time: datetime
+    end_time: datetime
+    remaining: int
+
+
+def _day_key(cafe_id: int, day: date) -> str:
+    return AVAILABILITY_KEY.format(cafe_id=cafe_id, day=day.isoformat())
+
+
+def _windows_key(cafe_id: int, day: date) -> str:
+    return AVAILABILITY_WINDOWS_KEY.format(cafe_id=cafe_id, day=day.isoformat())
+
+
+def _as_utc(value: datetime) -> datetime:
+    """
+    Время слота в UTC. Наивное время в проекте - это UTC (так его и сохраняет БД),
+    поэтому слот попадает в один и тот же день независимо от того, пришёл он из
+    хендлера, из генерации расписания или из БД при перестройке индекса.
+    """
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _expire_at(day: date) -> int:
+    """Ключи дня живут до конца следующего дня."""
+    return int(datetime.combine(day, time.max, tzinfo=timezone.utc).timestamp()) + 86400
+
+
+class AvailabilityIndex:
+    """
+    Индекс доступности слотов в Redis: по ZSET и HASH на кофейню и день.
+    ZSET хранит число свободных мест (score) по slot_id, поэтому выборка
+    слотов со свободными местами - это ZRANGEBYSCORE за O(log n).
+    Пока индекс не построен (флаг avail:ready), читающие методы возвращают None
+    и вызывающий код обращается к БД. Если изменение не удалось записать в индекс,
+    флаг снимается: чтения уходят в БД, а при следующем запуске индекс перестраивается.
+    """
+
+    def __init__(self):
+        self._redis: Optional[aioredis.Redis] = None
+        self._adjust_script = None
+
+    def setup(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+        self._adjust_script = redis.register_script(_ADJUST_SEATS_SCRIPT)
+
+    async def is_ready(self) -> bool:
+        if self._redis is None:
+            return False
+        try:
+            return bool(await self._redis.exists(AVAILABILITY_READY_KEY))
+        except RedisError as e:
+            logger.warning("Availability index check failed: %s", e)
+            return False
+
+    async def get_available(self, cafe_id: int, day: date) -> Optional[List[AvailableSlot]]:
+        """Слоты кофейни за день со свободными местами или None, если индекс недоступен."""
+        if self._redis is None:
+            return None
+        try:
+            async with self._redis.pipeline(transaction=False) as pipe:
+                pipe.exists(AVAILABILITY_READY_KEY)
+                pipe.zrangebyscore(_day_key(cafe_id, day), 1, "+inf", withscores=True)
+                pipe.hgetall(_windows_key(cafe_id, day))
+                ready, seats, windows = await pipe.execute()
+        except RedisError as e:
+            logger.warning("Availability index read failed for cafe %s on %s: %s", cafe_id, day, e)
+            return None
+        if not ready:
+            return None
+
+        slots = []
+        for member, remaining in seats:
+            window = windows.get(member)
+            if window is None:
+                continue
+            if isinstance(window, bytes):
+                window = window.decode()
+            start_ts, end_ts = (int(value) for value in window.split(","))
+            slots.append(AvailableSlot(
+                slot_id=int(member),
+                start_time=datetime.fromtimestamp(start_ts, tz=timezone.utc),
+                end_time=datetime.fromtimestamp(end_ts, tz=timezone.utc),
+                remaining=int(remaining),
+            ))
+        slots.sort(key=lambda slot: slot.start_time)
+        return slots
+
+    async def _invalidate(self) -> None:
+        """Снять флаг готовности: индекс разошёлся с БД."""
+        try:
+            await self._redis.delete(AVAILABILITY_READY_KEY)
+        except RedisError as e:
+            logger.error("Failed to invalidate the availability index, run /rebuild_availability: %s", e)
+            return
+        logger.warning("Availability index invalidated, reads fall back to the database until it is rebuilt")
+
+    async def _prune_locations(self) -> None:
+        """
+        Убрать из avail:slots слоты прошедших дней: их ключи дня уже истекли, а записи
+        хэша сами не истекают. Выполняется не чаще раза в сутки на весь кластер.
+        """
+        today = datetime.now(timezone.utc).date()
+        try:
+            if not await self._redis.set(AVAILABILITY_PRUNED_KEY.format(day=today.isoformat()), "1", nx=True, ex=2 * 86400):
+                return
+            # Ключи дня живут до конца следующего дня (_expire_at)
+            cutoff = (today - timedelta(days=1)).isoformat()
+            stale = []
+            async for slot_id, location in self._redis.hscan_iter(AVAILABILITY_LOCATIONS_KEY, count=1000):
+                if isinstance(location, bytes):
+                    location = location.decode()
+                if location.rpartition(":")[2] < cutoff:
+                    stale.append(slot_id)
+            for chunk_start in range(0, len(stale), 1000):
+                await self._redis.hdel(AVAILABILITY_LOCATIONS_KEY, *stale[chunk_start:chunk_start + 1000])
+        except RedisError as e:
+            logger.warning("Availability index pruning failed: %s", e)
+            return
+        if stale:
+            logger.info("Pruned %s past slots from the availability index", len(stale))
+
+    def _queue_slot(self, pipe, slot_id: int, cafe_id: int, start_time: datetime, end_time: datetime, remaining: int) -> None:
+        start_time, end_time = _as_utc(start_time), _as_utc(end_time)
+        day = start_time.date()
+        pipe.zadd(_day_key(cafe_id, day), {str(slot_id): remaining})
+        pipe.hset(_windows_key(cafe_id, day), str(slot_id), f"{int(start_time.timestamp())},{int(end_time.timestamp())}")
+        pipe.hset(AVAILABILITY_LOCATIONS_KEY, str(slot_id), f"{cafe_id}:{day.isoformat()}")
+        pipe.expireat(_day_key(cafe_id, day), _expire_at(day))
+        pipe.expireat(_windows_key(cafe_id, day), _expire_at(day))
+
+    async def add_slot(self, slot: Slot, remaining: int) -> None:
+        """Добавить (или перезаписать) слот в индексе."""
+        if self._redis is None:
+            return
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                self._queue_slot(pipe, slot.id, slot.cafe_id, slot.start_time, slot.end_time, remaining)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("Availability index update failed for slot %s: %s", slot.id, e)
+            await self._invalidate()
+            return
+        await self._prune_locations()
+
+    async def add_slots(self, slots: Iterable[Tuple[int, int, datetime, datetime, int]]) -> None:
+        """Добавить в индекс пачку слотов одним pipeline (кортежи как в rebuild)."""
+        if self._redis is None:
+            return
+        slots = list(slots)
+        if not slots:
+            return
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                for slot_id, cafe_id, start_time, end_time, remaining in slots:
+                    self._queue_slot(pipe, slot_id, cafe_id, start_time, end_time, remaining)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("Availability index update failed for %s slots: %s", len(slots), e)
+            await self._invalidate()
+            return
+        await self._prune_locations()
+
+    async def adjust_seats(self, slot_id: int, delta: int) -> None:
+        """Изменить число свободных мест слота (-1 при брони, +1 при отмене)."""
+        if self._redis is None:
+            return
+        try:
+            await self._adjust_script(keys=[AVAILABILITY_LOCATIONS_KEY], args=[str(slot_id), delta])
+        except RedisError as e:
+            logger.warning("Availability index update failed for slot %s: %s", slot_id, e)
+            await self._invalidate()
+
+    async def rebuild(self, slots: Iterable[Tuple[int, int, datetime, datetime, int]]) -> int:
+        """
+        Полностью заменить индекс.
+        slots - кортежи (slot_id, cafe_id, start_time, end_time, свободные места).
+        Возвращает количество проиндексированных слотов.
+        """
+        if self._redis is None:
+            raise RuntimeError("Availability index is not configured")
+
+        old_keys = [key async for key in self._redis.scan_iter(match="avail:*", count=1000)]
+        count = 0
+        async with self._redis.pipeline(transaction=True) as pipe:
+            if old_keys:
+                pipe.delete(*old_keys)
+            for slot_id, cafe_id, start_time, end_time, remaining in slots:
+                self._queue_slot(pipe, slot_id, cafe_id, start_time, end_time, remaining)
+                count += 1
+            pipe.set(AVAILABILITY_READY_KEY, datetime.now(timezone.utc).isoformat())
+            await pipe.execute()
+        logger.info("Availability index rebuilt: %s slots", count)
+        return count
+
+
+availability_index = AvailabilityIndex()
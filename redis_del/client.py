@@ -1,14 +1,144 @@
 # src/redis_del/client.py
+import logging
+import time
+from typing import Optional
+
 import redis.asyncio as aioredis # ИМЕННО ТАК!
 # Или from redis.asyncio import Redis as AsyncRedisClient
+from redis.asyncio.client import Pipeline
+from redis.asyncio.retry import Retry
+from redis.backoff import ExponentialBackoff
+from redis.exceptions import ConnectionError as RedisConnectionError
 
-from src.config import get_settings
+from src.config import Settings, get_settings
+from src.metrics import record_update_time, registry
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
-# async def get_redis_client() -> redis.Redis: # Эта аннотация типа может быть неточной
-async def get_redis_client() -> aioredis.Redis:  # Изменил аннотацию для ясности
+redis_command_time = registry.histogram("redis_command_seconds", "Время выполнения команды или пайплайна Redis")
+redis_pool_checkout_wait = registry.histogram(
+    "redis_pool_checkout_wait_seconds", "Ожидание соединения из пула Redis"
+)
+redis_pool_checkout_failures = registry.counter(
+    "redis_pool_checkout_failures", "Не получили соединение Redis: пул исчерпан дольше REDIS_POOL_TIMEOUT или Redis недоступен"
+)
+redis_pool_in_use = registry.gauge("redis_pool_connections_in_use", "Соединений Redis, выданных из пула")
+redis_pool_max = registry.gauge("redis_pool_max_connections", "Размер пула соединений Redis")
+
+
+class TimedConnectionPool(aioredis.BlockingConnectionPool):
+    """
+    Пул соединений Redis с ограничением размера: при исчерпании команда ждёт
+    освободившееся соединение (не дольше timeout), а не открывает новое.
+    Время ожидания и число выданных соединений попадают в метрики.
+    """
+
+    def reset(self) -> None:
+        # Вызывается из __init__ и после fork: выданные родителю соединения здесь не в счёт
+        self._checked_out: set = set()
+        super().reset()
+
+    async def get_connection(self, command_name, *keys, **options):
+        started = time.perf_counter()
+        try:
+            connection = await super().get_connection(command_name, *keys, **options)
+        except RedisConnectionError:
+            redis_pool_checkout_failures.inc()
+            raise
+        finally:
+            redis_pool_checkout_wait.observe(time.perf_counter() - started)
+        self._checked_out.add(connection)
+        redis_pool_in_use.set(len(self._checked_out))
+        return connection
+
+    async def release(self, connection) -> None:
+        self._checked_out.discard(connection)
+        redis_pool_in_use.set(len(self._checked_out))
+        await super().release(connection)
+
+
+class TimedPipeline(Pipeline):
+    """Пайплайн, время выполнения которого учитывается в метриках Redis."""
+
+    async def execute(self, raise_on_error: bool = True):
+        started = time.perf_counter()
+        try:
+            return await super().execute(raise_on_error)
+        finally:
+            elapsed = time.perf_counter() - started
+            redis_command_time.observe(elapsed)
+            record_update_time("redis", elapsed)
+
+
+class TimedRedis(aioredis.Redis):
+    """Клиент Redis, который замеряет время команд (для метрик на обновление)."""
+
+    async def execute_command(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            return await super().execute_command(*args, **options)
+        finally:
+            elapsed = time.perf_counter() - started
+            redis_command_time.observe(elapsed)
+            record_update_time("redis", elapsed)
+
+    def pipeline(self, transaction: bool = True, shard_hint=None) -> TimedPipeline:
+        return TimedPipeline(self.connection_pool, self.response_callbacks, transaction, shard_hint)
+
+
+class RedisClientManager:
+    """
+    Один пул соединений Redis на процесс. Хранилище FSM, кэш пользователей, индекс
+    доступности и состав персонала работают через общего клиента поверх этого пула,
+    поэтому число соединений процесса ограничено REDIS_MAX_CONNECTIONS.
+    Пул создаётся при первом обращении (уже в процессе воркера) и закрывается close().
+    """
+
+    def __init__(self, settings: Settings):
+        self._settings = settings
+        self._pool: Optional[TimedConnectionPool] = None
+        self._client: Optional[TimedRedis] = None
+
+    @property
+    def pool(self) -> TimedConnectionPool:
+        if self._pool is None:
+            s = self._settings
+            self._pool = TimedConnectionPool.from_url(
+                str(s.REDIS_URL),
+                max_connections=s.REDIS_MAX_CONNECTIONS,
+                timeout=s.REDIS_POOL_TIMEOUT,
+                socket_timeout=s.REDIS_SOCKET_TIMEOUT,
+                socket_connect_timeout=s.REDIS_SOCKET_CONNECT_TIMEOUT,
+                socket_keepalive=True,
+                health_check_interval=s.REDIS_HEALTH_CHECK_INTERVAL,
+                retry=Retry(ExponentialBackoff(), s.REDIS_RETRIES),
+                retry_on_timeout=True,
+            )
+            redis_pool_max.set(s.REDIS_MAX_CONNECTIONS)
+        return self._pool
+
+    def client(self) -> TimedRedis:
+        """Общий клиент процесса."""
+        if self._client is None:
+            self._client = TimedRedis(connection_pool=self.pool)
+        return self._client
+
+    async def close(self) -> None:
+        """Закрыть все соединения пула (при остановке, после фоновых задач, использующих Redis)."""
+        if self._pool is None:
+            return
+        pool, self._pool, self._client = self._pool, None, None
+        await pool.disconnect()
+        redis_pool_in_use.set(0)
+        logger.info("Redis connection pool closed")
+
+
+redis_manager = RedisClientManager(settings)
+
+
+async def get_redis_client() -> aioredis.Redis:
     """
-    Возвращает асинхронный клиент Redis.
+    Возвращает общий асинхронный клиент Redis процесса (см. RedisClientManager).
     """
-    return aioredis.from_url(str(settings.REDIS_URL))
+    return redis_manager.client()
@@ -0,0 +1,111 @@
+# src/redis_del/staff_roster.py
+import asyncio
+import logging
+from typing import Iterable, NamedTuple, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+
+from src.config import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+# HASH: admin_ids / manager_ids -> telegram_id через запятую. Пока ключа нет, действуют ADMIN_IDS/MANAGER_IDS из настроек
+STAFF_ROSTER_KEY = "staff_roster"
+
+
+class Roster(NamedTuple):
+    admin_ids: frozenset[int]
+    manager_ids: frozenset[int]
+
+
+def _parse_ids(raw) -> frozenset[int]:
+    if isinstance(raw, bytes):
+        raw = raw.decode()
+    return frozenset(int(uid) for uid in (raw or "").split(",") if uid.strip().lstrip("-").isdigit())
+
+
+class StaffRoster:
+    """
+    Текущий состав администраторов и управляющих (telegram_id), по которому
+    назначается начальная роль новым пользователям.
+    Оба множества хранятся одним кортежем и заменяются целиком, поэтому читатели
+    никогда не видят наполовину обновлённый состав, а проверка - это membership во frozenset.
+    Если подключён Redis, фоновая задача периодически перечитывает ключ staff_roster.
+    """
+
+    def __init__(self, admin_ids: Iterable[int], manager_ids: Iterable[int], refresh_interval: float):
+        self._default = Roster(frozenset(admin_ids), frozenset(manager_ids))
+        self._roster = self._default
+        self._redis: Optional[aioredis.Redis] = None
+        self._watcher: Optional[asyncio.Task] = None
+        self.refresh_interval = refresh_interval
+
+    @property
+    def admin_ids(self) -> frozenset[int]:
+        return self._roster.admin_ids
+
+    @property
+    def manager_ids(self) -> frozenset[int]:
+        return self._roster.manager_ids
+
+    def setup(self, redis: aioredis.Redis) -> None:
+        self._redis = redis
+
+    async def reload(self) -> bool:
+        """Перечитать состав из Redis. Возвращает True, если он изменился."""
+        if self._redis is None:
+            return False
+        try:
+            raw = await self._redis.hgetall(STAFF_ROSTER_KEY)
+        except RedisError as e:
+            logger.warning("Staff roster reload failed: %s", e)
+            return False
+        if raw:
+            raw = {(k.decode() if isinstance(k, bytes) else k): v for k, v in raw.items()}
+            roster = Roster(_parse_ids(raw.get("admin_ids")), _parse_ids(raw.get("manager_ids")))
+        else:
+            roster = self._default
+        if roster == self._roster:
+            return False
+        self._roster = roster
+        logger.info("Staff roster updated: %d admins, %d managers", len(roster.admin_ids), len(roster.manager_ids))
+        return True
+
+    async def publish(self, admin_ids: Iterable[int], manager_ids: Iterable[int]) -> None:
+        """Записать новый состав в Redis; остальные процессы подхватят его при следующей проверке."""
+        await self._redis.hset(STAFF_ROSTER_KEY, mapping={
+            "admin_ids": ",".join(str(uid) for uid in sorted(set(admin_ids))),
+            "manager_ids": ",".join(str(uid) for uid in sorted(set(manager_ids))),
+        })
+        await self.reload()
+
+    async def start(self) -> None:
+        """Загрузить состав и запустить периодическую проверку."""
+        await self.reload()
+        if self._redis is None or self.refresh_interval <= 0 or self._watcher is not None:
+            return
+        self._watcher = asyncio.create_task(self._watch())
+
+    async def stop(self) -> None:
+        if self._watcher is None:
+            return
+        self._watcher.cancel()
+        try:
+            await self._watcher
+        except asyncio.CancelledError:
+            pass
+        self._watcher = None
+
+    async def _watch(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            await self.reload()
+
+
+staff_roster = StaffRoster(
+    admin_ids=settings.admin_ids,
+    manager_ids=settings.manager_ids,
+    refresh_interval=settings.STAFF_ROSTER_REFRESH_INTERVAL,
+)
@@ -0,0 +1,218 @@
+# src/redis_del/user_cache.py
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import redis.asyncio as aioredis
+from redis.exceptions import RedisError
+from sqlalchemy import inspect
+
+from src.config import get_settings
+from src.models import User
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+USER_CACHE_KEY = "user_cache:{telegram_id}"
+# Канал, по которому процессы бота сообщают друг другу об изменении пользователя (роль и т.п.)
+USER_CACHE_INVALIDATION_CHANNEL = "user_cache:invalidate"
+# Пауза перед переподпиской после ошибки Redis
+INVALIDATION_RECONNECT_DELAY = 1.0
+# Сколько ждать сообщение за один вызов: ожидание без таймаута упёрлось бы в socket_timeout пула,
+# а между вызовами соединение подписки проверяется PING (health_check_interval)
+INVALIDATION_POLL_TIMEOUT = 5.0
+
+
+class LocalTTLCache:
+    """
+    Простой LRU-кэш внутри процесса с ограничением времени жизни записей.
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Any) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        """Положить значение; ttl - собственный срок записи вместо общего."""
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Any) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def dump_user(user: User) -> Dict[str, str]:
+    """Сериализует колонки пользователя в плоский словарь строк (для Redis hash)."""
+    mapping: Dict[str, str] = {}
+    for attr in inspect(User).column_attrs:
+        value = getattr(user, attr.key)
+        if value is None:
+            continue  # Отсутствующее поле в hash означает None
+        if isinstance(value, bool):
+            mapping[attr.key] = "1" if value else "0"
+        elif isinstance(value, datetime):
+            mapping[attr.key] = value.isoformat()
+        elif hasattr(value, "value"):  # Enum (UserRole)
+            mapping[attr.key] = value.value
+        else:
+            mapping[attr.key] = str(value)
+    return mapping
+
+
+def load_user(mapping: Dict[str, str]) -> User:
+    """Восстанавливает объект User (transient) из словаря, созданного dump_user."""
+    fields: Dict[str, Any] = {}
+    for attr in inspect(User).column_attrs:
+        raw = mapping.get(attr.key)
+        if raw is None:
+            fields[attr.key] = None
+            continue
+        python_type = attr.columns[0].type.python_type
+        if python_type is bool:
+            fields[attr.key] = raw == "1"
+        elif python_type is datetime:
+            fields[attr.key] = datetime.fromisoformat(raw)
+        else:
+            fields[attr.key] = python_type(raw)
+    return User(**fields)
+
+
+class UserCache:
+    """
+    Двухуровневый кэш пользователей по telegram_id:
+    локальный LRU/TTL в процессе и общий Redis hash на пользователя.
+    Хранит только значения колонок, а не ORM-объекты, привязанные к сессии.
+    """
+
+    def __init__(self, maxsize: int, local_ttl: float, redis_ttl: int):
+        self._local = LocalTTLCache(maxsize=maxsize, ttl=local_ttl)
+        self._redis: Optional[aioredis.Redis] = None
+        self._listener: Optional[asyncio.Task] = None
+        self.redis_ttl = redis_ttl
+
+    def setup(self, redis: aioredis.Redis) -> None:
+        """Подключает общий уровень кэша. Без него работает только локальный уровень."""
+        self._redis = redis
+
+    async def get(self, telegram_id: int) -> Optional[Dict[str, str]]:
+        """Вернуть снимок пользователя или None, если его нет ни в одном из уровней."""
+        snapshot = self._local.get(telegram_id)
+        if snapshot is not None:
+            return snapshot
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.hgetall(USER_CACHE_KEY.format(telegram_id=telegram_id))
+        except RedisError as e:
+            logger.warning("User cache read failed for %s: %s", telegram_id, e)
+            return None
+        if not raw:
+            return None
+        snapshot = {
+            (k.decode() if isinstance(k, bytes) else k): (v.decode() if isinstance(v, bytes) else v)
+            for k, v in raw.items()
+        }
+        self._local.set(telegram_id, snapshot)
+        return snapshot
+
+    async def set(self, user: User) -> None:
+        """Положить пользователя в оба уровня кэша."""
+        if user.telegram_id is None:
+            return
+        snapshot = dump_user(user)
+        self._local.set(user.telegram_id, snapshot)
+        if self._redis is None:
+            return
+        key = USER_CACHE_KEY.format(telegram_id=user.telegram_id)
+        try:
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.delete(key)
+                pipe.hset(key, mapping=snapshot)
+                pipe.expire(key, self.redis_ttl)
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("User cache write failed for %s: %s", user.telegram_id, e)
+
+    async def invalidate(self, telegram_id: Optional[int]) -> None:
+        """Удалить пользователя из обоих уровней кэша."""
+        if telegram_id is None:
+            return
+        self._local.pop(telegram_id)
+        if self._redis is None:
+            return
+        try:
+            # Удаление и оповещение остальных процессов одной транзакцией
+            async with self._redis.pipeline(transaction=True) as pipe:
+                pipe.delete(USER_CACHE_KEY.format(telegram_id=telegram_id))
+                pipe.publish(USER_CACHE_INVALIDATION_CHANNEL, str(telegram_id))
+                await pipe.execute()
+        except RedisError as e:
+            logger.warning("User cache invalidation failed for %s: %s", telegram_id, e)
+
+    def start_invalidation_listener(self) -> None:
+        """Запустить фоновую подписку на инвалидации из других процессов."""
+        if self._redis is None or self._listener is not None:
+            return
+        self._listener = asyncio.create_task(self._listen_invalidations())
+
+    async def stop_invalidation_listener(self) -> None:
+        """Остановить подписку на инвалидации."""
+        if self._listener is None:
+            return
+        self._listener.cancel()
+        try:
+            await self._listener
+        except asyncio.CancelledError:
+            pass
+        self._listener = None
+
+    async def _listen_invalidations(self) -> None:
+        while True:
+            try:
+                async with self._redis.pubsub(ignore_subscribe_messages=True) as pubsub:
+                    await pubsub.subscribe(USER_CACHE_INVALIDATION_CHANNEL)
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=INVALIDATION_POLL_TIMEOUT
+                        )
+                        if message is None or message["type"] != "message":
+                            continue
+                        try:
+                            self._local.pop(int(message["data"]))
+                        except (TypeError, ValueError):
+                            logger.warning("Bad user cache invalidation message: %r", message["data"])
+            except RedisError as e:
+                # Пока подписки нет, инвалидации могли быть пропущены - локальному уровню верить нельзя
+                logger.warning("User cache invalidation listener failed: %s", e)
+                self._local.clear()
+                await asyncio.sleep(INVALIDATION_RECONNECT_DELAY)
+
+
+user_cache = UserCache(
+    maxsize=settings.USER_CACHE_MAXSIZE,
+    local_ttl=settings.USER_CACHE_LOCAL_TTL,
+    redis_ttl=settings.USER_CACHE_REDIS_TTL,
+)
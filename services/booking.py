@@ -1,8 +1,42 @@
 from datetime import datetime
-from typing import List, Optional
-from sqlalchemy import select, and_
+from functools import partial
+from enum import Enum
+from typing import List, Optional, Tuple
+from sqlalchemy import select, and_, func
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+from src.db.session import commit, on_commit
 from src.models import Booking, Slot, User, BookingStatus
+from src.redis_del.availability import availability_index
+from src.services.slot import ACTIVE_BOOKING_STATUSES
+
+# Профили загрузки связей. "listing" - бронь вместе со слотом и его кофейней одним запросом.
+BOOKING_LOADER_PROFILES = {
+    "default": (),
+    "listing": (joinedload(Booking.slot).joinedload(Slot.cafe),),
+}
+
+
+class BookingResult(str, Enum):
+    """Результат попытки забронировать слот."""
+    CREATED = "created"               # Бронь создана
+    ALREADY_BOOKED = "already_booked" # У бариста уже есть активная бронь на этот слот
+    FULL = "full"                     # Свободных мест в слоте нет
+    SLOT_NOT_FOUND = "slot_not_found" # Слот не существует
+    OVERLAP = "overlap"               # У бариста есть активная бронь, пересекающаяся по времени
+
+
+# Исключающее GiST-ограничение на (barista_id, shift) для активных броней (миграция 0001)
+BOOKING_OVERLAP_CONSTRAINT = "ex_booking_barista_shift"
+EXCLUSION_VIOLATION_SQLSTATE = "23P01"
+
+
+def _is_overlap_violation(error: IntegrityError) -> bool:
+    """Нарушено ли ограничение на пересечение смен бариста."""
+    orig = error.orig
+    sqlstate = getattr(orig, "sqlstate", None) or getattr(orig, "pgcode", None)
+    return sqlstate == EXCLUSION_VIOLATION_SQLSTATE and BOOKING_OVERLAP_CONSTRAINT in str(orig)
 
 
 class BookingService:
@@ -16,21 +50,62 @@ class BookingService:
         return result.scalar_one_or_none()
 
     async def create_booking(self, barista_id: int, slot_id: int) -> Optional[Booking]:
-        """Создать бронирование слота для бариста."""
-        # Проверим, не забронировал ли уже этот бариста этот слот
+        """Создать бронирование слота для бариста (None, если бронь невозможна)."""
+        _, booking = await self.book_slot(barista_id, slot_id)
+        return booking
+
+    async def book_slot(self, barista_id: int, slot_id: int) -> Tuple[BookingResult, Optional[Booking]]:
+        """
+        Атомарно забронировать место в слоте с учётом Slot.required_baristas.
+        Строка слота блокируется (SELECT ... FOR UPDATE) до конца транзакции,
+        поэтому параллельные брони одного слота выполняются по очереди,
+        а брони разных слотов друг другу не мешают.
+        Пересечение с другими активными бронями бариста проверяет ограничение
+        ex_booking_barista_shift в БД; запись выполняется в SAVEPOINT, чтобы
+        его нарушение не обрывало транзакцию.
+        В отличие от остальных методов сервисов, транзакция фиксируется здесь же:
+        блокировка слота не должна держаться, пока хендлер отвечает в Telegram.
+        """
+        stmt = select(Slot.required_baristas).where(Slot.id == slot_id).with_for_update()
+        required_baristas = (await self.session.execute(stmt)).scalar_one_or_none()
+        if required_baristas is None:
+            await commit(self.session) # Завершаем транзакцию и снимаем блокировку
+            return BookingResult.SLOT_NOT_FOUND, None
+
         existing_booking = await self.get_booking_by_barista_and_slot(barista_id, slot_id)
-        if existing_booking:
-            return None # Уже существует
+        if existing_booking and existing_booking.status in ACTIVE_BOOKING_STATUSES:
+            await commit(self.session)
+            return BookingResult.ALREADY_BOOKED, existing_booking
 
-        booking = Booking(
-            barista_id=barista_id,
-            slot_id=slot_id,
-            status=BookingStatus.BOOKED
+        booked_stmt = select(func.count(Booking.id)).where(
+            and_(Booking.slot_id == slot_id, Booking.status.in_(ACTIVE_BOOKING_STATUSES))
         )
-        self.session.add(booking)
-        await self.session.commit()
-        await self.session.refresh(booking)
-        return booking
+        booked_count = (await self.session.execute(booked_stmt)).scalar_one()
+        if booked_count >= required_baristas:
+            await commit(self.session)
+            return BookingResult.FULL, None
+
+        try:
+            async with self.session.begin_nested():
+                if existing_booking:
+                    # Ранее отменённая бронь: уникальный индекс (barista_id, slot_id) не даёт создать новую
+                    booking = existing_booking
+                    booking.status = BookingStatus.BOOKED
+                else:
+                    booking = Booking(
+                        barista_id=barista_id,
+                        slot_id=slot_id,
+                        status=BookingStatus.BOOKED
+                    )
+                    self.session.add(booking)
+        except IntegrityError as e:
+            if not _is_overlap_violation(e):
+                raise
+            await commit(self.session)
+            return BookingResult.OVERLAP, None
+        on_commit(self.session, partial(availability_index.adjust_seats, slot_id, -1))
+        await commit(self.session)
+        return BookingResult.CREATED, booking
 
     async def get_booking_by_barista_and_slot(self, barista_id: int, slot_id: int) -> Optional[Booking]:
         """Получить бронирование по бариста и слоту."""
@@ -40,24 +115,33 @@ class BookingService:
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
-    async def get_barista_bookings(self, barista_id: int) -> List[Booking]:
+    async def get_barista_bookings(self, barista_id: int, profile: str = "default") -> List[Booking]:
         """Получить все бронирования конкретного бариста."""
-        stmt = select(Booking).where(Booking.barista_id == barista_id).order_by(Booking.slot_id) # Order for consistency
+        stmt = (
+            select(Booking)
+            .where(Booking.barista_id == barista_id)
+            .options(*BOOKING_LOADER_PROFILES[profile])
+            .order_by(Booking.slot_id) # Order for consistency
+        )
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
     async def update_booking_status(self, booking: Booking, new_status: BookingStatus) -> Booking:
         """Обновить статус бронирования."""
+        was_active = booking.status in ACTIVE_BOOKING_STATUSES
         booking.status = new_status
-        await self.session.commit()
-        await self.session.refresh(booking)
+        await self.session.flush()
+        is_active = booking.status in ACTIVE_BOOKING_STATUSES
+        if was_active != is_active:
+            # Место в слоте освободилось или снова занято
+            on_commit(self.session, partial(availability_index.adjust_seats, booking.slot_id, 1 if was_active else -1))
         return booking
 
     async def cancel_booking(self, booking: Booking) -> Booking:
         """Отменить бронирование."""
         return await self.update_booking_status(booking, BookingStatus.CANCELED)
 
-    async def get_upcoming_bookings_for_user(self, user_id: int) -> List[Booking]:
+    async def get_upcoming_bookings_for_user(self, user_id: int, profile: str = "default") -> List[Booking]:
         """Получить предстоящие (в будущем) бронирования для пользователя."""
         stmt = select(Booking).join(Slot).where(
             and_(
@@ -65,6 +149,6 @@ class BookingService:
                 Slot.start_time >= datetime.utcnow(),
                 Booking.status.in_([BookingStatus.BOOKED, BookingStatus.CONFIRMED_WORK]) # Активные бронирования
             )
-        ).order_by(Slot.start_time)
+        ).options(*BOOKING_LOADER_PROFILES[profile]).order_by(Slot.start_time)
         result = await self.session.execute(stmt)
         return result.scalars().all()
@@ -2,6 +2,7 @@ from typing import Optional, List
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from src.models import Cafe
+from src.services.pagination import PAGE_SIZE, Page, keyset_page
 
 
 class CafeService:
@@ -20,6 +21,18 @@ class CafeService:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def get_cafes_page(
+        self, after_id: Optional[int] = None, before_id: Optional[int] = None, limit: int = PAGE_SIZE
+    ) -> Page:
+        """Получить страницу кофеен по названию (keyset-пагинация, см. keyset_page)."""
+        return await keyset_page(self.session, select(Cafe), Cafe, (Cafe.name,), after_id, before_id, limit)
+
+    async def get_managed_cafes(self, manager_id: int) -> List[Cafe]:
+        """Получить кофейни, которыми управляет пользователь."""
+        stmt = select(Cafe).where(Cafe.manager_id == manager_id).order_by(Cafe.name)
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
     async def create_cafe(
         self,
         name: str,
@@ -41,8 +54,7 @@ class CafeService:
             manager_id=manager_id,
         )
         self.session.add(cafe)
-        await self.session.commit()
-        await self.session.refresh(cafe)
+        await self.session.flush()  # INSERT ... RETURNING id; COMMIT - в конце обновления
         return cafe
 
     async def update_cafe(
@@ -71,6 +83,5 @@ class CafeService:
             cafe.closing_time = closing_time
         if manager_id:
             cafe.manager_id = manager_id # Привязка к пользователю по ID
-        await self.session.commit()
-        await self.session.refresh(cafe)
+        await self.session.flush()
         return cafe
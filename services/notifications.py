@@ -0,0 +1,220 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+
+from src.config import get_settings
+from src.metrics import registry
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+notifications_queued = registry.counter("notifications_queued", "Уведомления, поставленные в очередь")
+notifications_sent = registry.counter("notifications_sent", "Доставленные уведомления")
+notifications_retried = registry.counter("notifications_retried", "Повторные попытки отправки")
+notifications_failed = registry.counter("notifications_failed", "Уведомления, которые не удалось доставить")
+notifications_dropped = registry.counter("notifications_dropped", "Уведомления, отброшенные из-за переполнения очереди")
+
+
+class Notification(NamedTuple):
+    chat_id: int
+    text: str
+    attempt: int = 0
+
+
+class TokenBucket:
+    """Ограничение частоты: не более rate операций в секунду с запасом capacity."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else rate
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class ChatRateLimiter:
+    """Не чаще одного сообщения в interval секунд в один чат (ограничение Telegram на чат)."""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._next_at: Dict[int, float] = {}
+
+    async def acquire(self, chat_id: int) -> None:
+        now = time.monotonic()
+        # Резервируем время отправки сразу, чтобы параллельные воркеры не отправили в один чат одновременно
+        send_at = max(now, self._next_at.get(chat_id, 0.0))
+        self._next_at[chat_id] = send_at + self.interval
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+        self._forget_idle(now)
+
+    def _forget_idle(self, now: float) -> None:
+        if len(self._next_at) > 10000:
+            self._next_at = {chat_id: at for chat_id, at in self._next_at.items() if at > now}
+
+
+class NotificationService:
+    """
+    Фоновая отправка уведомлений: обработчики ставят сообщения в очередь и сразу
+    возвращают управление, воркеры отправляют их с учётом лимитов Telegram
+    (глобального и на чат) и повторяют при RetryAfter и сетевых ошибках.
+    """
+
+    def __init__(
+        self,
+        workers: int,
+        global_rate: float,
+        chat_interval: float,
+        max_retries: int,
+        retry_base_delay: float,
+        queue_size: int,
+    ):
+        self.workers = workers
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.queue_size = queue_size
+        self._global_limiter = TokenBucket(global_rate)
+        self._chat_limiter = ChatRateLimiter(chat_interval)
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._retries: Set[asyncio.Task] = set()
+        self._bot: Optional[Bot] = None
+        self._paused_until = 0.0  # Общая пауза после RetryAfter от Telegram
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    def start(self, bot: Bot) -> None:
+        """Запустить воркеры (вызывается на старте диспетчера)."""
+        if self.running:
+            return
+        self._bot = bot
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._tasks = [asyncio.create_task(self._worker(), name=f"notifier-{i}") for i in range(self.workers)]
+
+    async def stop(self, timeout: float = 10.0) -> None:
+        """Дождаться отправки очереди (не дольше timeout) и остановить воркеры."""
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("%s notifications were not sent before shutdown", self._queue.qsize())
+        for task in self._tasks + list(self._retries):
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._retries, return_exceptions=True)
+        self._tasks = []
+        self._retries.clear()
+
+    def notify(self, chat_id: Optional[int], text: str) -> None:
+        """Поставить уведомление в очередь. Не блокирует обработчик."""
+        if chat_id is None:
+            return
+        if not self.running:
+            logger.warning("Notification service is not running, message to %s dropped", chat_id)
+            notifications_dropped.inc()
+            return
+        self._enqueue(Notification(chat_id, text))
+
+    def notify_many(self, chat_ids: Iterable[Optional[int]], text: str) -> None:
+        """Разослать одно уведомление нескольким получателям (повторы отбрасываются)."""
+        for chat_id in dict.fromkeys(chat_ids):
+            self.notify(chat_id, text)
+
+    async def join(self) -> None:
+        """Дождаться, пока очередь и отложенные повторы будут полностью обработаны."""
+        if self._queue is None:
+            return
+        while True:
+            await self._queue.join()
+            if not self._retries:
+                return
+            await asyncio.wait(set(self._retries))
+
+    def _enqueue(self, notification: Notification) -> None:
+        try:
+            self._queue.put_nowait(notification)
+            notifications_queued.inc()
+        except asyncio.QueueFull:
+            logger.error("Notification queue is full, message to %s dropped", notification.chat_id)
+            notifications_dropped.inc()
+
+    async def _worker(self) -> None:
+        while True:
+            notification = await self._queue.get()
+            try:
+                await self._deliver(notification)
+            except Exception as e:
+                logger.exception("Unexpected error sending notification to %s: %s", notification.chat_id, e)
+                notifications_failed.inc()
+            finally:
+                self._queue.task_done()
+
+    async def _deliver(self, notification: Notification) -> None:
+        pause = self._paused_until - time.monotonic()
+        if pause > 0:
+            await asyncio.sleep(pause)
+        await self._chat_limiter.acquire(notification.chat_id)
+        await self._global_limiter.acquire()
+        try:
+            await self._bot.send_message(chat_id=notification.chat_id, text=notification.text)
+        except TelegramRetryAfter as e:
+            # Флуд-контроль действует на весь бот: приостанавливаем все воркеры
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            self._retry(notification, delay=0.0, reason=e)
+        except (TelegramNetworkError, TelegramServerError) as e:
+            self._retry(notification, delay=self.retry_base_delay * 2 ** notification.attempt, reason=e)
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Пользователь заблокировал бота или чат не существует: повтор не поможет
+            logger.warning("Notification to %s rejected: %s", notification.chat_id, e)
+            notifications_failed.inc()
+        else:
+            notifications_sent.inc()
+
+    def _retry(self, notification: Notification, delay: float, reason: Exception) -> None:
+        if notification.attempt >= self.max_retries:
+            logger.error("Giving up on notification to %s after %s attempts: %s", notification.chat_id, notification.attempt + 1, reason)
+            notifications_failed.inc()
+            return
+        notifications_retried.inc()
+        retry = notification._replace(attempt=notification.attempt + 1)
+        # Повтор ставится в очередь позже, чтобы не занимать воркер на время ожидания
+        task = asyncio.create_task(self._enqueue_later(retry, delay))
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+    async def _enqueue_later(self, notification: Notification, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self._enqueue(notification)
+
+
+notification_service = NotificationService(
+    workers=settings.NOTIFY_WORKERS,
+    global_rate=settings.NOTIFY_GLOBAL_RATE,
+    chat_interval=settings.NOTIFY_CHAT_INTERVAL,
+    max_retries=settings.NOTIFY_MAX_RETRIES,
+    retry_base_delay=settings.NOTIFY_RETRY_BASE_DELAY,
+    queue_size=settings.NOTIFY_QUEUE_SIZE,
+)
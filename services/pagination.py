@@ -0,0 +1,59 @@
+from typing import Any, List, NamedTuple, Optional, Sequence
+
+from sqlalchemy import Select, select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+# Кнопок с элементами на одной странице клавиатуры
+PAGE_SIZE = 8
+
+
+class Page(NamedTuple):
+    """Страница списка и признаки наличия соседних страниц."""
+    items: List[Any]
+    has_prev: bool = False
+    has_next: bool = False
+
+
+async def keyset_page(
+    session: AsyncSession,
+    stmt: Select,
+    model: Any,
+    order_by: Sequence[Any],
+    after_id: Optional[int] = None,
+    before_id: Optional[int] = None,
+    limit: int = PAGE_SIZE,
+) -> Page:
+    """
+    Keyset-пагинация: страница строк stmt в порядке (*order_by, id) после строки after_id
+    или перед строкой before_id. Курсор - только id строки: значения ключа сортировки
+    берутся подзапросом, поэтому токен страницы в callback_data остаётся коротким,
+    а запрос читает не больше limit + 1 строк без OFFSET.
+    Если строка-курсор исчезла, возвращается первая страница.
+    """
+    key_columns = (*order_by, model.id)
+    key = tuple_(*key_columns)
+    backward = after_id is None and before_id is not None
+    cursor_id = before_id if backward else after_id
+
+    page_stmt = stmt
+    if cursor_id is not None:
+        cursor_row = aliased(model)
+        cursor_key = (
+            select(*(getattr(cursor_row, column.key) for column in key_columns))
+            .where(cursor_row.id == cursor_id)
+            .scalar_subquery()
+        )
+        page_stmt = page_stmt.where(key < cursor_key if backward else key > cursor_key)
+    ordering = [column.desc() for column in key_columns] if backward else list(key_columns)
+    rows = list((await session.execute(page_stmt.order_by(*ordering).limit(limit + 1))).scalars().all())
+
+    if not rows and cursor_id is not None:
+        return await keyset_page(session, stmt, model, order_by, limit=limit)
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if backward:
+        rows.reverse()
+        return Page(rows, has_prev=has_more, has_next=True)
+    return Page(rows, has_prev=cursor_id is not None, has_next=has_more)
@@ -1,31 +1,133 @@
-from datetime import datetime, date
-from typing import List, Optional
-from sqlalchemy import select, and_
+from datetime import datetime, date, time, timedelta
+from functools import partial
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy import select, and_, func, insert, values, column, literal, exists, DateTime, Integer
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload, aliased
+from src.db.session import on_commit
 from src.models import Slot, Cafe, Booking, BookingStatus
+from src.redis_del.availability import availability_index, AvailableSlot
+from src.services.pagination import PAGE_SIZE, Page, keyset_page
+
+# Статусы броней, которые занимают место в слоте
+ACTIVE_BOOKING_STATUSES = (BookingStatus.BOOKED, BookingStatus.CONFIRMED_WORK)
+
+# Профили загрузки связей. "listing" - для списков, где выводится slot.cafe.name:
+# кофейня подгружается тем же запросом, без ленивой загрузки на каждую строку.
+SLOT_LOADER_PROFILES = {
+    "default": (),
+    "listing": (joinedload(Slot.cafe),),
+}
+
+
+# Строк в одном INSERT расписания: 4 параметра на строку, лимит PostgreSQL - 32767 параметров
+SCHEDULE_INSERT_CHUNK = 5000
+
+
+class ShiftTemplate(NamedTuple):
+    """Смена недельного шаблона: день недели (0 - понедельник), время начала и окончания, число бариста."""
+    weekday: int
+    start: time
+    end: time
+    required_baristas: int = 1
+
+
+class ScheduleResult(NamedTuple):
+    """Итог генерации расписания: созданные слоты и число пропущенных из-за пересечений."""
+    created: List[AvailableSlot]
+    skipped: int
+
+
+def expand_schedule(
+    templates: Sequence[ShiftTemplate], start_date: date, weeks: int
+) -> List[Tuple[datetime, datetime, int]]:
+    """
+    Развернуть недельный шаблон в конкретные смены на weeks недель, начиная с start_date.
+    Смена, у которой end <= start, заканчивается на следующий день (ночная).
+    """
+    shifts = []
+    for offset in range(weeks * 7):
+        day = start_date + timedelta(days=offset)
+        for template in templates:
+            if template.weekday != day.weekday():
+                continue
+            start = datetime.combine(day, template.start)
+            end = datetime.combine(day, template.end)
+            if end <= start:
+                end += timedelta(days=1)
+            shifts.append((start, end, template.required_baristas))
+    shifts.sort()
+    for (_, prev_end, _), (next_start, _, _) in zip(shifts, shifts[1:]):
+        if next_start < prev_end:
+            raise ValueError(f"Смены шаблона пересекаются: {next_start:%a %H:%M}")
+    return shifts
+
+
+def _date_range_bounds(start_date: date, end_date: date) -> Tuple[datetime, datetime]:
+    """Полуинтервал [начало start_date, начало дня после end_date)."""
+    return datetime.combine(start_date, time.min), datetime.combine(end_date + timedelta(days=1), time.min)
 
 
 class SlotService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def get_slot_by_id(self, slot_id: int) -> Optional[Slot]:
+    async def get_slot_by_id(self, slot_id: int, profile: str = "default") -> Optional[Slot]:
         """Получить слот по ID."""
-        stmt = select(Slot).where(Slot.id == slot_id)
+        stmt = select(Slot).where(Slot.id == slot_id).options(*SLOT_LOADER_PROFILES[profile])
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
     async def get_available_slots_for_cafe(
-        self, cafe_id: int, start_date: date, end_date: date
+        self, cafe_id: int, start_date: date, end_date: date, profile: str = "default"
     ) -> List[Slot]:
         """Получить доступные слоты для кофейни в заданном диапазоне дат."""
+        range_start, range_end = _date_range_bounds(start_date, end_date)
         stmt = select(Slot).where(
             and_(
                 Slot.cafe_id == cafe_id,
-                Slot.start_time >= start_date,
-                Slot.start_time < end_date.replace(hour=23, minute=59, second=59, microsecond=999999) # До конца дня
+                Slot.start_time >= range_start,
+                Slot.start_time < range_end # До конца end_date включительно
             )
-        ).order_by(Slot.start_time)
+        ).options(*SLOT_LOADER_PROFILES[profile]).order_by(Slot.start_time)
+        result = await self.session.execute(stmt)
+        return result.scalars().all()
+
+    async def get_available_slots_page(
+        self,
+        cafe_id: int,
+        start_date: date,
+        end_date: date,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        limit: int = PAGE_SIZE,
+        profile: str = "listing",
+    ) -> Page:
+        """Страница слотов кофейни в диапазоне дат по времени начала (keyset-пагинация)."""
+        range_start, range_end = _date_range_bounds(start_date, end_date)
+        stmt = select(Slot).where(
+            and_(
+                Slot.cafe_id == cafe_id,
+                Slot.start_time >= range_start,
+                Slot.start_time < range_end,
+            )
+        ).options(*SLOT_LOADER_PROFILES[profile])
+        return await keyset_page(self.session, stmt, Slot, (Slot.start_time,), after_id, before_id, limit)
+
+    async def get_user_slots(self, barista_id: int, profile: str = "listing") -> List[Slot]:
+        """Получить слоты, на которые у бариста есть активные брони."""
+        stmt = (
+            select(Slot)
+            .join(Booking, Booking.slot_id == Slot.id)
+            .where(
+                and_(
+                    Booking.barista_id == barista_id,
+                    Booking.status.in_(ACTIVE_BOOKING_STATUSES)
+                )
+            )
+            .options(*SLOT_LOADER_PROFILES[profile])
+            .order_by(Slot.start_time)
+        )
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
@@ -44,25 +146,180 @@ class SlotService:
             required_baristas=required_baristas,
         )
         self.session.add(slot)
-        await self.session.commit()
-        await self.session.refresh(slot)
+        await self.session.flush()  # INSERT ... RETURNING id; COMMIT - в конце обновления
+        on_commit(self.session, partial(availability_index.add_slot, slot, remaining=slot.required_baristas))
         return slot
 
+    async def create_schedule(
+        self,
+        cafe_ids: Sequence[int],
+        templates: Sequence[ShiftTemplate],
+        start_date: date,
+        weeks: int,
+    ) -> ScheduleResult:
+        """
+        Создать слоты по недельному шаблону для нескольких кофеен в одной транзакции.
+        Смены, пересекающиеся с уже существующими слотами кофейни, пропускаются.
+        Вставка выполняется одним INSERT ... SELECT ... WHERE NOT EXISTS ... RETURNING
+        (на каждые SCHEDULE_INSERT_CHUNK строк). Индекс доступности обновляется после COMMIT.
+        """
+        shifts = expand_schedule(templates, start_date, weeks)
+        rows = [(cafe_id, start, end, required) for cafe_id in dict.fromkeys(cafe_ids) for start, end, required in shifts]
+        if not rows:
+            return ScheduleResult(created=[], skipped=0)
+
+        # Блокируем кофейни, чтобы параллельная генерация не создала пересекающиеся слоты
+        await self.session.execute(
+            select(Cafe.id).where(Cafe.id.in_(list(dict.fromkeys(cafe_ids)))).order_by(Cafe.id).with_for_update()
+        )
+
+        created = []
+        for chunk_start in range(0, len(rows), SCHEDULE_INSERT_CHUNK):
+            result = await self.session.execute(
+                self._schedule_insert_stmt(rows[chunk_start:chunk_start + SCHEDULE_INSERT_CHUNK])
+            )
+            created.extend(result.all())
+
+        on_commit(self.session, partial(
+            availability_index.add_slots,
+            [(row.id, row.cafe_id, row.start_time, row.end_time, row.required_baristas) for row in created],
+        ))
+        return ScheduleResult(
+            created=[AvailableSlot(row.id, row.start_time, row.end_time, row.required_baristas) for row in created],
+            skipped=len(rows) - len(created),
+        )
+
+    @staticmethod
+    def _schedule_insert_stmt(rows: List[Tuple[int, datetime, datetime, int]]):
+        """INSERT новых слотов из VALUES, кроме пересекающихся с существующими слотами той же кофейни."""
+        schedule = values(
+            column("cafe_id", Integer),
+            column("start_time", DateTime(timezone=True)),
+            column("end_time", DateTime(timezone=True)),
+            column("required_baristas", Integer),
+            name="schedule",
+        ).data(rows)
+        existing = aliased(Slot)
+        now = datetime.utcnow()
+        new_slots = select(
+            schedule.c.cafe_id,
+            schedule.c.start_time,
+            schedule.c.end_time,
+            schedule.c.required_baristas,
+            literal(now, DateTime),
+            literal(now, DateTime),
+        ).where(
+            ~exists().where(
+                existing.cafe_id == schedule.c.cafe_id,
+                existing.start_time < schedule.c.end_time,
+                existing.end_time > schedule.c.start_time,
+            )
+        )
+        return (
+            insert(Slot)
+            .from_select(
+                ["cafe_id", "start_time", "end_time", "required_baristas", "created_at", "updated_at"],
+                new_slots,
+            )
+            .returning(Slot.id, Slot.cafe_id, Slot.start_time, Slot.end_time, Slot.required_baristas)
+        )
+
+    @staticmethod
+    def _occupancy_stmt(*extra_columns):
+        """
+        Агрегирующий запрос занятости: по строке на слот с required_baristas
+        и числом активных броней (COUNT ... GROUP BY вместо загрузки броней).
+        extra_columns - дополнительные колонки Slot в результате.
+        """
+        booked = func.count(Booking.id).label("booked")
+        return (
+            select(Slot.id, Slot.required_baristas, *extra_columns, booked)
+            .outerjoin(
+                Booking,
+                and_(Booking.slot_id == Slot.id, Booking.status.in_(ACTIVE_BOOKING_STATUSES)),
+            )
+            .group_by(Slot.id, Slot.required_baristas, *extra_columns)
+        )
+
     async def get_booked_baristas_count(self, slot_id: int) -> int:
         """Получить количество бариста, забронировавших слот."""
-        stmt = select(Booking).where(
+        stmt = select(func.count(Booking.id)).where(
             and_(
                 Booking.slot_id == slot_id,
-                Booking.status.in_([BookingStatus.BOOKED, BookingStatus.CONFIRMED_WORK]) # Только активные брони
+                Booking.status.in_(ACTIVE_BOOKING_STATUSES) # Только активные брони
             )
         )
         result = await self.session.execute(stmt)
-        return len(result.scalars().all())
+        return result.scalar_one()
+
+    async def get_free_seats(self, slot_ids: Iterable[int]) -> Dict[int, int]:
+        """
+        Получить число свободных мест для набора слотов одним запросом.
+        Несуществующие слоты в результат не попадают.
+        """
+        slot_ids = list(set(slot_ids))
+        if not slot_ids:
+            return {}
+        stmt = self._occupancy_stmt().where(Slot.id.in_(slot_ids))
+        result = await self.session.execute(stmt)
+        return {row.id: max(row.required_baristas - row.booked, 0) for row in result}
+
+    async def get_fill_ratios(
+        self, start_date: date, end_date: date, cafe_id: Optional[int] = None
+    ) -> Dict[int, float]:
+        """
+        Получить заполненность (доля занятых мест) каждого слота в диапазоне дат,
+        опционально по одной кофейне. Один запрос на весь диапазон.
+        """
+        range_start, range_end = _date_range_bounds(start_date, end_date)
+        stmt = self._occupancy_stmt().where(
+            and_(Slot.start_time >= range_start, Slot.start_time < range_end)
+        )
+        if cafe_id is not None:
+            stmt = stmt.where(Slot.cafe_id == cafe_id)
+        result = await self.session.execute(stmt)
+        return {
+            row.id: (row.booked / row.required_baristas) if row.required_baristas > 0 else 1.0
+            for row in result
+        }
 
     async def is_slot_available_for_booking(self, slot_id: int) -> bool:
         """Проверить, есть ли свободные места в слоте."""
-        slot = await self.get_slot_by_id(slot_id)
-        if not slot:
-            return False
-        booked_count = await self.get_booked_baristas_count(slot_id)
-        return booked_count < slot.required_baristas
+        free_seats = await self.get_free_seats([slot_id])
+        return free_seats.get(slot_id, 0) > 0
+
+    async def get_bookable_slots(self, cafe_id: int, day: date) -> List[AvailableSlot]:
+        """
+        Получить слоты кофейни на день со свободными местами.
+        Ответ берётся из индекса доступности в Redis, а при его отсутствии - из БД.
+        """
+        slots = await availability_index.get_available(cafe_id, day)
+        if slots is not None:
+            return slots
+
+        range_start, range_end = _date_range_bounds(day, day)
+        stmt = self._occupancy_stmt(Slot.start_time, Slot.end_time).where(
+            and_(
+                Slot.cafe_id == cafe_id,
+                Slot.start_time >= range_start,
+                Slot.start_time < range_end,
+            )
+        ).order_by(Slot.start_time)
+        result = await self.session.execute(stmt)
+        return [
+            AvailableSlot(row.id, row.start_time, row.end_time, row.required_baristas - row.booked)
+            for row in result
+            if row.required_baristas > row.booked
+        ]
+
+    async def rebuild_availability_index(self) -> int:
+        """Перестроить индекс доступности по всем слотам, начиная с сегодняшнего дня."""
+        today_start = datetime.combine(date.today(), time.min)
+        stmt = self._occupancy_stmt(Slot.cafe_id, Slot.start_time, Slot.end_time).where(
+            Slot.start_time >= today_start
+        )
+        result = await self.session.execute(stmt)
+        return await availability_index.rebuild(
+            (row.id, row.cafe_id, row.start_time, row.end_time, max(row.required_baristas - row.booked, 0))
+            for row in result
+        )
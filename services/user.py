@@ -1,10 +1,18 @@
 # src/services/user.py
-from typing import Optional
+import logging
+from functools import partial
+from typing import Optional, Sequence
 
-from sqlalchemy import select
+from sqlalchemy import or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from enum import Enum
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.util import identity_key
+from src.db.session import on_commit
 from src.models import User, UserRole, Cafe
+from src.redis_del.user_cache import user_cache, load_user
+from src.services.pagination import PAGE_SIZE, Page, keyset_page
+
+logger = logging.getLogger(__name__)
 
 
 class UserService:
@@ -17,6 +25,33 @@ class UserService:
         result = await self.session.execute(stmt)
         return result.scalar_one_or_none()
 
+    async def get_user_by_id(self, user_id: int) -> Optional[User]:
+        """Получить пользователя по ID."""
+        return await self.session.get(User, user_id)
+
+    async def get_user_by_telegram_id_cached(self, telegram_id: int) -> Optional[User]:
+        """
+        Получить пользователя по Telegram ID через кэш пользователей.
+        При попадании в кэш объект привязывается к сессии без запроса к БД.
+        """
+        snapshot = await user_cache.get(telegram_id)
+        if snapshot is not None:
+            return self._attach_cached_user(load_user(snapshot))
+
+        user = await self.get_user_by_telegram_id(telegram_id)
+        if user:
+            await user_cache.set(user)
+        return user
+
+    def _attach_cached_user(self, user: User) -> User:
+        """Сделать восстановленный из кэша объект persistent в текущей сессии."""
+        existing = self.session.identity_map.get(identity_key(User, user.id))
+        if existing is not None:
+            return existing
+        make_transient_to_detached(user)
+        self.session.add(user)
+        return user
+
     async def create_user(
         self,
         telegram_id: int,
@@ -30,11 +65,6 @@ class UserService:
         cafe_id: Optional[int] = None,
     ) -> User:
         """Создать нового пользователя."""
-        print(f"DEBUG (UserService): Received role type: {type(role)}")
-        print(f"DEBUG (UserService): Received role value: {role}")
-        if isinstance(role, Enum):
-            print(f"DEBUG (UserService): Received role .name: {role.name}")
-            print(f"DEBUG (UserService): Received role .value: {role.value}") # Выводит 'pending'
         user = User(
             telegram_id=telegram_id,
             first_name=first_name,
@@ -47,19 +77,16 @@ class UserService:
             role=role, # <--- ИЗМЕНЕНИЕ ЗДЕСЬ (возвращаем как было)
             cafe_id=cafe_id,
         )
-        # Эти принты теперь должны вам сказать, что user.role - это UserRole.<член>, а не строка
-        print(f"DEBUG (UserService): User object role type: {type(user.role)}")
-        print(f"DEBUG (UserService): User object role value: {user.role}")
         self.session.add(user)
-        await self.session.commit()
-        await self.session.refresh(user)
+        await self.session.flush()  # INSERT ... RETURNING id; COMMIT - в конце обновления
+        logger.debug("User created", extra={"created_user_id": user.id, "role": user.role.value})
         return user
 
     async def update_user_role(self, user: User, new_role: UserRole) -> User:
         """Обновить роль пользователя."""
         user.role = new_role
-        await self.session.commit()
-        await self.session.refresh(user)
+        await self.session.flush()
+        on_commit(self.session, partial(user_cache.invalidate, user.telegram_id))
         return user
 
     async def get_pending_users(self, manager_cafe_id: Optional[int] = None) -> list[User]:
@@ -70,9 +97,63 @@ class UserService:
         result = await self.session.execute(stmt)
         return result.scalars().all()
 
+    async def get_users_page(
+        self,
+        role: UserRole,
+        cafe_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        limit: int = PAGE_SIZE,
+    ) -> Page:
+        """Получить страницу пользователей с ролью, опционально по кофейне (в порядке регистрации)."""
+        stmt = select(User).where(User.role == role)
+        if cafe_id:
+            stmt = stmt.where(User.cafe_id == cafe_id)
+        return await keyset_page(self.session, stmt, User, (), after_id, before_id, limit)
+
+    async def get_pending_users_page(
+        self,
+        cafe_ids: Optional[Sequence[int]] = None,
+        after_id: Optional[int] = None,
+        before_id: Optional[int] = None,
+        limit: int = PAGE_SIZE,
+    ) -> Page:
+        """Страница пользователей, ожидающих подтверждения, в кофейнях cafe_ids (None - во всех)."""
+        stmt = select(User).where(User.role == UserRole.PENDING)
+        if cafe_ids is not None:
+            stmt = stmt.where(User.cafe_id.in_(list(cafe_ids)))
+        return await keyset_page(self.session, stmt, User, (), after_id, before_id, limit)
+
+    async def delete_user(self, user: User) -> None:
+        """Удалить пользователя (отклонённую заявку на регистрацию)."""
+        await self.session.delete(user)
+        await self.session.flush()
+        on_commit(self.session, partial(user_cache.invalidate, user.telegram_id))
+
+    async def get_cafe_staff_telegram_ids(self, cafe_id: Optional[int]) -> list[int]:
+        """
+        Telegram ID всех администраторов и управляющих кофейни (получатели уведомлений).
+        Без кофейни (cafe_id=None) - только администраторы: сравнение с NULL
+        выбрало бы всех управляющих, не привязанных к кофейне.
+        """
+        recipients = User.role == UserRole.ADMIN
+        if cafe_id is not None:
+            recipients = or_(
+                recipients,
+                (User.role == UserRole.MANAGER) & (User.cafe_id == cafe_id),
+                User.id == select(Cafe.manager_id).where(Cafe.id == cafe_id).scalar_subquery(),
+            )
+        stmt = select(User.telegram_id).where(
+            User.telegram_id.is_not(None),
+            User.is_active.is_(True),
+            recipients,
+        )
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
     async def assign_user_to_cafe(self, user: User, cafe: Cafe) -> User:
         """Привязать пользователя к кофейне."""
         user.cafe = cafe
-        await self.session.commit()
-        await self.session.refresh(user)
+        await self.session.flush()
+        on_commit(self.session, partial(user_cache.invalidate, user.telegram_id))
         return user
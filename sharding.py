@@ -0,0 +1,315 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from aiogram import Bot, Dispatcher
+from aiohttp import web
+
+from src.config import Settings, get_settings
+from src.log import setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+# Воркер: (номер шарда, очередь обновлений, массив heartbeat) -> None
+WorkerTarget = Callable[[int, Any, Any], None]
+
+_STOP = None  # Сигнал воркеру завершиться после обработки очереди
+# Воркер ждёт обновление не дольше этого и повторяет: get() держит блокировку очереди всё время ожидания
+QUEUE_POLL_TIMEOUT = 0.5
+# Сколько ждать завершения зависшего воркера после SIGTERM, прежде чем SIGKILL
+WORKER_TERMINATE_TIMEOUT = 5.0
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Найти from_user.id в сыром обновлении любого типа (message, callback_query, ...)."""
+    for key, payload in update.items():
+        if key == "update_id" or not isinstance(payload, dict):
+            continue
+        user = payload.get("from") or payload.get("user")
+        if user:
+            return user["id"]
+        chat = payload.get("chat")
+        if chat:
+            return chat["id"]
+    return None
+
+
+def shard_for_update(update: Dict[str, Any], shards: int) -> int:
+    """Номер шарда для обновления: все обновления одного пользователя попадают в один шард."""
+    user_id = update_user_id(update)
+    return user_id % shards if user_id is not None else 0
+
+
+async def consume_updates(dp: Dispatcher, bot: Bot, updates: Any, heartbeats: Any, index: int) -> None:
+    """
+    Цикл воркера: читает обновления своего шарда и передаёт их диспетчеру.
+    Обновления одного пользователя обрабатываются строго по очереди (порядок FSM),
+    обновления разных пользователей - параллельно.
+    """
+    loop = asyncio.get_running_loop()
+    user_tails: Dict[Optional[int], asyncio.Task] = {}
+
+    async def _heartbeat() -> None:
+        while True:
+            heartbeats[index] = time.time()
+            await asyncio.sleep(1)
+
+    async def _process(update: Dict[str, Any], previous: Optional[asyncio.Task]) -> None:
+        if previous is not None:
+            await asyncio.wait([previous])
+        try:
+            await dp.feed_raw_update(bot, update)
+        except Exception as e:
+            logger.exception("Error processing update %s: %s", update.get("update_id"), e)
+
+    def _forget_tail(user_id: Optional[int], task: asyncio.Task) -> None:
+        # Последняя задача пользователя завершилась - цепочку можно забыть
+        if user_tails.get(user_id) is task:
+            del user_tails[user_id]
+
+    heartbeat_task = asyncio.create_task(_heartbeat())
+    try:
+        while True:
+            try:
+                update = await loop.run_in_executor(None, functools.partial(updates.get, timeout=QUEUE_POLL_TIMEOUT))
+            except queue.Empty:
+                continue
+            if update is _STOP:
+                break
+            user_id = update_user_id(update)
+            task = asyncio.create_task(_process(update, user_tails.get(user_id)))
+            user_tails[user_id] = task
+            task.add_done_callback(functools.partial(_forget_tail, user_id))
+        if user_tails:
+            await asyncio.wait(list(user_tails.values()))
+    finally:
+        heartbeat_task.cancel()
+
+
+def _bot_worker_main(index: int, updates: Any, heartbeats: Any) -> None:
+    """Воркер с настоящим ботом и диспетчером."""
+    # Импорт здесь: bot.py импортирует этот модуль при BOT_MODE=sharded
+    from src.bot import create_bot, create_dispatcher, start_metrics
+
+    setup_logging(get_settings())
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Останавливаемся по _STOP от фронта
+
+    async def _main() -> None:
+        settings = get_settings()
+        bot = create_bot(settings)
+        dp = await create_dispatcher(settings)
+        metrics_runner = await start_metrics(settings, index)
+        try:
+            await dp.emit_startup(bot=bot)
+            await consume_updates(dp, bot, updates, heartbeats, index)
+            await dp.emit_shutdown(bot=bot)
+        finally:
+            await bot.session.close()
+            if metrics_runner is not None:
+                await metrics_runner.cleanup()
+
+    try:
+        asyncio.run(_main())
+    finally:
+        shutdown_logging()
+
+
+class ShardedRuntime:
+    """
+    Пул процессов-воркеров, каждый со своим диспетчером и своей очередью.
+    Обновления распределяются по воркерам по хэшу from_user.id.
+    Супервизор перезапускает упавшие или зависшие (без heartbeat) воркеры.
+    Перезапущенный воркер получает новую очередь: убитый процесс мог умереть внутри get(),
+    не отпустив блокировку старой. Ещё не прочитанные обновления переносятся в новую очередь,
+    если блокировка свободна; обновления, которые воркер уже взял, теряются.
+    Остановка воркера и разбор старой очереди блокируют, поэтому идут в пуле потоков;
+    обновления шарда, пришедшие за это время, копятся в памяти и встают в новую
+    очередь после перенесённых, так что порядок обновлений пользователя сохраняется.
+    """
+
+    def __init__(self, workers: int, heartbeat_timeout: float, worker_target: WorkerTarget = _bot_worker_main):
+        self.workers = workers
+        self.heartbeat_timeout = heartbeat_timeout
+        self.worker_target = worker_target
+        self.queues: List[Any] = [multiprocessing.Queue() for _ in range(workers)]
+        self.heartbeats = multiprocessing.Array("d", workers)
+        self.processes: List[Optional[multiprocessing.Process]] = [None] * workers
+        self.restarts = [0] * workers
+        # Обновления шардов, которые сейчас перезапускаются (номер шарда -> обновления по порядку)
+        self._held: Dict[int, List[Dict[str, Any]]] = {}
+
+    @staticmethod
+    def _stop_worker(index: int, process: Optional[multiprocessing.Process], old: Any) -> List[Dict[str, Any]]:
+        """
+        Остановить воркер и забрать непрочитанные обновления его очереди (сколько удаётся).
+        Блокирует до WORKER_TERMINATE_TIMEOUT и дольше - вызывается в пуле потоков.
+        """
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(WORKER_TERMINATE_TIMEOUT)
+            if process.is_alive():
+                process.kill()
+                process.join()
+        pending = []
+        while True:
+            try:
+                pending.append(old.get(timeout=0.1))
+            except queue.Empty:
+                break
+        try:
+            left = old.qsize()
+        except NotImplementedError:  # macOS
+            left = 0
+        if left:
+            logger.error("Shard %s queue is locked by the dead worker, %s updates lost", index, left)
+        elif pending:
+            logger.info("Moved %s pending updates to the new queue of shard %s", len(pending), index)
+        old.cancel_join_thread()  # Не ждать при выходе записи в трубу, которую никто не читает
+        old.close()
+        return pending
+
+    async def _restart(self, index: int, process: Optional[multiprocessing.Process]) -> None:
+        self._held[index] = []
+        pending: List[Dict[str, Any]] = []
+        try:
+            pending = await asyncio.get_running_loop().run_in_executor(
+                None, self._stop_worker, index, process, self.queues[index]
+            )
+        finally:
+            new = multiprocessing.Queue()
+            for update in pending + self._held.pop(index):
+                new.put(update)
+            self.queues[index] = new
+        self.restarts[index] += 1
+        self._spawn(index)
+
+    def _spawn(self, index: int) -> None:
+        # Запас времени на запуск воркера (создание диспетчера) до первого heartbeat
+        self.heartbeats[index] = time.time() + self.heartbeat_timeout
+        process = multiprocessing.Process(
+            target=self.worker_target,
+            args=(index, self.queues[index], self.heartbeats),
+            name=f"shard-worker-{index}",
+        )
+        process.start()
+        self.processes[index] = process
+
+    def start(self) -> None:
+        for index in range(self.workers):
+            self._spawn(index)
+
+    def dispatch(self, update: Dict[str, Any]) -> int:
+        """Поставить обновление в очередь его шарда. Возвращает номер шарда."""
+        index = shard_for_update(update, self.workers)
+        held = self._held.get(index)
+        if held is not None:
+            held.append(update)
+        else:
+            self.queues[index].put(update)
+        return index
+
+    def health(self) -> List[Dict[str, Any]]:
+        """Состояние воркеров для /health."""
+        now = time.time()
+        return [
+            {
+                "shard": index,
+                "pid": process.pid if process else None,
+                "alive": bool(process and process.is_alive()),
+                "heartbeat_age": round(now - self.heartbeats[index], 1),
+                "restarts": self.restarts[index],
+            }
+            for index, process in enumerate(self.processes)
+        ]
+
+    async def check_workers(self) -> None:
+        """Перезапустить воркеры, которые завершились или перестали отправлять heartbeat."""
+        now = time.time()
+        restarts = []
+        for index, process in enumerate(self.processes):
+            stale = now - self.heartbeats[index] > self.heartbeat_timeout
+            if process is not None and process.is_alive() and not stale:
+                continue
+            if process is not None and process.is_alive():
+                logger.warning("Shard worker %s (pid %s) missed heartbeats, terminating", index, process.pid)
+            logger.warning("Restarting shard worker %s", index)
+            restarts.append(self._restart(index, process))
+        if restarts:
+            await asyncio.gather(*restarts)
+
+    async def supervise(self, interval: float = 1.0) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_workers()
+
+    def stop(self, timeout: float) -> None:
+        """Дать воркерам дообработать свои очереди и завершиться."""
+        for updates in self.queues:
+            updates.put(_STOP)
+        deadline = time.time() + timeout
+        for process in self.processes:
+            if process is None:
+                continue
+            process.join(max(deadline - time.time(), 0))
+            if process.is_alive():
+                logger.warning("Shard worker pid %s did not stop in time, terminating", process.pid)
+                process.terminate()
+                process.join()
+
+
+async def serve_front(settings: Settings, runtime: ShardedRuntime) -> None:
+    """
+    Фронт-процесс: принимает webhook-обновления и раскладывает их по шардам.
+    Отвечает Telegram сразу после постановки обновления в очередь.
+    """
+    async def _handle_update(request: web.Request) -> web.Response:
+        if settings.WEBHOOK_SECRET and request.headers.get("X-Telegram-Bot-Api-Secret-Token") != settings.WEBHOOK_SECRET:
+            return web.Response(body="Unauthorized", status=401)
+        runtime.dispatch(await request.json())
+        return web.json_response({})
+
+    async def _handle_health(request: web.Request) -> web.Response:
+        workers = runtime.health()
+        status = 200 if all(worker["alive"] for worker in workers) else 503
+        return web.json_response({"workers": workers}, status=status)
+
+    app = web.Application()
+    app.router.add_post(settings.WEBHOOK_PATH, _handle_update)
+    app.router.add_get("/health", _handle_health)
+
+    runner = web.AppRunner(app, handle_signals=False)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT)
+    await site.start()
+    logger.info("Shard front %s listening on %s:%s%s, %s workers", os.getpid(), settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, settings.WEBHOOK_PATH, runtime.workers)
+
+    supervisor = asyncio.create_task(runtime.supervise())
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+    logger.info("Shard front shutting down...")
+    supervisor.cancel()
+    await runner.cleanup()
+
+
+def run_sharded(settings: Settings) -> None:
+    """Запуск шардированного рантайма: фронт + SHARD_WORKERS воркеров."""
+    # Импорт здесь, чтобы не создавать цикл bot -> sharding -> webhook -> bot при загрузке
+    from src.webhook import set_webhook
+
+    asyncio.run(set_webhook(settings))
+    runtime = ShardedRuntime(settings.SHARD_WORKERS, settings.SHARD_HEARTBEAT_TIMEOUT)
+    runtime.start()
+    try:
+        asyncio.run(serve_front(settings, runtime))
+    finally:
+        runtime.stop(timeout=settings.WEBHOOK_DRAIN_TIMEOUT)
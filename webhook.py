@@ -0,0 +1,150 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from typing import Any
+
+from aiogram import Dispatcher, Bot
+from aiogram.webhook.aiohttp_server import SimpleRequestHandler, setup_application
+from aiohttp import web
+
+from src.bot import create_bot, create_dispatcher, start_metrics
+from src.config import Settings, get_settings
+from src.log import setup_logging, shutdown_logging
+
+logger = logging.getLogger(__name__)
+
+
+class DrainingRequestHandler(SimpleRequestHandler):
+    """
+    Обработчик webhook с корректной остановкой: после начала остановки новые
+    обновления получают 503 (Telegram повторит их позже), а уже принятые
+    дообрабатываются в течение drain_timeout до закрытия сессии бота.
+
+    close() вызывается из on_shutdown, то есть раньше, чем aiohttp дождётся
+    открытых запросов, поэтому обработчик сам считает незавершённые handle()
+    и ждёт их до закрытия сессии. По умолчанию обновление обрабатывается внутри
+    запроса (handle_in_background=False): ответ уходит только после обработки,
+    и при аварийной остановке Telegram повторит недоставленное обновление.
+    """
+
+    def __init__(self, dispatcher: Dispatcher, bot: Bot, drain_timeout: float, **kwargs: Any):
+        kwargs.setdefault("handle_in_background", False)
+        super().__init__(dispatcher=dispatcher, bot=bot, **kwargs)
+        self.drain_timeout = drain_timeout
+        self._draining = False
+        self._in_flight = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self._draining:
+            return web.Response(status=503, text="Shutting down")
+        self._in_flight += 1
+        self._idle.clear()
+        try:
+            return await super().handle(request)
+        finally:
+            self._in_flight -= 1
+            if not self._in_flight:
+                self._idle.set()
+
+    async def close(self) -> None:
+        self._draining = True
+        if self._in_flight or self._background_feed_update_tasks:
+            logger.info("Draining %s in-flight updates...", self._in_flight + len(self._background_feed_update_tasks))
+            idle = asyncio.ensure_future(self._idle.wait())
+            await asyncio.wait({idle, *self._background_feed_update_tasks}, timeout=self.drain_timeout)
+            idle.cancel()
+            left = self._in_flight + len(self._background_feed_update_tasks)
+            if left:
+                logger.warning("%s updates were not processed before shutdown", left)
+        await super().close()
+
+
+async def set_webhook(settings: Settings) -> None:
+    """Зарегистрировать адрес webhook в Telegram (выполняется один раз, до запуска воркеров)."""
+    if not settings.WEBHOOK_BASE_URL:
+        raise RuntimeError("WEBHOOK_BASE_URL must be set in webhook mode")
+    bot = create_bot(settings)
+    try:
+        await bot.set_webhook(
+            url=settings.WEBHOOK_BASE_URL.rstrip("/") + settings.WEBHOOK_PATH,
+            secret_token=settings.WEBHOOK_SECRET,
+        )
+    finally:
+        await bot.session.close()
+
+
+async def serve_webhook(settings: Settings, reuse_port: bool = False, worker_index: int = 0) -> None:
+    """Поднять aiohttp-сервер webhook и обслуживать его до SIGINT/SIGTERM."""
+    bot = create_bot(settings)
+    dp = await create_dispatcher(settings)
+
+    app = web.Application()
+    handler = DrainingRequestHandler(
+        dispatcher=dp,
+        bot=bot,
+        drain_timeout=settings.WEBHOOK_DRAIN_TIMEOUT,
+        secret_token=settings.WEBHOOK_SECRET,
+    )
+    handler.register(app, path=settings.WEBHOOK_PATH)
+    setup_application(app, dp, bot=bot)
+
+    runner = web.AppRunner(app, handle_signals=False, shutdown_timeout=settings.WEBHOOK_DRAIN_TIMEOUT)
+    await runner.setup()
+    site = web.TCPSite(runner, host=settings.WEBHOOK_HOST, port=settings.WEBHOOK_PORT, reuse_port=reuse_port)
+    await site.start()
+    logger.info("Webhook worker %s listening on %s:%s%s", os.getpid(), settings.WEBHOOK_HOST, settings.WEBHOOK_PORT, settings.WEBHOOK_PATH)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    metrics_runner = await start_metrics(settings, worker_index)
+    await stop.wait()
+
+    # runner.cleanup() сначала закрывает сокет, затем вызывает on_shutdown: там
+    # обработчик дожидается принятых обновлений и только потом закрывает сессию бота
+    logger.info("Webhook worker %s shutting down...", os.getpid())
+    await runner.cleanup()
+    if metrics_runner is not None:
+        await metrics_runner.cleanup()
+
+
+def _worker_main(index: int) -> None:
+    setup_logging(get_settings())
+    try:
+        asyncio.run(serve_webhook(get_settings(), reuse_port=True, worker_index=index))
+    finally:
+        shutdown_logging()
+
+
+def run_webhook(settings: Settings) -> None:
+    """
+    Запуск в режиме webhook. При WEBHOOK_WORKERS > 1 поднимается несколько
+    процессов на одном порту (SO_REUSEPORT), ядро распределяет соединения между ними.
+    """
+    asyncio.run(set_webhook(settings))
+
+    if settings.WEBHOOK_WORKERS <= 1:
+        asyncio.run(serve_webhook(settings))
+        return
+
+    workers = [
+        multiprocessing.Process(target=_worker_main, args=(i,), name=f"webhook-worker-{i}")
+        for i in range(settings.WEBHOOK_WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+
+    def _forward(signum, frame) -> None:
+        for worker in workers:
+            if worker.is_alive():
+                os.kill(worker.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGINT, _forward)
+    signal.signal(signal.SIGTERM, _forward)
+    for worker in workers:
+        worker.join()